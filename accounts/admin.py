@@ -1,7 +1,16 @@
 from django.contrib import admin
-from accounts.models import MyUsers, UserProfile
+from accounts.models import MyUsers, UserProfile, OutboundEmail
 # Register your models here.
 
 
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    # the bodies hold one time passwords, they are not shown
+    exclude = ("message", "html_message")
+    list_display = ("subject", "to_email", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("status",)
+    readonly_fields = ("to_email", "from_email", "subject", "attempts", "last_error", "sent_at", "created_at")
+
+
 admin.site.register(MyUsers)
-admin.site.register(UserProfile)
\ No newline at end of file
+admin.site.register(UserProfile)
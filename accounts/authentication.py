@@ -0,0 +1,88 @@
+"""
+JWT authentication with the user resolved from a short-lived cache.
+
+The user id comes from the token's claims. simplejwt's JWTAuthentication
+then loads the user with one query per request, and reading user.profile
+costs a second one. CachedJWTAuthentication keeps the user, with its profile
+already joined, in the Django cache for AUTH_USER_CACHE_TTL seconds, so an
+authenticated request usually makes no auth query at all. The active and
+password change (CHECK_REVOKE_TOKEN) checks still run on every request
+against the cached user.
+
+Saving or deleting a user or a profile drops the cached copy (see
+accounts/signals.py), which covers password changes and deactivation.
+Writes through QuerySet.update() bypass the signals and are picked up when
+the entry expires. Without REDIS_URL the cache is per process, so other
+workers can also serve the old copy until it expires.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from accounts.models import MyUsers
+
+
+def user_cache_ttl():
+    return getattr(settings, "AUTH_USER_CACHE_TTL", 60)
+
+
+def user_cache_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def user_queryset():
+    return MyUsers.objects.select_related("profile")  # chat prompts and UserSerializer read the profile
+
+
+def get_cached_user(user_id):
+    """The user with its profile, None when there is no such user."""
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = user_queryset().filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        if user is not None:
+            cache.set(key, user, user_cache_ttl())
+    return user
+
+
+async def aget_cached_user(user_id):
+    key = user_cache_key(user_id)
+    user = await cache.aget(key)
+    if user is None:
+        user = await user_queryset().filter(**{api_settings.USER_ID_FIELD: user_id}).afirst()
+        if user is not None:
+            await cache.aset(key, user, user_cache_ttl())
+    return user
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+def token_user_id(validated_token):
+    try:
+        return validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken(_("Token contained no recognizable user identification"))
+
+
+def check_user(user, validated_token):
+    """The checks JWTAuthentication.get_user runs on a freshly loaded user."""
+    if user is None:
+        raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+    if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+        raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+    if api_settings.CHECK_REVOKE_TOKEN:
+        if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        return check_user(get_cached_user(token_user_id(validated_token)), validated_token)
@@ -0,0 +1,306 @@
+"""
+Durable outbound email queue.
+
+Views call enqueue_email(), which only inserts an OutboundEmail row (inside
+the caller's transaction, so a rolled back signup sends nothing). Queued
+emails are sent through a MailDispatcher, which keeps one SMTP connection
+open across batches, either by a background thread of the web process (EMAIL_QUEUE_BACKGROUND_SEND) or by the
+`send_queued_emails` management command. Failed sends are retried with
+exponential backoff up to EMAIL_QUEUE_MAX_ATTEMPTS times.
+
+The queued emails carry one time passwords, so an email's body is cleared as
+soon as it is sent or given up on: sent rows are kept for 30 days (see
+send_queued_emails --prune-days) without a usable code in them.
+"""
+import logging
+import smtplib
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+from accounts.models import OutboundEmail
+from utils.metrics import get_counters, incr_counter
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+REDACTED = "[redacted]"
+CLAIM_SECONDS = 5 * 60  # a claimed email is retried after this if its sender died
+MAX_SLEEP_SECONDS = 60 * 60
+
+_sender_thread = None
+_sender_lock = threading.Lock()
+_wakeup = threading.Event()
+
+METRIC_KEYS = ("sent", "failed", "connections", "send_ms")
+
+
+def max_attempts():
+    return getattr(settings, "EMAIL_QUEUE_MAX_ATTEMPTS", 5)
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt: base, 2x base, 4x base..."""
+    base = getattr(settings, "EMAIL_QUEUE_RETRY_DELAY", 30)
+    return timedelta(seconds=base * 2 ** (attempts - 1))
+
+
+# --- metrics ---
+
+def incr_metric(name, amount=1):
+    if amount:
+        incr_counter(f"email_queue:{name}", amount)
+
+
+def get_email_metrics():
+    """Return the sender's counters with its throughput and connection reuse."""
+    metrics = get_counters("email_queue", METRIC_KEYS)
+    send_seconds = metrics["send_ms"] / 1000
+    metrics["emails_per_second"] = round(metrics["sent"] / send_seconds, 2) if send_seconds else 0.0
+    metrics["emails_per_connection"] = (
+        round(metrics["sent"] / metrics["connections"], 2) if metrics["connections"] else 0.0
+    )
+    return metrics
+
+
+# --- queueing ---
+
+def enqueue_email(subject, message, to_email, html_message=None, from_email=None):
+    """Queue an email for sending, the background sender is woken once the transaction commits."""
+    if from_email is None:
+        from_email = f"LearningMate AI <{settings.DEFAULT_FROM_EMAIL}>"
+
+    if isinstance(to_email, str):
+        to_email = [to_email]
+
+    email = OutboundEmail.objects.create(
+        to_email=to_email,
+        from_email=from_email,
+        subject=subject,
+        message=message,
+        html_message=html_message,
+        next_attempt_at=timezone.now()
+    )
+    transaction.on_commit(request_send)
+    return email
+
+
+# --- sending ---
+
+def due_emails():
+    return OutboundEmail.objects.filter(status="pending", next_attempt_at__lte=timezone.now())
+
+
+def claim_due_emails(batch_size=BATCH_SIZE):
+    """
+    Claim up to batch_size due emails by pushing their next_attempt_at forward,
+    conditional on it being unchanged so concurrent senders never share an email.
+    """
+    claimed = []
+    lease_until = timezone.now() + timedelta(seconds=CLAIM_SECONDS)
+    for email in due_emails().order_by("next_attempt_at", "id")[:batch_size]:
+        updated = OutboundEmail.objects.filter(
+            id=email.id, status="pending", next_attempt_at=email.next_attempt_at
+        ).update(next_attempt_at=lease_until)
+        if updated:
+            claimed.append(email)
+    return claimed
+
+
+def build_message(email):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.message,
+        from_email=email.from_email,
+        to=email.to_email
+    )
+    if email.html_message:
+        message.attach_alternative(email.html_message, "text/html")
+    return message
+
+
+class MailDispatcher:
+    """
+    Keeps one authenticated SMTP connection open across sends and batches, so
+    the TLS handshake and login are paid once instead of per email. The
+    connection is reopened after IDLE_TIMEOUT_SECONDS without use (servers
+    drop idle sessions) and after errors.
+
+    Messages go through send_messages() one at a time on the shared connection:
+    a failure in the middle of a multi-message send_messages() call doesn't say
+    which messages were already delivered, and retrying those would send them twice.
+    """
+    IDLE_TIMEOUT_SECONDS = 30
+
+    def __init__(self):
+        self.connection = None
+        self.last_used = 0
+
+    def open(self):
+        if self.connection is not None and time.monotonic() - self.last_used > self.IDLE_TIMEOUT_SECONDS:
+            self.close()
+        if self.connection is None:
+            self.connection = get_connection(fail_silently=False)
+            self.connection.open()
+            incr_metric("connections")
+            return True
+        return False
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            finally:
+                self.connection = None
+
+    def send(self, message):
+        reused = not self.open()
+        started = time.monotonic()
+        try:
+            sent = self.connection.send_messages([message])
+        except smtplib.SMTPServerDisconnected:
+            self.close()
+            if not reused:
+                raise
+            # the server closed the kept-alive session, retry once on a fresh one
+            self.open()
+            sent = self.connection.send_messages([message])
+        except Exception:
+            self.close()  # the session may be broken, start a fresh one for the next email
+            raise
+        finally:
+            incr_metric("send_ms", int((time.monotonic() - started) * 1000))
+
+        self.last_used = time.monotonic()
+        if not sent:
+            raise smtplib.SMTPException("message was not sent")
+
+
+def send_due_emails(batch_size=BATCH_SIZE, dispatcher=None):
+    """
+    Send the emails that are due through the dispatcher's kept-alive SMTP
+    connection. Without a dispatcher a temporary one is used for this batch.
+    Returns (sent, failed) counts of this batch.
+    """
+    emails = claim_due_emails(batch_size)
+    if not emails:
+        return 0, 0
+
+    own_dispatcher = dispatcher is None
+    dispatcher = dispatcher or MailDispatcher()
+
+    sent = failed = 0
+    try:
+        for email in emails:
+            try:
+                dispatcher.send(build_message(email))
+            except Exception as e:
+                failed += 1
+                mark_failed_attempt(email, e)
+                continue
+
+            sent += 1
+            email.status = "sent"
+            email.attempts += 1
+            email.sent_at = timezone.now()
+            email.last_error = ""
+            redact(email)
+            email.save(update_fields=["status", "attempts", "sent_at", "last_error", "message", "html_message"])
+    finally:
+        if own_dispatcher:
+            dispatcher.close()
+
+    incr_metric("sent", sent)
+    incr_metric("failed", failed)
+    return sent, failed
+
+
+def mark_failed_attempt(email, error):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= max_attempts():
+        email.status = "failed"
+        redact(email)
+        logger.error("giving up on email %s to %s: %s", email.id, email.to_email, error)
+    else:
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+        logger.warning("email %s attempt %s failed: %s", email.id, email.attempts, error)
+    email.save(update_fields=["attempts", "last_error", "status", "next_attempt_at", "message", "html_message"])
+
+
+def redact(email):
+    """Clear the body of an email that won't be sent again, it may hold a one time password."""
+    email.message = REDACTED
+    email.html_message = None
+
+
+def seconds_until_next_attempt():
+    """Seconds until the earliest pending email is due, None when the queue is empty."""
+    next_attempt_at = (
+        OutboundEmail.objects.filter(status="pending")
+        .order_by("next_attempt_at")
+        .values_list("next_attempt_at", flat=True)
+        .first()
+    )
+    if next_attempt_at is None:
+        return None
+    return max((next_attempt_at - timezone.now()).total_seconds(), 0)
+
+
+# --- background sender ---
+
+def request_send():
+    """
+    Wake the background sender thread of this process, starting it if needed.
+    Does nothing when EMAIL_QUEUE_BACKGROUND_SEND is off (emails are then sent
+    only by the management command).
+    """
+    global _sender_thread
+
+    if not getattr(settings, "EMAIL_QUEUE_BACKGROUND_SEND", True):
+        return
+
+    with _sender_lock:
+        _wakeup.set()
+        if _sender_thread is not None:
+            return
+        _sender_thread = threading.Thread(target=_send_in_background, daemon=True)
+        _sender_thread.start()
+
+
+def _send_in_background():
+    global _sender_thread
+
+    dispatcher = MailDispatcher()
+    try:
+        while True:
+            _wakeup.clear()
+            try:
+                while send_due_emails(dispatcher=dispatcher) != (0, 0):
+                    pass
+                delay = seconds_until_next_attempt()
+            except Exception:
+                logger.exception("background email sender failed")
+                delay = CLAIM_SECONDS
+
+            with _sender_lock:
+                if delay is None and not _wakeup.is_set():
+                    _sender_thread = None
+                    return
+
+            if delay is not None and delay > MailDispatcher.IDLE_TIMEOUT_SECONDS:
+                # long sleep, don't hold the SMTP session and DB connection meanwhile
+                dispatcher.close()
+                connection.close()
+
+            # sleep until the next retry is due or a new email is queued
+            _wakeup.wait(timeout=min(delay if delay is not None else 0, MAX_SLEEP_SECONDS))
+    finally:
+        with _sender_lock:
+            if _sender_thread is threading.current_thread():
+                _sender_thread = None
+        dispatcher.close()
+        connection.close()  # this thread's own DB connection
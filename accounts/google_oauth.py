@@ -0,0 +1,175 @@
+"""
+Google sign in: exchanging the authorization code and identifying the user.
+
+All calls to Google go through one pooled requests.Session, so connections
+are kept alive between sign ins, with GOOGLE_HTTP_CONNECT_TIMEOUT and
+GOOGLE_HTTP_TIMEOUT bounding each call.
+
+The code exchange returns an OpenID Connect id_token (GOOGLE_AUTH_SCOPE must
+include "openid") signed by Google. It is verified locally against Google's
+JWKS keys, which are cached for as long as Google's Cache-Control allows.
+A sign in then costs one round trip to Google instead of two. The userinfo
+endpoint is still called when there is no id_token, or when the
+cryptography package PyJWT needs for RS256 is not installed.
+
+The Google URLs are settings, so the mock_google_oauth_server command can
+stand in for Google in development and load tests.
+"""
+import logging
+import re
+import threading
+import time
+import jwt
+import requests
+from django.conf import settings
+from jwt.algorithms import has_crypto
+from requests.adapters import HTTPAdapter
+from utils.profiling import span
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_ISSUERS = ("https://accounts.google.com", "accounts.google.com")
+JWKS_DEFAULT_MAX_AGE = 60 * 60
+JWKS_MIN_REFETCH_SECONDS = 60  # an unknown key id refetches the keys at most this often
+
+_session = None
+_session_lock = threading.Lock()
+_jwks = None
+_jwks_lock = threading.Lock()
+
+
+class GoogleAuthError(Exception):
+    """Google's response can't be used to sign the user in."""
+
+
+def http_timeout():
+    return (
+        getattr(settings, "GOOGLE_HTTP_CONNECT_TIMEOUT", 3),
+        getattr(settings, "GOOGLE_HTTP_TIMEOUT", 10),
+    )
+
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            pool_size = getattr(settings, "GOOGLE_HTTP_POOL_SIZE", 10)
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=pool_size))
+            session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=pool_size))
+            _session = session
+    return _session
+
+
+def cache_max_age(response):
+    match = re.search(r"max-age=(\d+)", response.headers.get("Cache-Control", ""))
+    return int(match.group(1)) if match else JWKS_DEFAULT_MAX_AGE
+
+
+class JWKSCache:
+    """Google's signing keys by key id, refetched when expired or when a token names an unknown key."""
+
+    def __init__(self, url):
+        self.url = url
+        self.keys = {}
+        self.expires_at = 0
+        self.fetched_at = 0
+        self.lock = threading.Lock()
+
+    def fetch(self):
+        with span("http"):
+            response = get_session().get(self.url, timeout=http_timeout())
+        response.raise_for_status()
+        key_set = jwt.PyJWKSet.from_dict(response.json())
+        self.keys = {key.key_id: key for key in key_set.keys}
+        self.fetched_at = time.monotonic()
+        self.expires_at = self.fetched_at + cache_max_age(response)
+
+    def get_key(self, key_id):
+        with self.lock:
+            now = time.monotonic()
+            if now >= self.expires_at or (
+                key_id not in self.keys and now - self.fetched_at >= JWKS_MIN_REFETCH_SECONDS
+            ):
+                self.fetch()
+            key = self.keys.get(key_id)
+        if key is None:
+            raise GoogleAuthError(f"id_token signed with an unknown key {key_id}")
+        return key
+
+
+def get_jwks():
+    global _jwks
+    with _jwks_lock:
+        if _jwks is None:
+            _jwks = JWKSCache(settings.GOOGLE_JWKS_URL)
+    return _jwks
+
+
+def exchange_code(code):
+    """The token response for an authorization code: access_token, id_token, ..."""
+    with span("http"):
+        response = get_session().post(settings.GOOGLE_TOKEN_URL, timeout=http_timeout(), data={
+            "code": code,
+            "client_id": settings.GOOGLE_AUTH_CLIENT_ID,
+            "client_secret": settings.GOOGLE_AUTH_CLIENT_SECRET,
+            "redirect_uri": settings.GOOGLE_CALLBACK_URI,
+            "grant_type": "authorization_code",
+        })
+    response.raise_for_status()
+    return response.json()
+
+
+def verify_id_token(id_token):
+    """The claims of a Google id_token, after checking its signature, issuer, audience and expiry."""
+    try:
+        key = get_jwks().get_key(jwt.get_unverified_header(id_token).get("kid"))
+        return jwt.decode(
+            id_token,
+            key.key,
+            algorithms=["RS256"],
+            audience=settings.GOOGLE_AUTH_CLIENT_ID,
+            issuer=GOOGLE_ISSUERS,
+            leeway=30,  # clock skew between us and Google
+        )
+    except jwt.PyJWTError as e:
+        raise GoogleAuthError(f"invalid id_token: {e}")
+
+
+def fetch_userinfo(access_token):
+    with span("http"):
+        response = get_session().get(
+            settings.GOOGLE_USER_INFO_URL, timeout=http_timeout(),
+            headers={"Authorization": f"Bearer {access_token}"},
+        )
+    response.raise_for_status()
+    return response.json()
+
+
+def google_identity(code):
+    """
+    {"email", "email_verified", "name"} of the Google user who granted `code`.
+    Raises GoogleAuthError, or requests.RequestException when Google can't be reached.
+    """
+    tokens = exchange_code(code)
+
+    id_token = tokens.get("id_token")
+    if id_token and has_crypto:
+        claims = verify_id_token(id_token)
+        return {
+            "email": claims.get("email"),
+            "email_verified": claims.get("email_verified") is True,
+            "name": claims.get("name"),
+        }
+    if id_token:
+        logger.warning("cryptography is not installed, id_token can't be verified, calling userinfo instead")
+
+    access_token = tokens.get("access_token")
+    if not access_token:
+        raise GoogleAuthError("no access token from google")
+    userinfo = fetch_userinfo(access_token)
+    return {
+        "email": userinfo.get("email"),
+        "email_verified": userinfo.get("verified_email", userinfo.get("email_verified")) is True,
+        "name": userinfo.get("name"),
+    }
@@ -0,0 +1,38 @@
+"""
+Password hashers with their cost taken from settings.
+
+PASSWORD_HASHER picks the hasher for new hashes (core.settings puts it first
+in PASSWORD_HASHERS). Django's check_password rehashes a password with the
+first hasher whenever the stored hash was made by another algorithm or with
+another cost, and ModelBackend saves it, so changing PASSWORD_HASHER or one
+of the costs upgrades each user transparently at their next login.
+
+Time the settings on the production hardware with the
+benchmark_password_hashers command before changing them.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with PASSWORD_PBKDF2_ITERATIONS, Django's default when unset."""
+
+    @property
+    def iterations(self):
+        return getattr(settings, "PASSWORD_PBKDF2_ITERATIONS", None) or PBKDF2PasswordHasher.iterations
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """Argon2id with PASSWORD_ARGON2_* costs, needs the argon2-cffi package."""
+
+    @property
+    def time_cost(self):
+        return getattr(settings, "PASSWORD_ARGON2_TIME_COST", Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self):
+        return getattr(settings, "PASSWORD_ARGON2_MEMORY_COST", Argon2PasswordHasher.memory_cost)
+
+    @property
+    def parallelism(self):
+        return getattr(settings, "PASSWORD_ARGON2_PARALLELISM", Argon2PasswordHasher.parallelism)
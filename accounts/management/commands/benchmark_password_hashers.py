@@ -0,0 +1,70 @@
+import statistics
+import time
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher
+from django.core.management.base import BaseCommand, CommandError
+
+PASSWORD = "benchmark-password-123"
+
+
+def int_list(value):
+    try:
+        return [int(item) for item in value.split(",") if item.strip()]
+    except ValueError:
+        raise CommandError(f"Expected comma separated numbers, got {value!r}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Time password checks for each hasher setting and report logins/sec per core "
+        "(one check per login, on one thread). Run it on the production hardware."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=float, default=2, help="Time spent on each setting (default 2)")
+        parser.add_argument("--pbkdf2-iterations", help="Comma separated PBKDF2 iteration counts (default the current setting)")
+        parser.add_argument("--argon2-time-cost", help="Comma separated Argon2 time costs (default the current setting)")
+        parser.add_argument("--argon2-memory-cost", help="Comma separated Argon2 memory costs in KiB (default the current setting)")
+        parser.add_argument("--argon2-parallelism", type=int, help="Argon2 parallelism (default the current setting)")
+        parser.add_argument("--skip-argon2", action="store_true", help="Only time PBKDF2")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"current setting: PASSWORD_HASHER={settings.PASSWORD_HASHER}")
+        self.stdout.write(f"{'hasher':<48} {'checks':>7} {'median ms':>10} {'logins/s/core':>14}")
+
+        for iterations in int_list(options["pbkdf2_iterations"] or str(self.current_iterations())):
+            hasher = PBKDF2PasswordHasher()
+            hasher.iterations = iterations
+            self.run(f"pbkdf2_sha256 iterations={iterations}", hasher, options["seconds"])
+
+        if options["skip_argon2"]:
+            return
+        parallelism = options["argon2_parallelism"] or settings.PASSWORD_ARGON2_PARALLELISM
+        for time_cost in int_list(options["argon2_time_cost"] or str(settings.PASSWORD_ARGON2_TIME_COST)):
+            for memory_cost in int_list(options["argon2_memory_cost"] or str(settings.PASSWORD_ARGON2_MEMORY_COST)):
+                hasher = Argon2PasswordHasher()
+                hasher.time_cost = time_cost
+                hasher.memory_cost = memory_cost
+                hasher.parallelism = parallelism
+                try:
+                    hasher._load_library()
+                except ValueError:
+                    self.stdout.write("argon2: skipped, the argon2-cffi package is not installed")
+                    return
+                self.run(f"argon2id t={time_cost} m={memory_cost}KiB p={parallelism}", hasher, options["seconds"])
+
+    def current_iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS or PBKDF2PasswordHasher.iterations
+
+    def run(self, name, hasher, seconds):
+        encoded = hasher.encode(PASSWORD, hasher.salt())
+        timings = []
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline or len(timings) < 3:
+            started = time.perf_counter()
+            if not hasher.verify(PASSWORD, encoded):
+                raise CommandError(f"{name}: the password didn't verify")
+            timings.append((time.perf_counter() - started) * 1000)
+
+        median = statistics.median(timings)
+        self.stdout.write(f"{name:<48} {len(timings):>7} {median:>10.1f} {1000 / median:>14.1f}")
@@ -0,0 +1,98 @@
+import statistics
+import time
+import uuid
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from accounts.models import MyUsers
+from accounts.token_blacklist import FilteredRefreshToken, filter_enabled, get_blacklist_filter
+from accounts.views.user_auth_views import TokenRefreshAPIView
+
+BATCH = 10_000
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Time refresh token blacklist checks and TokenRefreshAPIView throughput with --rows "
+        "outstanding tokens, a --blacklisted fraction of them blacklisted. The rows are inserted "
+        "in a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000, help="Outstanding tokens (default 1000000)")
+        parser.add_argument("--blacklisted", type=float, default=0.05, help="Fraction of them blacklisted (default 0.05)")
+        parser.add_argument("--requests", type=int, default=500, help="Refreshes timed per variant (default 500)")
+
+    def handle(self, *args, **options):
+        if not filter_enabled():
+            self.stdout.write("the cache is per process (no REDIS_URL), refreshes skip the bloom filter")
+        try:
+            with transaction.atomic():
+                user = MyUsers.objects.create(email=f"{uuid.uuid4().hex}@benchmark.invalid", username=uuid.uuid4().hex)
+                blacklisted_jtis = self.insert_rows(options["rows"], options["blacklisted"])
+                tokens = [str(RefreshToken.for_user(user)) for _ in range(options["requests"])]
+                self.run(tokens, blacklisted_jtis)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def insert_rows(self, rows, fraction):
+        started = time.perf_counter()
+        now = timezone.now()
+        blacklist_every = round(1 / fraction) if fraction else 0
+        blacklisted_jtis = []
+        for offset in range(0, rows, BATCH):
+            tokens = OutstandingToken.objects.bulk_create([
+                OutstandingToken(jti=uuid.uuid4().hex, token="", created_at=now, expires_at=now + timedelta(days=7))
+                for _ in range(min(BATCH, rows - offset))
+            ])
+            if blacklist_every:
+                blacklisted = tokens[::blacklist_every]
+                BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in blacklisted])
+                blacklisted_jtis.extend(token.jti for token in blacklisted[:10])
+        self.stdout.write(f"inserted {rows} tokens in {time.perf_counter() - started:.1f}s")
+        return blacklisted_jtis
+
+    def run(self, tokens, blacklisted_jtis):
+        # bulk_create sends no signals, so the filter is built explicitly
+        started = time.perf_counter()
+        blacklist_filter = get_blacklist_filter()
+        blacklist_filter.rebuild()
+        self.stdout.write(
+            f"bloom filter: {blacklist_filter.bloom.count} tokens, {len(blacklist_filter.bloom.bits) / 1024:.0f}KiB, "
+            f"built in {time.perf_counter() - started:.1f}s"
+        )
+        missed = [jti for jti in blacklisted_jtis if not blacklist_filter.might_contain(jti)]
+        if missed:
+            self.stderr.write(f"blacklisted tokens missing from the filter: {missed}")
+
+        self.report("database check", [self.timed(RefreshToken, token) for token in tokens])
+        self.report("bloom check", [self.timed(FilteredRefreshToken, token) for token in tokens])
+
+        view = TokenRefreshAPIView.as_view(throttle_classes=[])
+        factory = APIRequestFactory()
+        requests = [factory.post("/user/token/refresh", {"refresh_token": token}, format="json") for token in tokens]
+        started = time.perf_counter()
+        timings = [self.timed(view, request) for request in requests]
+        elapsed = time.perf_counter() - started
+        self.report("TokenRefreshAPIView", timings, f", {len(requests) / elapsed:.0f} requests/s")
+
+    def timed(self, func, *args):
+        started = time.perf_counter()
+        func(*args)
+        return (time.perf_counter() - started) * 1000
+
+    def report(self, name, timings, extra=""):
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1] if timings else 0
+        self.stdout.write(
+            f"{name}: median {statistics.median(timings):.3f}ms, p95 {p95:.3f}ms, max {timings[-1]:.3f}ms{extra}"
+        )
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from accounts.mock_google_oauth import MockGoogleServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a Google OAuth stand-in (auth, token, userinfo and JWKS endpoints) to sign in without Google. "
+        "Point GOOGLE_AUTH_URL, GOOGLE_TOKEN_URL, GOOGLE_USER_INFO_URL and GOOGLE_JWKS_URL at it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default 127.0.0.1)")
+        parser.add_argument("--port", type=int, default=8200, help="Port to listen on (default 8200)")
+        parser.add_argument("--email", default="mock.user@example.com", help="User signed in by codes without a login_hint (default mock.user@example.com)")
+        parser.add_argument("--latency-ms", type=float, default=0, help="Delay added to every response, Google's round trip (default 0)")
+
+    def handle(self, *args, **options):
+        server = MockGoogleServer((options["host"], options["port"]), email=options["email"], latency_ms=options["latency_ms"])
+        base = f"http://{options['host']}:{options['port']}"
+        self.stdout.write(f"mock Google OAuth listening on {base}, Ctrl-C to stop")
+        if server.signing_key is None:
+            self.stdout.write("cryptography is not installed, no id_token is issued, the app will call /userinfo")
+        for name, path in (("AUTH", "auth"), ("TOKEN", "token"), ("USER_INFO", "userinfo"), ("JWKS", "certs")):
+            self.stdout.write(f"  GOOGLE_{name}_URL={base}/{path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,47 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from accounts.email_queue import BATCH_SIZE, MailDispatcher, get_email_metrics, send_due_emails
+from accounts.models import OutboundEmail
+
+
+class Command(BaseCommand):
+    help = "Send the queued outbound emails that are due, retrying failed ones with backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help=f"Emails claimed per batch (default {BATCH_SIZE})")
+        parser.add_argument("--loop", action="store_true", help="Keep running as a background worker")
+        parser.add_argument("--interval", type=int, default=5, help="Seconds between passes with --loop (default 5)")
+        parser.add_argument("--prune-days", type=int, default=30, help="Delete emails sent more than this many days ago (default 30)")
+
+    def handle(self, *args, **options):
+        # one SMTP connection kept open across batches and --loop passes
+        dispatcher = MailDispatcher()
+        try:
+            while True:
+                self.send_once(options, dispatcher)
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
+        finally:
+            dispatcher.close()
+
+    def send_once(self, options, dispatcher):
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = send_due_emails(options["batch_size"], dispatcher=dispatcher)
+            if not sent and not failed:
+                break
+            total_sent += sent
+            total_failed += failed
+
+        if total_sent or total_failed:
+            self.stdout.write(f"sent {total_sent} emails, {total_failed} failed attempts")
+            self.stdout.write(f"email metrics: {get_email_metrics()}")
+
+        pruned, _ = OutboundEmail.objects.filter(
+            status="sent", sent_at__lt=timezone.now() - timedelta(days=options["prune_days"])
+        ).delete()
+        if pruned:
+            self.stdout.write(f"pruned {pruned} sent emails")
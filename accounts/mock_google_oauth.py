@@ -0,0 +1,171 @@
+"""
+Google OAuth stand-in for development and load tests of the sign in flow.
+
+Serves the four Google endpoints the app uses, with a simulated latency:
+
+    GET  /auth      redirects to redirect_uri with a code (the consent screen, skipped)
+    POST /token     exchanges a code for an access_token and a signed id_token
+    GET  /userinfo  the user of an access_token
+    GET  /certs     the JWKS keys the id_tokens are signed with
+
+    python manage.py mock_google_oauth_server --port 8200
+    GOOGLE_AUTH_URL=http://localhost:8200/auth GOOGLE_TOKEN_URL=http://localhost:8200/token \\
+    GOOGLE_USER_INFO_URL=http://localhost:8200/userinfo GOOGLE_JWKS_URL=http://localhost:8200/certs \\
+    python manage.py runserver
+
+A code issued by /auth signs in its login_hint. A code that is an email
+address signs in that address, so load tests can make up codes. Any other
+code signs in the default user. id_tokens are signed with an RSA key made
+at start-up, which needs the cryptography package. Without it /token
+returns no id_token and the app falls back to /userinfo.
+"""
+import json
+import secrets
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+import jwt
+from jwt.algorithms import has_crypto
+
+ISSUER = "https://accounts.google.com"
+TOKEN_LIFETIME = 60 * 60
+
+
+def make_signing_key():
+    """(private key, public JWK), (None, None) without the cryptography package."""
+    if not has_crypto:
+        return None, None
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from jwt.algorithms import RSAAlgorithm
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = RSAAlgorithm.to_jwk(key.public_key(), as_dict=True)
+    jwk.update(kid=uuid.uuid4().hex, alg="RS256", use="sig")
+    return key, jwk
+
+
+class MockGoogleHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like Google
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        time.sleep(self.server.latency_seconds)
+        if url.path.rstrip("/").endswith("/auth"):
+            return self.authorize(params)
+        if url.path.rstrip("/").endswith("/userinfo"):
+            return self.userinfo()
+        if url.path.rstrip("/").endswith("/certs"):
+            return self.send_json(200, {"keys": [self.server.jwk] if self.server.jwk else []},
+                                  {"Cache-Control": "public, max-age=3600"})
+        self.send_json(404, {"error": "not_found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+        time.sleep(self.server.latency_seconds)
+        if urlsplit(self.path).path.rstrip("/").endswith("/token"):
+            return self.token(form)
+        self.send_json(404, {"error": "not_found"})
+
+    def authorize(self, params):
+        if not params.get("redirect_uri"):
+            return self.send_json(400, {"error": "invalid_request", "error_description": "redirect_uri is required"})
+        code = self.server.issue_code(params.get("login_hint"))
+        query = {"code": code, **({"state": params["state"]} if "state" in params else {})}
+        self.send_response(302)
+        self.send_header("Location", f"{params['redirect_uri']}?{urlencode(query)}")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def token(self, form):
+        if form.get("grant_type") != "authorization_code" or not form.get("code"):
+            return self.send_json(400, {"error": "invalid_grant"})
+        user = self.server.user_for_code(form["code"])
+        access_token = self.server.issue_access_token(user)
+        tokens = {
+            "access_token": access_token,
+            "expires_in": TOKEN_LIFETIME,
+            "token_type": "Bearer",
+            "scope": "openid email profile",
+        }
+        if self.server.signing_key is not None:
+            tokens["id_token"] = self.server.id_token(user, form.get("client_id"))
+        self.send_json(200, tokens)
+
+    def userinfo(self):
+        access_token = self.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        user = self.server.access_tokens.get(access_token)
+        if user is None:
+            return self.send_json(401, {"error": "invalid_token"})
+        self.send_json(200, {
+            "id": user["sub"],
+            "email": user["email"],
+            "verified_email": True,
+            "name": user["name"],
+        })
+
+    def send_json(self, status, data, headers=None):
+        payload = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class MockGoogleServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, email="mock.user@example.com", latency_ms=0):
+        super().__init__(address, MockGoogleHandler)
+        self.default_email = email
+        self.latency_seconds = latency_ms / 1000
+        self.signing_key, self.jwk = make_signing_key()
+        self.codes = {}
+        self.access_tokens = {}
+        self.lock = threading.Lock()
+
+    def issue_code(self, email=None):
+        code = secrets.token_urlsafe(24)
+        with self.lock:
+            self.codes[code] = email or self.default_email
+        return code
+
+    def user_for_code(self, code):
+        with self.lock:
+            email = self.codes.get(code)
+        if email is None:
+            email = code if "@" in code else self.default_email
+        return {
+            "sub": str(uuid.uuid5(uuid.NAMESPACE_URL, email).int)[:21],
+            "email": email,
+            "name": email.split("@")[0].replace(".", " ").title(),
+        }
+
+    def issue_access_token(self, user):
+        access_token = secrets.token_urlsafe(32)
+        with self.lock:
+            self.access_tokens[access_token] = user
+        return access_token
+
+    def id_token(self, user, client_id):
+        now = int(time.time())
+        claims = {
+            "iss": ISSUER,
+            "aud": client_id,
+            "sub": user["sub"],
+            "email": user["email"],
+            "email_verified": True,
+            "name": user["name"],
+            "iat": now,
+            "exp": now + TOKEN_LIFETIME,
+        }
+        return jwt.encode(claims, self.signing_key, algorithm="RS256", headers={"kid": self.jwk["kid"]})
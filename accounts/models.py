@@ -72,3 +72,36 @@ class UserProfile(models.Model):
         return f"{self.user.email} - {self.name}"
     
     
+
+
+class OutboundEmail(models.Model):
+    """Email waiting in the outbound queue, sent by accounts.email_queue."""
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+    ]
+
+    to_email = models.JSONField()  # list of recipients
+    from_email = models.CharField(max_length=255)
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    html_message = models.TextField(blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField()
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Outbound Email"
+        verbose_name_plural = "Outbound Emails"
+        ordering = ["id"]
+        indexes = [
+            # sender: filter (status = pending, next_attempt_at <= now)
+            models.Index(fields=["status", "next_attempt_at"], name="outbound_email_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to_email)} ({self.status})"
@@ -0,0 +1,29 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from accounts.authentication import invalidate_cached_user
+from accounts.models import MyUsers, UserProfile
+from accounts.token_blacklist import bump_blacklist_version
+
+
+def drop_cached_user(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
+
+
+def drop_cached_profile_user(sender, instance, **kwargs):
+    invalidate_cached_user(instance.user_id)
+
+
+# the auth cache holds users with their profile joined, drop it on any change to either
+post_save.connect(drop_cached_user, sender=MyUsers, dispatch_uid="auth_cache_save_user")
+post_delete.connect(drop_cached_user, sender=MyUsers, dispatch_uid="auth_cache_delete_user")
+post_save.connect(drop_cached_profile_user, sender=UserProfile, dispatch_uid="auth_cache_save_profile")
+post_delete.connect(drop_cached_profile_user, sender=UserProfile, dispatch_uid="auth_cache_delete_profile")
+
+
+def blacklist_changed(sender, **kwargs):
+    transaction.on_commit(bump_blacklist_version)
+
+
+# every process reloads its blacklist filter once the new row is visible to it
+post_save.connect(blacklist_changed, sender=BlacklistedToken, dispatch_uid="blacklist_filter_save")
@@ -1,3 +1,501 @@
-from django.test import TestCase
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+import jwt
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import AnonymousUser
+from django.core import mail
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.tokens import RefreshToken
+from accounts import google_oauth, token_blacklist, usernames
+from accounts.authentication import CachedJWTAuthentication, user_cache_key
+from accounts.email_queue import MailDispatcher, enqueue_email, request_send, send_due_emails
+from accounts.google_oauth import GoogleAuthError, google_identity
+from accounts.hashers import TunedArgon2PasswordHasher
+from accounts.mock_google_oauth import MockGoogleServer, make_signing_key
+from accounts.models import MyUsers, OutboundEmail, UserProfile
+from accounts.token_blacklist import BloomFilter, FilteredRefreshToken, get_blacklist_metrics
+from accounts.usernames import create_user_with_username, next_free_username
+from utils.otp_validation import generate_otp, verify_otp
+from utils.throttling import AtomicAnonRateThrottle
 
-# Create your tests here.
+CLIENT_ID = "test-client.apps.googleusercontent.com"
+
+
+class GoogleOAuthTestCase(SimpleTestCase):
+    """Signs in against a MockGoogleServer running in a thread."""
+
+    def setUp(self):
+        self.server = MockGoogleServer(("127.0.0.1", 0))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        settings_override = override_settings(
+            GOOGLE_AUTH_CLIENT_ID=CLIENT_ID,
+            GOOGLE_AUTH_CLIENT_SECRET="secret",
+            GOOGLE_CALLBACK_URI="http://testserver/user/auth/google/callback",
+            GOOGLE_TOKEN_URL=f"{base}/token",
+            GOOGLE_USER_INFO_URL=f"{base}/userinfo",
+            GOOGLE_JWKS_URL=f"{base}/certs",
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        # the JWKS cache is a singleton bound to GOOGLE_JWKS_URL
+        google_oauth._jwks = None
+        self.addCleanup(setattr, google_oauth, "_jwks", None)
+
+    def patch_claims(self, **claims):
+        """Make the mock issue id_tokens with `claims` changed, still signed with its key."""
+        issue = self.server.id_token
+
+        def id_token(user, client_id):
+            token_claims = jwt.decode(issue(user, client_id), options={"verify_signature": False})
+            token_claims.update(claims)
+            return jwt.encode(
+                token_claims, self.server.signing_key, algorithm="RS256", headers={"kid": self.server.jwk["kid"]}
+            )
+
+        return mock.patch.object(self.server, "id_token", id_token)
+
+
+class GoogleIdTokenTests(GoogleOAuthTestCase):
+
+    def test_valid_id_token(self):
+        code = self.server.issue_code("ada.lovelace@example.com")
+        with mock.patch.object(google_oauth, "fetch_userinfo") as fetch_userinfo:
+            identity = google_identity(code)
+
+        self.assertEqual(identity, {
+            "email": "ada.lovelace@example.com",
+            "email_verified": True,
+            "name": "Ada Lovelace",
+        })
+        fetch_userinfo.assert_not_called()
+
+    def test_bad_signature(self):
+        other_key, _ = make_signing_key()
+        with mock.patch.object(self.server, "signing_key", other_key):
+            with self.assertRaisesMessage(GoogleAuthError, "invalid id_token"):
+                google_identity("ada@example.com")
+
+    def test_wrong_audience(self):
+        with self.patch_claims(aud="someone-else.apps.googleusercontent.com"):
+            with self.assertRaisesMessage(GoogleAuthError, "invalid id_token"):
+                google_identity("ada@example.com")
+
+    def test_wrong_issuer(self):
+        with self.patch_claims(iss="https://accounts.example.com"):
+            with self.assertRaisesMessage(GoogleAuthError, "invalid id_token"):
+                google_identity("ada@example.com")
+
+    def test_expired_token(self):
+        now = int(time.time())
+        with self.patch_claims(iat=now - 2 * 60 * 60, exp=now - 60 * 60):
+            with self.assertRaisesMessage(GoogleAuthError, "invalid id_token"):
+                google_identity("ada@example.com")
+
+    def test_expiry_within_leeway(self):
+        with self.patch_claims(exp=int(time.time()) - 10):
+            self.assertEqual(google_identity("ada@example.com")["email"], "ada@example.com")
+
+    def test_unknown_key_id_refetches_the_keys(self):
+        google_identity("ada@example.com")  # caches the current keys
+
+        # Google rotated its key
+        self.server.signing_key, self.server.jwk = make_signing_key()
+        with mock.patch.object(google_oauth, "JWKS_MIN_REFETCH_SECONDS", 0):
+            self.assertEqual(google_identity("grace@example.com")["email"], "grace@example.com")
+        self.assertIn(self.server.jwk["kid"], google_oauth.get_jwks().keys)
+
+    def test_unknown_key_id_is_not_refetched_too_often(self):
+        google_identity("ada@example.com")
+
+        self.server.signing_key, self.server.jwk = make_signing_key()
+        with mock.patch.object(google_oauth.JWKSCache, "fetch") as fetch:
+            with self.assertRaisesMessage(GoogleAuthError, "unknown key"):
+                google_identity("grace@example.com")
+        fetch.assert_not_called()
+
+
+class GoogleUserinfoTests(GoogleOAuthTestCase):
+
+    def test_userinfo_without_id_token(self):
+        with mock.patch.object(self.server, "signing_key", None):
+            identity = google_identity(self.server.issue_code("ada.lovelace@example.com"))
+
+        self.assertEqual(identity, {
+            "email": "ada.lovelace@example.com",
+            "email_verified": True,
+            "name": "Ada Lovelace",
+        })
+
+    def test_userinfo_when_id_token_cant_be_verified(self):
+        with mock.patch.object(google_oauth, "has_crypto", False):
+            with mock.patch.object(google_oauth, "verify_id_token") as verify_id_token:
+                with self.assertLogs("accounts.google_oauth", "WARNING"):
+                    identity = google_identity("ada@example.com")
+
+        self.assertEqual(identity["email"], "ada@example.com")
+        verify_id_token.assert_not_called()
+
+
+@override_settings(
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+    EMAIL_QUEUE_BACKGROUND_SEND=False,
+    EMAIL_QUEUE_MAX_ATTEMPTS=3,
+    EMAIL_QUEUE_RETRY_DELAY=10,
+    DEFAULT_FROM_EMAIL="noreply@example.com",
+)
+class EmailQueueTests(TestCase):
+    smtp_error = smtplib.SMTPException("451 try again later")
+
+    def failing_sends(self):
+        return mock.patch(
+            "django.core.mail.backends.locmem.EmailBackend.send_messages", side_effect=self.smtp_error
+        )
+
+    def make_due(self):
+        OutboundEmail.objects.filter(status="pending").update(next_attempt_at=timezone.now())
+
+    def test_enqueue_then_dispatch(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            email = enqueue_email("Your code", "123456", "ada@example.com")
+        self.assertEqual(callbacks, [request_send])
+        self.assertEqual(mail.outbox, [])
+
+        self.assertEqual(send_due_emails(), (1, 0))
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, "Your code")
+        self.assertEqual(mail.outbox[0].to, ["ada@example.com"])
+        self.assertEqual(mail.outbox[0].from_email, "LearningMate AI <noreply@example.com>")
+        self.assertEqual(mail.outbox[0].body, "123456")
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ("sent", 1))
+        self.assertIsNotNone(email.sent_at)
+        self.assertNotIn("123456", email.message)  # the code isn't kept once sent
+
+        self.assertEqual(send_due_emails(), (0, 0))  # sent once only
+
+    def test_dispatcher_keeps_one_connection(self):
+        for i in range(3):
+            enqueue_email(f"Email {i}", "body", "ada@example.com")
+        dispatcher = MailDispatcher()
+
+        with mock.patch("accounts.email_queue.get_connection", wraps=mail.get_connection) as get_connection:
+            self.assertEqual(send_due_emails(dispatcher=dispatcher), (3, 0))
+            self.assertIsNotNone(dispatcher.connection)
+            enqueue_email("Email 3", "body", "ada@example.com")
+            self.assertEqual(send_due_emails(dispatcher=dispatcher), (1, 0))
+
+        self.assertEqual(get_connection.call_count, 1)
+        self.assertEqual(len(mail.outbox), 4)
+        dispatcher.close()
+
+    def test_smtp_error_is_retried_with_backoff(self):
+        email = enqueue_email("Your code", "123456", "ada@example.com", html_message="<b>123456</b>")
+
+        with self.failing_sends(), self.assertLogs("accounts.email_queue", "WARNING"):
+            before = timezone.now()
+            self.assertEqual(send_due_emails(), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts), ("pending", 1))
+            self.assertEqual(email.message, "123456")  # kept for the retry
+            self.assertEqual(email.last_error, str(self.smtp_error))
+            self.assertGreaterEqual(email.next_attempt_at, before + timedelta(seconds=10))
+            self.assertEqual(send_due_emails(), (0, 0))  # not due before the backoff
+
+            self.make_due()
+            before = timezone.now()
+            self.assertEqual(send_due_emails(), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual(email.attempts, 2)
+            self.assertGreaterEqual(email.next_attempt_at, before + timedelta(seconds=20))
+
+        self.make_due()
+        self.assertEqual(send_due_emails(), (1, 0))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts, email.last_error), ("sent", 3, ""))
+        self.assertIsNone(email.html_message)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].body, "123456")
+
+    def test_email_fails_after_max_attempts(self):
+        email = enqueue_email("Your code", "123456", "ada@example.com")
+
+        with self.failing_sends(), self.assertLogs("accounts.email_queue", "WARNING") as logs:
+            for _ in range(3):
+                self.make_due()
+                self.assertEqual(send_due_emails(), (0, 1))
+
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ("failed", 3))
+        self.assertNotIn("123456", email.message)
+        self.assertIn("giving up", logs.output[-1])
+
+        self.make_due()
+        self.assertEqual(send_due_emails(), (0, 0))
+        self.assertEqual(mail.outbox, [])
+
+
+class TwoPerMinuteThrottle(AtomicAnonRateThrottle):
+    rate = "2/min"
+
+
+class AtomicThrottleTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.request = RequestFactory().get("/")
+        self.request.user = AnonymousUser()
+
+    def allow_at(self, now):
+        throttle = TwoPerMinuteThrottle()
+        throttle.timer = lambda: now
+        return throttle.allow_request(self.request, None), throttle
+
+    def test_rejected_requests_are_not_counted(self):
+        self.assertEqual([self.allow_at(60 + t)[0] for t in (0, 1, 2, 3)], [True, True, False, False])
+
+        allowed, throttle = self.allow_at(60 + 10)
+        self.assertFalse(allowed)
+        self.assertEqual(throttle.wait(), 50)
+        self.assertEqual(cache.get(throttle.window_key(1)), 2)
+
+    def test_previous_window_is_weighted(self):
+        self.allow_at(0)
+        self.allow_at(1)
+        # halfway through the next window the previous one counts for one request
+        self.assertEqual([self.allow_at(90)[0], self.allow_at(91)[0]], [True, False])
+        # and nothing once a whole window has passed
+        self.assertEqual([self.allow_at(180)[0], self.allow_at(181)[0], self.allow_at(182)[0]], [True, True, False])
+
+    def test_concurrent_requests_are_counted_atomically(self):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: self.allow_at(60)[0], range(20)))
+        self.assertEqual(results.count(True), 2)
+
+
+class OTPTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_verified_once(self):
+        otp = generate_otp("ada@example.com")
+        self.assertRegex(otp, r"^\d{4}$")
+        self.assertFalse(verify_otp("ada@example.com", "0000" if otp != "0000" else "1111"))
+        self.assertFalse(verify_otp("grace@example.com", otp))
+        self.assertTrue(verify_otp("ada@example.com", otp))
+        self.assertFalse(verify_otp("ada@example.com", otp))
+
+    def test_non_ascii_input(self):
+        generate_otp("ada@example.com")
+        self.assertFalse(verify_otp("ada@example.com", "١٢٣٤"))
+
+    def test_concurrent_verifications_succeed_once(self):
+        otp = generate_otp("ada@example.com")
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: verify_otp("ada@example.com", otp), range(8)))
+        self.assertEqual(results.count(True), 1)
+
+
+class UsernameAllocationTests(TestCase):
+
+    def test_email_local_part(self):
+        self.assertEqual(create_user_with_username("ada@example.com").username, "ada")
+
+    def test_next_number_after_the_highest(self):
+        for username in ("ada", "ada1", "ada7", "adam", "ada_2"):
+            MyUsers.objects.create(email=f"{username}@example.org", username=username)
+        self.assertEqual(next_free_username("ada"), "ada8")
+        self.assertEqual(create_user_with_username("ada@example.com").username, "ada8")
+
+    def test_regex_characters_in_the_base(self):
+        MyUsers.objects.create(email="a.b+c@example.org", username="a.b+c")
+        self.assertEqual(next_free_username("a.b+c"), "a.b+c1")
+
+    def test_long_local_part_leaves_room_for_the_number(self):
+        max_length = MyUsers._meta.get_field("username").max_length
+        user = create_user_with_username("a" * 300 + "@example.com")
+        self.assertEqual(len(user.username), max_length - usernames.SUFFIX_DIGITS)
+
+    def test_collision_is_retried(self):
+        MyUsers.objects.create(email="ada@example.org", username="ada")
+        # a concurrent signup took "ada1" after this one had read the usernames
+        MyUsers.objects.create(email="ada1@example.org", username="ada1")
+        stale = iter(["ada1"])
+
+        with mock.patch.object(
+            usernames, "next_free_username", side_effect=lambda base: next(stale, None) or next_free_username(base)
+        ) as allocate:
+            user = create_user_with_username("ada@example.com")
+
+        self.assertEqual(user.username, "ada2")
+        self.assertEqual(allocate.call_count, 2)
+
+    def test_taken_email_is_not_retried(self):
+        create_user_with_username("ada@example.com")
+        with mock.patch.object(usernames, "next_free_username", wraps=next_free_username) as allocate:
+            with self.assertRaises(IntegrityError):
+                create_user_with_username("ada@example.com")
+        self.assertEqual(allocate.call_count, 1)
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+class PasswordHashingTests(TestCase):
+
+    def test_cost_from_settings(self):
+        self.assertTrue(make_password("correct horse").startswith("pbkdf2_sha256$1000$"))
+
+    @override_settings(PASSWORD_ARGON2_TIME_COST=3, PASSWORD_ARGON2_MEMORY_COST=8192, PASSWORD_ARGON2_PARALLELISM=2)
+    def test_argon2_costs_from_settings(self):
+        hasher = TunedArgon2PasswordHasher()
+        self.assertEqual((hasher.time_cost, hasher.memory_cost, hasher.parallelism), (3, 8192, 2))
+
+    def test_rehashed_at_login_when_the_cost_changes(self):
+        MyUsers.objects.create_user("ada@example.com", password="correct horse", username="ada")
+
+        with override_settings(PASSWORD_PBKDF2_ITERATIONS=2000):
+            user = authenticate(username="ada@example.com", password="correct horse")
+        self.assertIsNotNone(user)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$2000$"))
+
+    def test_google_accounts_get_an_unusable_password(self):
+        identity = {"email": "ada@example.com", "email_verified": True, "name": "Ada Lovelace"}
+        with mock.patch("accounts.views.user_google_auth_views.google_identity", return_value=identity):
+            response = self.client.get("/user/auth/google/callback", {"code": "code"})
+
+        self.assertEqual(response.status_code, 200)
+        user = MyUsers.objects.get(email="ada@example.com")
+        self.assertFalse(user.has_usable_password())
+        self.assertTrue(user.is_verified)
+        self.assertEqual(user.profile.name, "Ada Lovelace")
+
+
+class CachedJWTAuthenticationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = MyUsers.objects.create_user("ada@example.com", username="ada")
+        self.profile = UserProfile.objects.create(user=self.user, name="Ada")
+        token = RefreshToken.for_user(self.user).access_token
+        self.request = RequestFactory().get("/", headers={"Authorization": f"Bearer {token}"})
+
+    def authenticate(self):
+        user, _ = CachedJWTAuthentication().authenticate(self.request)
+        return user
+
+    def test_user_and_profile_are_cached(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate().profile.name, "Ada")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authenticate().profile.name, "Ada")
+
+    def test_saving_the_user_drops_the_cached_copy(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertIsNone(cache.get(user_cache_key(self.user.id)))
+        with self.assertRaisesMessage(AuthenticationFailed, "User is inactive"):
+            self.authenticate()
+
+    def test_saving_the_profile_drops_the_cached_copy(self):
+        self.authenticate()
+        self.profile.name = "Ada Lovelace"
+        self.profile.save()
+        self.assertEqual(self.authenticate().profile.name, "Ada Lovelace")
+
+    def test_deleted_user(self):
+        self.authenticate()
+        self.user.delete()
+        with self.assertRaisesMessage(AuthenticationFailed, "User not found"):
+            self.authenticate()
+
+
+class BloomFilterTests(SimpleTestCase):
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000)
+        keys = [f"jti-{i}" for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+        self.assertEqual(bloom.count, 1000)
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(10_000, false_positive_rate=0.01)
+        for i in range(10_000):
+            bloom.add(f"jti-{i}")
+        false_positives = sum(f"other-{i}" in bloom for i in range(10_000))
+        self.assertLess(false_positives, 200)
+
+    def test_empty(self):
+        self.assertNotIn("jti", BloomFilter(10))
+
+
+class FilteredRefreshTokenTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        # the filter is a per-process singleton
+        token_blacklist._filter = None
+        self.addCleanup(setattr, token_blacklist, "_filter", None)
+        self.user = MyUsers.objects.create_user("ada@example.com", username="ada")
+
+    def shared_cache(self):
+        # a single test process sees the locmem cache like every worker sees Redis
+        return mock.patch.object(token_blacklist, "cache_is_shared", return_value=True)
+
+    def blacklist(self, token):
+        with self.captureOnCommitCallbacks(execute=True):  # the version is bumped once the row is committed
+            RefreshToken(token).blacklist()
+
+    def test_unknown_token_skips_the_query(self):
+        token = str(RefreshToken.for_user(self.user))
+        with self.shared_cache():
+            FilteredRefreshToken(token)  # loads the filter
+            with self.assertNumQueries(0):
+                FilteredRefreshToken(token)
+        self.assertEqual(get_blacklist_metrics()["bloom_negative"], 2)
+
+    def test_blacklisted_token_is_rejected(self):
+        token = str(RefreshToken.for_user(self.user))
+        self.blacklist(token)
+        with self.shared_cache(), self.assertRaises(TokenError):
+            FilteredRefreshToken(token)
+        self.assertEqual(get_blacklist_metrics()["db_confirmed"], 1)
+
+    def test_token_blacklisted_after_the_load(self):
+        token = str(RefreshToken.for_user(self.user))
+        with self.shared_cache():
+            FilteredRefreshToken(token)
+            self.blacklist(token)
+            with self.assertRaises(TokenError):
+                FilteredRefreshToken(token)
+
+    def test_no_filter_without_a_shared_cache(self):
+        token = str(RefreshToken.for_user(self.user))
+        with mock.patch.object(token_blacklist, "get_blacklist_filter") as get_filter:
+            FilteredRefreshToken(token)
+            self.blacklist(token)
+            with self.assertRaises(TokenError):
+                FilteredRefreshToken(token)
+        get_filter.assert_not_called()
@@ -1,13 +1,13 @@
-from rest_framework.throttling import UserRateThrottle
+from utils.throttling import AtomicUserRateThrottle
 
-class SignupThrottle(UserRateThrottle):
+class SignupThrottle(AtomicUserRateThrottle):
     scope = 'signup'
 
-class LoginThrottle(UserRateThrottle):
+class LoginThrottle(AtomicUserRateThrottle):
     scope = 'login'
 
-class OTPThrottle(UserRateThrottle):
+class OTPThrottle(AtomicUserRateThrottle):
     scope = 'otp'
 
-class ForgotPasswordThrottle(UserRateThrottle):
+class ForgotPasswordThrottle(AtomicUserRateThrottle):
     scope = 'forgot_password'
@@ -0,0 +1,170 @@
+"""
+Refresh token blacklist checks without a query per refresh.
+
+simplejwt checks every refresh token against BlacklistedToken joined to
+OutstandingToken. Almost every token it checks is not blacklisted, and the
+two tables grow with every login. Each process keeps a bloom filter of the
+blacklisted, unexpired token ids. A token the filter doesn't contain is
+certainly not blacklisted and skips the query. A possible match (a
+blacklisted token, or a ~1% false positive) is confirmed in the database.
+
+Blacklisting a token bumps a version in the shared cache once its
+transaction commits (see accounts/signals.py). Before answering, a process
+compares that version with the one it loaded and reads the tokens
+blacklisted since its last load when they differ. The filter is rebuilt
+from scratch every REBUILD_SECONDS, and when it fills up, to drop expired
+tokens. Without REDIS_URL the cache, and so the version, is per process:
+a process would never hear of tokens blacklisted by another one, so the
+filter is skipped and every token is checked in the database.
+
+Expired tokens are deleted in batches by the prune_expired_tokens command.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from utils.metrics import cache_is_shared, get_counters, incr_counter
+
+VERSION_KEY = "token_blacklist:version"
+FALSE_POSITIVE_RATE = 0.01
+MIN_CAPACITY = 10_000
+REBUILD_SECONDS = 60 * 60
+LOAD_OVERLAP = timedelta(minutes=1)  # a blacklisting committed late still has its row read
+METRIC_KEYS = ("bloom_negative", "bloom_positive", "db_confirmed")
+
+_filter = None
+_filter_lock = threading.Lock()
+
+
+class BloomFilter:
+    def __init__(self, capacity, false_positive_rate=FALSE_POSITIVE_RATE):
+        self.capacity = capacity
+        self.size = max(int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, key):
+        # double hashing, two 64 bit halves of one digest give every position
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+
+def filter_enabled():
+    """The filter is only safe when the version lives in a cache shared by every process."""
+    return cache_is_shared()
+
+
+def get_blacklist_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # start from a timestamp so a lost version key can't be mistaken for a loaded one
+        cache.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_blacklist_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:  # no version yet, every process reloads on the new one anyway
+        cache.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+
+
+def blacklisted_since(since=None):
+    """jti of the unexpired blacklisted tokens, blacklisted at or after `since` when given."""
+    blacklisted = BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+    if since is not None:
+        blacklisted = blacklisted.filter(blacklisted_at__gte=since)
+    return blacklisted.values_list("token__jti", flat=True).iterator(chunk_size=10_000)
+
+
+class BlacklistFilter:
+    """Bloom filter of the blacklisted token ids, kept in sync through the cache version."""
+
+    def __init__(self):
+        self.bloom = None
+        self.version = None
+        self.loaded_at = None
+        self.built_at = 0
+        self.lock = threading.Lock()
+
+    def sync(self):
+        version = get_blacklist_version()
+        if version == self.version and time.monotonic() - self.built_at < REBUILD_SECONDS:
+            return
+        with self.lock:
+            if version == self.version and time.monotonic() - self.built_at < REBUILD_SECONDS:
+                return  # another thread synced meanwhile
+            full = (
+                self.bloom is None
+                or time.monotonic() - self.built_at >= REBUILD_SECONDS
+                or self.bloom.count >= self.bloom.capacity
+            )
+            self.load(version, full)
+
+    def load(self, version, full):
+        started = timezone.now()
+        if full:
+            jtis = list(blacklisted_since())
+            bloom = BloomFilter(max(len(jtis) * 2, MIN_CAPACITY))
+            self.built_at = time.monotonic()
+        else:
+            jtis = blacklisted_since(self.loaded_at - LOAD_OVERLAP)
+            bloom = self.bloom
+        for jti in jtis:
+            bloom.add(jti)
+        self.bloom, self.version, self.loaded_at = bloom, version, started
+
+    def rebuild(self):
+        with self.lock:
+            self.load(get_blacklist_version(), full=True)
+
+    def might_contain(self, jti):
+        self.sync()
+        return jti in self.bloom
+
+
+def get_blacklist_filter():
+    global _filter
+    with _filter_lock:
+        if _filter is None:
+            _filter = BlacklistFilter()
+    return _filter
+
+
+def get_blacklist_metrics():
+    return get_counters("token_blacklist", METRIC_KEYS)
+
+
+class FilteredRefreshToken(RefreshToken):
+    """RefreshToken whose blacklist check asks the bloom filter before the database."""
+
+    def check_blacklist(self):
+        if not filter_enabled():
+            return super().check_blacklist()
+        if not get_blacklist_filter().might_contain(self.payload[api_settings.JTI_CLAIM]):
+            incr_counter("token_blacklist:bloom_negative")
+            return
+        incr_counter("token_blacklist:bloom_positive")
+        try:
+            super().check_blacklist()
+        except TokenError:
+            incr_counter("token_blacklist:db_confirmed")
+            raise
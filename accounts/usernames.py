@@ -0,0 +1,49 @@
+"""
+Username allocation for new users.
+
+A username is the local part of the email, with a number appended when that
+is taken: john, john1, john2, ... The next free number comes from one prefix
+query (username LIKE 'john%', served by the unique index on username, which
+on PostgreSQL has a varchar_pattern_ops twin for LIKE), instead of probing
+random suffixes one query at a time. Two signups can still pick the same
+name at once, so the INSERT is retried with a fresh allocation when it hits
+the unique constraint on username.
+"""
+import re
+from django.db import IntegrityError, transaction
+from accounts.models import MyUsers
+
+MAX_ATTEMPTS = 5
+SUFFIX_DIGITS = 10  # room left for the number within the column
+
+
+def username_base(email):
+    max_length = MyUsers._meta.get_field("username").max_length
+    return email.split("@")[0][:max_length - SUFFIX_DIGITS]
+
+
+def next_free_username(base):
+    """base if it is free, else base followed by one more than the highest number in use."""
+    taken = list(MyUsers.objects.filter(
+        username__startswith=base, username__regex=rf"^{re.escape(base)}[0-9]*$"
+    ).values_list("username", flat=True))
+
+    if base not in taken:
+        return base
+    return f"{base}{max(int(username[len(base):] or 0) for username in taken) + 1}"
+
+
+def create_user_with_username(email, **fields):
+    """
+    Create a MyUsers row for email with a free username. An IntegrityError
+    for anything other than the username (a taken email) is raised as is.
+    """
+    base = username_base(email)
+    for attempt in range(MAX_ATTEMPTS):
+        username = next_free_username(base)
+        try:
+            with transaction.atomic():  # savepoint, a caller's transaction survives the retry
+                return MyUsers.objects.create(email=email, username=username, **fields)
+        except IntegrityError:
+            if attempt == MAX_ATTEMPTS - 1 or not MyUsers.objects.filter(username=username).exists():
+                raise
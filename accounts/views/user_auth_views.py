@@ -1,5 +1,3 @@
-import random
-import string
 from django.contrib.auth import authenticate
 from django.contrib.auth.hashers import make_password
 from django.db import IntegrityError, transaction
@@ -13,7 +11,9 @@ from accounts.serializers.user_serializers import UserSerializer
 from utils.response import response_data
 from utils.validations import is_valid_email, is_valid_password
 from utils.otp_validation import generate_otp, verify_otp
-from utils.emails import send_email
+from accounts.email_queue import enqueue_email
+from accounts.token_blacklist import FilteredRefreshToken
+from accounts.usernames import create_user_with_username
 from accounts.throttles import (
     SignupThrottle, LoginThrottle, OTPThrottle, ForgotPasswordThrottle
 )
@@ -50,21 +50,11 @@ class UserSignupAPIView(APIView):
 
         # Extract name from email
         name = email.split("@")[0]
-        base_username = name
-
-        # Ensure unique username
-        username = base_username
-        while MyUsers.objects.filter(username=username).exists():
-            username = f"{base_username}{''.join(random.choices(string.digits, k=4))}"
 
         try:
             with transaction.atomic():  # Ensure rollback on failure
-                # Create user
-                user = MyUsers.objects.create(
-                    email=email,
-                    username=username,
-                    password=make_password(password)
-                )
+                # Create user, with a free username
+                user = create_user_with_username(email, password=make_password(password))
 
                 # Create profile
                 UserProfile.objects.create(user=user, name=name)
@@ -72,26 +62,22 @@ class UserSignupAPIView(APIView):
                 # Generate OTP
                 otp = generate_otp(email)
 
-                # Send email
-                email_sent = send_email(
+                # Queue the email, it is sent in the background once the user is committed
+                enqueue_email(
                     subject="Your OTP for LearningMate AI",
                     message=f"Hello {name},\n\nYour OTP is: {otp}\nIt is valid for 10 minutes.",
                     to_email=email
                 )
 
-                if not email_sent:
-                    # Rollback user creation
-                    raise Exception("Failed to send OTP email after 3 attempts.")
-
-                return response_data(
-                    success=True,
-                    message="Enter OTP to complete the Signup",
-                    data={
-                        "email": user.email,
-                        "verification_required" : True
-                    },
-                    status_code=200
-                )
+            return response_data(
+                success=True,
+                message="Enter OTP to complete the Signup",
+                data={
+                    "email": user.email,
+                    "verification_required" : True
+                },
+                status_code=200
+            )
 
         except IntegrityError:
             return response_data(
@@ -193,16 +179,12 @@ class UserLoginAPIView(APIView):
             # Generate OTP
             otp = generate_otp(email)
 
-            # Send email
-            email_sent = send_email(
+            # Queue the email, sent in the background
+            enqueue_email(
                 subject="Your OTP for LearningMate AI",
                 message=f"Hello {user.profile_name},\n\nYour OTP is: {otp}\nIt is valid for 10 minutes.",
                 to_email=email
             )
-            
-            if not email_sent:
-                # Rollback user creation
-                raise Exception("Failed to login user")
 
             return response_data(
                 success=True,
@@ -260,20 +242,13 @@ class ForgotPasswordAPIView(APIView):
         # Generate OTP
         otp = generate_otp(email)
 
-        # Send OTP via email
-        email_sent = send_email(
+        # Queue the OTP email, sent in the background
+        enqueue_email(
             subject="Password Reset OTP - LearningMate AI",
             message=f"Hello {user.profile_name},\n\nYour OTP to reset your password is: {otp}\nIt is valid for 10 minutes.",
             to_email=email
         )
 
-        if not email_sent:
-            return response_data(
-                success=False,
-                message="Failed to send OTP. Please try again later.",
-                status_code=500
-            )
-
         return response_data(
             success=True,
             message="OTP has been sent to your email.",
@@ -352,7 +327,7 @@ class TokenRefreshAPIView(APIView):
 
         try:
             # Attempt to create a new access token from the refresh token
-            refresh = RefreshToken(refresh_token)
+            refresh = FilteredRefreshToken(refresh_token)
             access_token = str(refresh.access_token)
 
             return response_data(
@@ -378,7 +353,7 @@ class UserLogoutAPIView(APIView):
     def post(self, request):
         try:
             refresh_token = request.data["refresh"]
-            token = RefreshToken(refresh_token)
+            token = FilteredRefreshToken(refresh_token)
             token.blacklist()
             return response_data(
                 success=True,
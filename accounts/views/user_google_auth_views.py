@@ -1,8 +1,6 @@
-import random
-import string
 import requests
 from django.contrib.auth.hashers import make_password
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.conf import settings
 from rest_framework.views import APIView
 from accounts.models import (
@@ -10,13 +8,11 @@ from accounts.models import (
 )
 from rest_framework.permissions import AllowAny
 from rest_framework_simplejwt.tokens import RefreshToken
+from accounts.google_oauth import GoogleAuthError, google_identity
 from accounts.serializers.user_serializers import UserSerializer
+from accounts.usernames import create_user_with_username
 from utils.response import response_data
 
-GOOGLE_AUTH_URL='https://accounts.google.com/o/oauth2/v2/auth'
-GOOGLE_TOKEN_URL='https://oauth2.googleapis.com/token'
-GOOGLE_USER_INFO_URL='https://www.googleapis.com/oauth2/v2/userinfo'
-
 
 class GoogleLoginUrlView(APIView):
     """
@@ -26,7 +22,7 @@ class GoogleLoginUrlView(APIView):
     def get(self, request):        
         # Build the Google OAuth2 authorization URL
         auth_url = (
-            f"{GOOGLE_AUTH_URL}?response_type=code"
+            f"{settings.GOOGLE_AUTH_URL}?response_type=code"
             f"&client_id={settings.GOOGLE_AUTH_CLIENT_ID}"
             f"&redirect_uri={settings.GOOGLE_CALLBACK_URI}"
             f"&scope={settings.GOOGLE_AUTH_SCOPE}"
@@ -52,65 +48,32 @@ class GoogleAuthCallbackView(APIView):
             )
 
         try:
-            # 1. Exchange code for access token
-            token_data = {
-                "code": code,
-                "client_id": settings.GOOGLE_AUTH_CLIENT_ID,
-                "client_secret": settings.GOOGLE_AUTH_CLIENT_SECRET,
-                "redirect_uri": settings.GOOGLE_CALLBACK_URI,
-                "grant_type": "authorization_code",
-            }
-            token_res = requests.post(GOOGLE_TOKEN_URL, data=token_data)
-            token_res.raise_for_status()
-            token_json = token_res.json()
+            # 1. Exchange the code, the user comes from the verified id_token
+            identity = google_identity(code)
+            email = identity["email"]
 
-            access_token = token_json.get("access_token")
-            
-            print(access_token)
-            
-            if not access_token:
-                return response_data(
-                    success=False,
-                    message="Failed to login through google",
-                    error="no access token from google",
-                    status_code=400
-                )
-
-            # 2. Fetch user info from Google
-            userinfo_res = requests.get(
-                GOOGLE_USER_INFO_URL, headers={"Authorization": f"Bearer {access_token}"}
-            )
-            
-            print(userinfo_res.text)
-            
-            userinfo_res.raise_for_status()
-            userinfo = userinfo_res.json()
-            
-            print(userinfo, '----')
-
-            email = userinfo.get("email")
-
-            if not email:
+            if not email or not identity["email_verified"]:
                 return response_data(
                     success=False,
                     message="failed to login with Google account",
-                    error=f"failed to login with Google account email not available. email : {email}",
+                    error=f"failed to login with Google account, verified email not available. email : {email}",
                     status_code=400
                 )
-            name = userinfo.get("name") or email.split("@")[0]
+            name = identity["name"] or email.split("@")[0]
 
-            # 3. Create or get user
+            # 2. Create or get user
             with transaction.atomic():
-                user, created = MyUsers.objects.get_or_create(
-                    email=email,
-                    defaults={
-                        "username": email.split("@")[0],
-                        "password": make_password(
-                            "".join(random.choices(string.ascii_letters + string.digits, k=12))
-                        ),
-                        "is_verified": True,  # auto verified since Google verified
-                    },
-                )
+                user = MyUsers.objects.filter(email=email).first()
+                if user is None:
+                    try:
+                        user = create_user_with_username(
+                            email,
+                            password=make_password(None),  # unusable, signs in through Google only
+                            is_verified=True,  # auto verified since Google verified
+                        )
+                    except IntegrityError:
+                        # signed up at the same moment by another request
+                        user = MyUsers.objects.get(email=email)
 
                 # get or create profile
                 UserProfile.objects.get_or_create(
@@ -120,7 +83,7 @@ class GoogleAuthCallbackView(APIView):
                     }
                 )
 
-            # 4. Issue JWT tokens
+            # 3. Issue JWT tokens
             refresh = RefreshToken.for_user(user)
             access_token = str(refresh.access_token)
 
@@ -137,7 +100,7 @@ class GoogleAuthCallbackView(APIView):
                 status_code=200
             )
 
-        except requests.exceptions.RequestException as e:
+        except (GoogleAuthError, requests.exceptions.RequestException) as e:
             return response_data(
                 success=False,
                 message="Google authentication failed",
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db.models.functions import Length
+from characters.memory import CHARS_PER_TOKEN, compact_summary, estimate_tokens, token_budget
+from characters.models import AIChatMemory
+from llm_usage.recorder import flush as flush_llm_usage
+
+
+class Command(BaseCommand):
+    help = "Compact AI chat memory summaries that are over CHAT_MEMORY_TOKEN_BUDGET."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100, help="Memories loaded per query (default 100)")
+        parser.add_argument("--limit", type=int, help="Stop after compacting this many memories")
+        parser.add_argument("--dry-run", action="store_true", help="Only report the oversized memories")
+
+    def handle(self, *args, **options):
+        budget = token_budget()
+        oversized = (
+            AIChatMemory.objects
+            .annotate(summary_length=Length("summary"))
+            .filter(summary_length__gt=budget * CHARS_PER_TOKEN)
+            .order_by("id")
+        )
+
+        total = oversized.count()
+        self.stdout.write(f"{total} memories over the {budget} token budget")
+        if options["dry_run"] or not total:
+            return
+
+        compacted = 0
+        last_id = 0
+        limit = options["limit"] or total
+        while compacted < limit:
+            # keyset batches, compacted rows drop out of the filter anyway
+            batch = list(oversized.filter(id__gt=last_id)[:options["batch_size"]])
+            if not batch:
+                break
+
+            for memory in batch:
+                last_id = memory.id
+                before = estimate_tokens(memory.summary)
+                memory.summary = compact_summary(memory.summary, user=memory.user_id, ai_character=memory.ai_character_id)
+                memory.save(update_fields=["summary", "updated_at"])
+                compacted += 1
+                self.stdout.write(f"memory {memory.id}: {before} -> {estimate_tokens(memory.summary)} tokens")
+                if compacted >= limit:
+                    break
+
+        flush_llm_usage()  # the process exits before the background flush
+        self.stdout.write(self.style.SUCCESS(f"compacted {compacted} memories"))
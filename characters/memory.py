@@ -0,0 +1,103 @@
+"""
+Bounded long-term memory for AI character chats.
+
+Every chat turn appends the model's summary update to AIChatMemory.summary.
+The summary is embedded in each system prompt, so it is kept under
+CHAT_MEMORY_TOKEN_BUDGET tokens: once an update pushes it over the budget the
+whole summary is compacted (rolled up by the LLM) to about half the budget,
+which leaves room for the next updates before compacting again.
+"""
+import logging
+import re
+from django.conf import settings
+from utils.llm import chat_completion
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4  # rough average for English text with OpenAI tokenizers
+
+COMPACT_SYSTEM_PROMPT = "You condense chat memories. Reply with plain text only."
+
+
+def token_budget():
+    return getattr(settings, "CHAT_MEMORY_TOKEN_BUDGET", 300)
+
+
+def estimate_tokens(text):
+    return -(-len(text or "") // CHARS_PER_TOKEN)
+
+
+def truncate_summary(summary, max_tokens):
+    """
+    Cut a summary down to max_tokens, keeping the most recent sentences
+    (updates are appended, so the newest information is at the end).
+    """
+    summary = (summary or "").strip()
+    if estimate_tokens(summary) <= max_tokens:
+        return summary
+
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    kept = []
+    length = 0
+    for sentence in reversed(re.split(r"(?<=[.!?])\s+", summary)):
+        if length + len(sentence) + 1 > max_chars:
+            break
+        kept.append(sentence)
+        length += len(sentence) + 1
+
+    if not kept:  # a single sentence longer than the budget
+        return summary[-max_chars:].strip()
+    return " ".join(reversed(kept))
+
+
+def compact_summary(summary, target_tokens=None, user=None, ai_character=None):
+    """
+    Roll the summary up into a shorter one of about target_tokens.
+    Falls back to keeping the most recent sentences if the LLM call fails
+    or its answer is still over the budget. user and ai_character (instances
+    or ids) attribute the LLM call in llm_usage.
+    """
+    target_tokens = target_tokens or token_budget() // 2
+    target_words = max(int(target_tokens * 0.75), 20)
+
+    prompt = f"""
+        Condense this long-term memory of a chat between a user and an AI character
+        into at most {target_words} words.
+        Keep the user's name, goals, preferences, progress and open questions.
+        Drop small talk and anything repeated.
+
+        Memory:
+        "{summary}"
+        """
+
+    compacted = ""
+    try:
+        response = chat_completion(
+            "memory_compaction",
+            [
+                {"role": "system", "content": COMPACT_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.2,
+            max_tokens=target_tokens * 2,
+            user=user,
+            ai_character=ai_character
+        )
+        compacted = (response.choices[0].message.content or "").strip()
+    except Exception:
+        logger.exception("chat memory compaction failed, truncating instead")
+
+    return truncate_summary(compacted or summary, token_budget())
+
+
+def merge_summary(summary, summary_update, user=None, ai_character=None):
+    """Append a summary update, compacting the result when it goes over the token budget."""
+    merged = ((summary or "").strip() + " " + (summary_update or "").strip()).strip()
+    if estimate_tokens(merged) > token_budget():
+        merged = compact_summary(merged, user=user, ai_character=ai_character)
+    return merged
+
+
+def summary_for_prompt(summary):
+    """The summary as embedded in the system prompt, never more than the token budget."""
+    return truncate_summary(summary, token_budget())
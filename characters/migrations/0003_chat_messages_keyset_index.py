@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('characters', '0002_alter_aicharacterchatmessages_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='aicharacterchatmessages',
+            options={'verbose_name': 'AI Character Chat Message', 'verbose_name_plural': 'AI Character Chat Messages'},
+        ),
+        migrations.AlterModelOptions(
+            name='aichatmemory',
+            options={'ordering': ['-created_at'], 'verbose_name': 'AI Character Chat memory', 'verbose_name_plural': 'AI Character Chats Memories'},
+        ),
+        migrations.RemoveIndex(
+            model_name='aicharacterchatmessages',
+            name='characters__user_id_f9e49e_idx',
+        ),
+        migrations.AddIndex(
+            model_name='aicharacterchatmessages',
+            index=models.Index(fields=['user', 'ai_character', '-created_at', '-id'], name='chat_msg_user_char_created_idx'),
+        ),
+    ]
@@ -67,7 +67,8 @@ class AICharacterChatMessages(models.Model):
         verbose_name = "AI Character Chat Message"
         verbose_name_plural = "AI Character Chat Messages"
         indexes = [
-            models.Index(fields=["user", "ai_character"]),
+            # chat window pages: filter (user, ai_character), newest first, keyset on (created_at, id)
+            models.Index(fields=["user", "ai_character", "-created_at", "-id"], name="chat_msg_user_char_created_idx"),
             models.Index(fields=["created_at"]),
         ]
 
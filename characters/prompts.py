@@ -0,0 +1,112 @@
+from characters.models import AICharacter
+
+# marker the model writes between the reply and the summary in streaming mode
+SUMMARY_MARKER = "<<SUMMARY>>"
+
+
+JSON_OUTPUT_RULES = """
+            always give response and summary strictly in JSON:
+            {
+            "response": "<your message to the user>",
+            "summary": "<short note of anything new worth remembering from this exchange, empty if nothing>"
+            }
+
+            Rules:
+            - No markdown, no code fences.
+            - Keep messages short and natural.
+"""
+
+# structured output format of the JSON (non streaming) replies
+CHAT_REPLY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "response": {"type": "string"},
+        "summary": {"type": "string"},
+    },
+    "required": ["response", "summary"],
+    "additionalProperties": False,
+}
+
+STREAM_OUTPUT_RULES = f"""
+            First write your message to the user as plain text.
+            Then on a new line write {SUMMARY_MARKER} followed by a short note of anything new worth remembering from this exchange (nothing if there is nothing new).
+
+            Rules:
+            - No markdown, no code fences, no JSON.
+            - Keep messages short and natural.
+"""
+
+
+def build_system_prompt(ai_character, user_name, summary, stream=False):
+    """
+    Build the system prompt for a chat with an AI character.
+    stream=True asks for a plain text reply followed by SUMMARY_MARKER and the
+    summary, so the reply can be sent to the client while it is generated.
+    """
+    output_rules = STREAM_OUTPUT_RULES if stream else JSON_OUTPUT_RULES
+
+    personality_str = (
+        ", ".join([f"{k}: {v}" for k, v in ai_character.personality.items()])
+        if ai_character.personality else "N/A"
+    )
+
+    # --- Stronger prompt for continuity ---
+    if ai_character.role == AICharacter.AI_ROLE_FRIEND:
+        return f"""{output_rules}
+            You name is {ai_character.name}, a Friend companion chatting with {user_name}.
+            "Topic": "{ai_character.topic.topic}",
+            "Personality": "{personality_str}",
+            "chat previous summary": "{summary or 'None'}".
+            """
+
+    return f"""{output_rules}
+            Your name is "{ai_character.name}", a mentor guiding username:"{user_name}" in "{ai_character.topic.topic}".
+            "your Personality" : "{personality_str}",
+            "chat Previous summary": "{summary or 'None'}".
+            """
+
+
+class StreamedReplySplitter:
+    """
+    Splits a streamed completion into the user facing reply and the summary.
+
+    feed() returns the part of the reply that is safe to send to the client,
+    holding back just enough characters to detect a SUMMARY_MARKER that is
+    split across chunks. Everything after the marker is collected in summary.
+    """
+
+    def __init__(self, marker=SUMMARY_MARKER):
+        self.marker = marker
+        self.response = ""
+        self.summary = ""
+        self._buffer = ""
+        self._in_summary = False
+
+    def feed(self, text):
+        if not text:
+            return ""
+
+        if self._in_summary:
+            self.summary += text
+            return ""
+
+        self._buffer += text
+        index = self._buffer.find(self.marker)
+        if index != -1:
+            ready = self._buffer[:index]
+            self.summary += self._buffer[index + len(self.marker):]
+            self._buffer = ""
+            self._in_summary = True
+        else:
+            keep = len(self.marker) - 1
+            ready = self._buffer[:-keep] if len(self._buffer) > keep else ""
+            self._buffer = self._buffer[len(ready):]
+
+        self.response += ready
+        return ready
+
+    def flush(self):
+        """Return whatever is still held back once the stream has ended."""
+        ready, self._buffer = self._buffer, ""
+        self.response += ready
+        return ready
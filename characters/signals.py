@@ -0,0 +1,6 @@
+from django.db.models.signals import post_delete, post_save
+from characters.models import AICharacter
+from utils.catalog_cache import bump_catalog_version
+
+post_save.connect(bump_catalog_version, sender=AICharacter, dispatch_uid="catalog_save_AICharacter")
+post_delete.connect(bump_catalog_version, sender=AICharacter, dispatch_uid="catalog_delete_AICharacter")
@@ -0,0 +1,32 @@
+import logging
+from django.utils import timezone
+from characters.memory import merge_summary
+from characters.models import AIChatMemory
+from jobs.runner import task
+
+logger = logging.getLogger(__name__)
+
+MERGE_ATTEMPTS = 5
+
+
+@task("characters.update_chat_memory")
+def update_chat_memory(memory_id, summary_update):
+    """
+    Merge a chat turn's summary update into the long-term memory (compacting
+    it with the LLM when it goes over the budget).
+    """
+    for _ in range(MERGE_ATTEMPTS):
+        memory = AIChatMemory.objects.filter(id=memory_id).first()
+        if memory is None:
+            return
+
+        new_summary = merge_summary(memory.summary, summary_update, memory.user_id, memory.ai_character_id)
+
+        # only write over the summary we merged into, another turn's update may have landed meanwhile
+        updated = AIChatMemory.objects.filter(id=memory_id, summary=memory.summary).update(
+            summary=new_summary, updated_at=timezone.now()
+        )
+        if updated:
+            return
+
+    logger.error("chat memory %s kept changing, dropped a summary update after %s attempts", memory_id, MERGE_ATTEMPTS)
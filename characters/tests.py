@@ -1,3 +1,303 @@
-from django.test import TestCase
+import json
+from types import SimpleNamespace
+from unittest import mock
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from accounts.models import MyUsers, UserProfile
+from characters import memory, tasks
+from characters.memory import estimate_tokens, merge_summary, summary_for_prompt, truncate_summary
+from characters.models import AICharacter, AIChatMemory, AICharacterChatMessages
+from characters.prompts import SUMMARY_MARKER, StreamedReplySplitter
+from characters.tasks import update_chat_memory
+from characters.views.ai_character_chat_async_views import AsyncChatWithAICharacter
+from characters.views.ai_character_chat_views import AICharacterChatMixin
+from jobs.models import Job
+from learn.models import LearningCategory, LearningTopic
+from utils.llm import StructuredOutputError
+from utils.throttling import AtomicUserRateThrottle
 
-# Create your tests here.
+
+class ChatTestCase(TestCase):
+    """A user chatting with an AI character."""
+
+    def setUp(self):
+        self.user = MyUsers.objects.create_user("ada@example.com", username="ada")
+        UserProfile.objects.create(user=self.user, name="Ada")
+        topic = LearningTopic.objects.create(category=LearningCategory.objects.create(category="Programming"), topic="Python")
+        self.character = AICharacter.objects.create(name="Lex", topic=topic, role=AICharacter.AI_ROLE_FRIEND)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class StreamedReplySplitterTests(SimpleTestCase):
+
+    def split(self, chunks):
+        splitter = StreamedReplySplitter()
+        sent = [splitter.feed(chunk) for chunk in chunks] + [splitter.flush()]
+        return splitter, "".join(sent)
+
+    def test_marker_split_across_chunks(self):
+        splitter, sent = self.split(["Hello ", "there! <<SUM", "MARY>> likes", " python"])
+        self.assertEqual(sent, "Hello there! ")
+        self.assertEqual(splitter.response, "Hello there! ")
+        self.assertEqual(splitter.summary, " likes python")
+
+    def test_no_marker(self):
+        splitter, sent = self.split(["Hi", " <<", "no summary"])
+        self.assertEqual(sent, "Hi <<no summary")
+        self.assertEqual(splitter.summary, "")
+
+    def test_only_a_marker_length_is_held_back(self):
+        splitter = StreamedReplySplitter()
+        self.assertEqual(splitter.feed("A longer sentence"), "A longer sentence"[:-(len(SUMMARY_MARKER) - 1)])
+        self.assertEqual(splitter.feed(None), "")
+
+
+class SalvageReplyTests(SimpleTestCase):
+    salvage = AICharacterChatMixin().salvage_ai_json_response
+
+    def test_truncated_after_the_response(self):
+        self.assertEqual(self.salvage('{"response": "Hi \\"Ada\\"!\\nReady?", "summ'), ('Hi "Ada"!\nReady?', ""))
+
+    def test_both_fields(self):
+        self.assertEqual(self.salvage('{"summary": " likes python ", "response": " Hi "'), ("Hi", "likes python"))
+
+    def test_nothing_to_salvage(self):
+        for content in (None, "", '{"response": "', '{"response": "  ", "summary": "x"}', "Hi there"):
+            with self.subTest(content=content):
+                with self.assertRaises(StructuredOutputError):
+                    self.salvage(content)
+
+
+class ChatViewTests(ChatTestCase):
+    url = "/ai-characters/chat"
+
+    def post(self, **chat_completion):
+        with mock.patch("characters.views.ai_character_chat_views.chat_completion", **chat_completion):
+            return self.client.post(self.url, {"character_id": self.character.id, "message": "hi"}, format="json")
+
+    def test_reply(self):
+        response = self.post(return_value=("Hello Ada!", "likes python"))
+        self.assertEqual((response.status_code, response.json()["data"]), (200, {"response": "Hello Ada!"}))
+        self.assertEqual(AICharacterChatMessages.objects.count(), 2)
+
+    def test_invalid_reply_is_salvaged(self):
+        error = StructuredOutputError("reply is not JSON", '{"response": "Hello Ada!", "summary": "likes')
+        response = self.post(side_effect=error)
+        self.assertEqual((response.status_code, response.json()["data"]), (200, {"response": "Hello Ada!"}))
+        self.assertEqual(AICharacterChatMessages.objects.filter(message="Hello Ada!").count(), 1)
+        self.assertFalse(Job.objects.exists())  # no summary to merge
+
+    def test_unsalvageable_reply_is_not_saved(self):
+        response = self.post(side_effect=StructuredOutputError("empty reply", ""))
+        self.assertEqual(response.status_code, 502)
+        self.assertFalse(AICharacterChatMessages.objects.exists())
+
+
+def stream_of(*texts):
+    """chat_completion(stream=True) stand-in yielding `texts` as delta chunks."""
+    def chat_completion(*args, **kwargs):
+        yield SimpleNamespace(choices=[])  # usage chunk
+        for text in texts:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+    return chat_completion
+
+
+def read_events(response):
+    events = []
+    for block in b"".join(response.streaming_content).decode().strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+class ChatStreamViewTests(ChatTestCase):
+    url = "/ai-characters/chat/stream"
+
+    def post(self, completion, **data):
+        with mock.patch("characters.views.ai_character_chat_views.chat_completion", side_effect=completion) as chat:
+            response = self.client.post(self.url, {"character_id": self.character.id, "message": "hi", **data}, format="json")
+            events = read_events(response) if response.streaming else None
+        return response, events, chat
+
+    def test_reply_is_streamed_then_saved(self):
+        response, events, chat = self.post(stream_of("Hello ", "Ada! <<SUMMARY>>", " likes python"))
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual("".join(data["delta"] for event, data in events if event == "token"), "Hello Ada! ")
+        self.assertEqual(events[-1], ("done", {"response": "Hello Ada!"}))
+        self.assertTrue(chat.call_args.kwargs["stream"])
+
+        self.assertEqual(
+            list(AICharacterChatMessages.objects.order_by("id").values_list("sender", "message")),
+            [(AICharacterChatMessages.SENDER_USER, "hi"), (AICharacterChatMessages.SENDER_AI, "Hello Ada!")],
+        )
+        job = Job.objects.get()
+        self.assertEqual((job.name, job.payload["summary_update"]), ("characters.update_chat_memory", "likes python"))
+
+    def test_failure_is_an_error_event(self):
+        def completion(*args, **kwargs):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="Hel"))])
+            raise TimeoutError("read timed out")
+
+        response, events, _ = self.post(completion)
+        self.assertEqual(events[-1], ("error", {"message": "Failed to get a reply, please try again", "error": "read timed out"}))
+        self.assertFalse(AICharacterChatMessages.objects.exists())
+
+    def test_missing_message(self):
+        response, _, chat = self.post(stream_of(), message="")
+        self.assertEqual(response.status_code, 400)
+        chat.assert_not_called()
+
+    def test_unknown_character(self):
+        response, _, _ = self.post(stream_of(), character_id=self.character.id + 1)
+        self.assertEqual(response.status_code, 404)
+
+
+class OnePerMinuteThrottle(AtomicUserRateThrottle):
+    rate = "1/min"
+
+
+class AsyncChatViewTests(ChatTestCase):
+    url = "/ai-characters/async/chat"
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()  # throttle counters and the auth cache
+        self.addCleanup(cache.clear)
+        self.headers = {"Authorization": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+    async def post(self, body, headers=None):
+        with mock.patch(
+            "characters.views.ai_character_chat_async_views.achat_completion",
+            mock.AsyncMock(return_value=("Hello Ada!", "likes python")),
+        ) as chat:
+            response = await self.async_client.post(
+                self.url, body, content_type="application/json", headers=self.headers if headers is None else headers
+            )
+        return response, chat
+
+    async def test_reply(self):
+        response, chat = await self.post({"character_id": self.character.id, "message": "hi"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["data"], {"response": "Hello Ada!"})
+        self.assertEqual(chat.call_args.kwargs["user"], self.user)
+        self.assertEqual(await AICharacterChatMessages.objects.acount(), 2)
+
+    async def test_anonymous_request(self):
+        response, chat = await self.post({"character_id": self.character.id, "message": "hi"}, headers={})
+        self.assertEqual(response.status_code, 401)
+        chat.assert_not_called()
+
+    async def test_invalid_token(self):
+        response, _ = await self.post({"character_id": self.character.id, "message": "hi"}, headers={"Authorization": "Bearer nope"})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_invalid_json(self):
+        response, chat = await self.post("{not json")
+        self.assertEqual((response.status_code, json.loads(response.content)["message"]), (400, "Invalid JSON body"))
+        chat.assert_not_called()
+
+    async def test_throttled(self):
+        with mock.patch.object(AsyncChatWithAICharacter, "throttle_classes", [OnePerMinuteThrottle]):
+            first, _ = await self.post({"character_id": self.character.id, "message": "hi"})
+            second, chat = await self.post({"character_id": self.character.id, "message": "hi"})
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 429)
+        self.assertGreater(int(second["Retry-After"]), 0)
+        chat.assert_not_called()
+
+
+def completion_of(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+@override_settings(CHAT_MEMORY_TOKEN_BUDGET=10)  # 40 characters
+class ChatMemoryBudgetTests(SimpleTestCase):
+
+    def test_estimate_tokens(self):
+        self.assertEqual([estimate_tokens(text) for text in (None, "", "abcd", "abcde")], [0, 0, 1, 2])
+
+    def test_truncate_keeps_the_newest_sentences(self):
+        summary = "Ada likes Python. She is learning Django. She asked about ORM joins."
+        self.assertEqual(truncate_summary(summary, 10), "She asked about ORM joins.")
+        self.assertEqual(truncate_summary(summary, 100), summary)
+        self.assertEqual(truncate_summary("x" * 100, 10), "x" * 40)
+
+    def test_summary_for_prompt_is_within_the_budget(self):
+        self.assertLessEqual(estimate_tokens(summary_for_prompt("A long sentence here. " * 20)), 10)
+
+    def test_merge_under_the_budget_appends(self):
+        with mock.patch.object(memory, "chat_completion") as chat:
+            self.assertEqual(merge_summary(" Likes Python. ", "Learns Django. "), "Likes Python. Learns Django.")
+        chat.assert_not_called()
+
+    def test_merge_over_the_budget_is_compacted(self):
+        with mock.patch.object(memory, "chat_completion", return_value=completion_of("Ada, Python and Django.")) as chat:
+            merged = merge_summary("Ada likes Python a lot.", "She is now learning Django.", user=1, ai_character=2)
+
+        self.assertEqual(merged, "Ada, Python and Django.")
+        self.assertEqual(chat.call_args.args[0], "memory_compaction")
+        self.assertEqual((chat.call_args.kwargs["user"], chat.call_args.kwargs["ai_character"]), (1, 2))
+
+    def test_compaction_over_the_budget_is_truncated(self):
+        with mock.patch.object(memory, "chat_completion", return_value=completion_of("Too long still. " * 5 + "Newest.")):
+            merged = merge_summary("Ada likes Python a lot.", "She is now learning Django.")
+        self.assertLessEqual(estimate_tokens(merged), 10)
+        self.assertTrue(merged.endswith("Newest."))
+
+    def test_failed_compaction_keeps_the_newest_sentences(self):
+        with mock.patch.object(memory, "chat_completion", side_effect=TimeoutError("read timed out")):
+            with self.assertLogs("characters.memory", "ERROR"):
+                merged = merge_summary("Ada likes Python a lot.", "She is now learning Django.")
+        self.assertEqual(merged, "She is now learning Django.")
+
+
+class UpdateChatMemoryTests(ChatTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.memory = AIChatMemory.objects.create(user=self.user, ai_character=self.character, summary="likes python.")
+
+    def other_turn_lands_first(self, updates):
+        """merge_summary for a task racing with other turns, each writes one of `updates` before the task does."""
+        pending = list(updates)
+
+        def merge(summary, summary_update, *args):
+            if pending:
+                AIChatMemory.objects.filter(id=self.memory.id).update(summary=f"{summary} {pending.pop(0)}")
+            return f"{summary} {summary_update}"
+
+        return mock.patch.object(tasks, "merge_summary", side_effect=merge)
+
+    def test_merged(self):
+        update_chat_memory(self.memory.id, "learning django.")
+        self.memory.refresh_from_db()
+        self.assertEqual(self.memory.summary, "likes python. learning django.")
+
+    def test_merge_is_retried_over_a_concurrent_update(self):
+        with self.other_turn_lands_first(["asked about flask."]) as merge:
+            update_chat_memory(self.memory.id, "learning django.")
+
+        self.assertEqual(merge.call_count, 2)
+        self.memory.refresh_from_db()
+        self.assertEqual(self.memory.summary, "likes python. asked about flask. learning django.")
+
+    def test_gives_up_when_the_memory_keeps_changing(self):
+        updates = [f"turn {i}." for i in range(tasks.MERGE_ATTEMPTS)]
+        with self.other_turn_lands_first(updates), self.assertLogs("characters.tasks", "ERROR"):
+            update_chat_memory(self.memory.id, "learning django.")
+
+        self.memory.refresh_from_db()
+        self.assertNotIn("learning django.", self.memory.summary)
+
+    def test_deleted_memory(self):
+        memory_id = self.memory.id
+        self.memory.delete()
+        update_chat_memory(memory_id, "learning django.")
+        self.assertFalse(AIChatMemory.objects.exists())
@@ -3,7 +3,10 @@ from characters.views.ai_character_views import (
     ListAiCharacters, GetAiCharacterDetails
 )
 from characters.views.ai_character_chat_views import (
-    ListUserAiChats, ChatWithAICharacter
+    ListUserAiChats, ChatWithAICharacter, ChatWithAICharacterStream
+)
+from characters.views.ai_character_chat_async_views import (
+    AsyncChatWithAICharacter, AsyncChatWithAICharacterStream
 )
 
 # base url - /ai-characters/
@@ -13,5 +16,10 @@ urlpatterns = [
     path('<int:character_id>/details', GetAiCharacterDetails.as_view()),
     
     path('chat', ChatWithAICharacter.as_view()),
+    path('chat/stream', ChatWithAICharacterStream.as_view()),
     path('<int:character_id>/chat/messages', ListUserAiChats.as_view()),
+
+    # async (ASGI) endpoints
+    path('async/chat', AsyncChatWithAICharacter.as_view()),
+    path('async/chat/stream', AsyncChatWithAICharacterStream.as_view()),
 ]
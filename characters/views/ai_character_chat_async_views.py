@@ -0,0 +1,141 @@
+from asgiref.sync import sync_to_async
+from utils.async_views import AsyncAPIView
+from utils.llm import LLMUnavailableError, StructuredOutputError, achat_completion, json_schema_format
+from utils.response import json_response_data
+from utils.streaming import sse_event, sse_response
+from characters.prompts import CHAT_REPLY_SCHEMA, StreamedReplySplitter
+from characters.views.ai_character_chat_views import AICharacterChatMixin
+from learn.ai_models import aselect_ai_model
+from learn.models import AIModels
+
+# Async (ASGI) versions of the AI character chat endpoints.
+
+
+class AsyncChatWithAICharacter(AICharacterChatMixin, AsyncAPIView):
+    authentication_required = True
+
+    async def post(self, request):
+        user = request.user
+        character_id = request.data.get("character_id")
+        user_message = request.data.get("message")
+
+        if not character_id or not user_message:
+            return json_response_data(success=False, message="character_id and message are required", status_code=400)
+
+        try:
+            _, model_name = await aselect_ai_model(request.data.get("model"))
+        except AIModels.DoesNotExist as e:
+            return json_response_data(success=False, message=str(e), status_code=400)
+
+        ai_character, memory = await self.aget_chat_context(user, character_id)
+        if not ai_character:
+            return json_response_data(success=False, message="AI character not found", status_code=404)
+
+        messages = await self.abuild_messages(user, ai_character, memory, user_message)
+
+        try:
+            response_text, summary_update = await achat_completion(
+                "chat_reply",
+                messages,
+                model=model_name,
+                temperature=0.7,
+                response_format=json_schema_format("chat_reply", CHAT_REPLY_SCHEMA),
+                parse=self.extract_ai_json_response,
+                user=user,
+                ai_character=ai_character
+            )
+        except StructuredOutputError as e:
+            try:
+                response_text, summary_update = self.salvage_ai_json_response(e.content)
+            except StructuredOutputError as e:
+                return json_response_data(
+                    success=False,
+                    message="Failed to get a reply, please try again",
+                    status_code=502,
+                    error=str(e)
+                )
+        except LLMUnavailableError as e:
+            return json_response_data(success=False, message=str(e), status_code=503)
+        except Exception as e:
+            return json_response_data(
+                success=False,
+                message="Failed to get a reply, please try again",
+                status_code=502,
+                error=str(e)
+            )
+
+        # transaction.atomic() is sync only
+        await sync_to_async(self.save_chat_turn)(
+            user, ai_character, memory, user_message, response_text, summary_update
+        )
+
+        return json_response_data(success=True, data={"response": response_text})
+
+
+class AsyncChatWithAICharacterStream(AICharacterChatMixin, AsyncAPIView):
+    """
+    Async variant of ChatWithAICharacterStream, same Server-Sent Events format.
+    A slow completion only holds a coroutine, not a worker thread.
+    """
+    authentication_required = True
+
+    async def post(self, request):
+        user = request.user
+        character_id = request.data.get("character_id")
+        user_message = request.data.get("message")
+
+        if not character_id or not user_message:
+            return json_response_data(success=False, message="character_id and message are required", status_code=400)
+
+        try:
+            _, model_name = await aselect_ai_model(request.data.get("model"))
+        except AIModels.DoesNotExist as e:
+            return json_response_data(success=False, message=str(e), status_code=400)
+
+        ai_character, memory = await self.aget_chat_context(user, character_id)
+        if not ai_character:
+            return json_response_data(success=False, message="AI character not found", status_code=404)
+
+        messages = await self.abuild_messages(user, ai_character, memory, user_message, stream=True)
+
+        return sse_response(
+            self.stream_reply(user, ai_character, memory, user_message, messages, model_name)
+        )
+
+    async def stream_reply(self, user, ai_character, memory, user_message, messages, model_name=None):
+        splitter = StreamedReplySplitter()
+
+        try:
+            stream = await achat_completion(
+                "chat_stream",
+                messages,
+                model=model_name,
+                temperature=0.7,
+                stream=True,
+                user=user,
+                ai_character=ai_character
+            )
+
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = splitter.feed(chunk.choices[0].delta.content)
+                if delta:
+                    yield sse_event("token", {"delta": delta})
+
+            delta = splitter.flush()
+            if delta:
+                yield sse_event("token", {"delta": delta})
+
+        except Exception as e:
+            yield sse_event("error", {"message": "Failed to get a reply, please try again", "error": str(e)})
+            return
+
+        response_text = splitter.response.strip()
+        summary_update = splitter.summary.strip()
+
+        await sync_to_async(self.save_chat_turn)(
+            user, ai_character, memory, user_message, response_text, summary_update
+        )
+
+        yield sse_event("done", {"response": response_text})
@@ -1,32 +1,60 @@
-import openai
-import re, json
+import json
+import re
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from accounts.serializers.user_serializers import UserSerializer
 from utils.response import response_data
-from django.conf import settings
 from django.db import transaction
 from characters.models import (
     AICharacter, AIChatMemory, AICharacterChatMessages
 )
 from characters.serializers.ai_character_chat_serializer import UserAiChatsSerializer
+from characters.prompts import CHAT_REPLY_SCHEMA, build_system_prompt, StreamedReplySplitter
+from characters.memory import summary_for_prompt
+from learn.ai_models import select_ai_model
+from learn.models import AIModels
+from utils.streaming import sse_event, sse_response
+from utils.llm import LLMUnavailableError, StructuredOutputError, chat_completion, json_schema_format, parse_structured
+from utils.pagination import decode_cursor, keyset_paginate, page_limit, page_offset
+from utils.db_router import read_from_replica
+from jobs.runner import enqueue
 
 
 class ListUserAiChats(APIView):
     permission_classes = [IsAuthenticated]
 
+    @read_from_replica
     def get(self, request, character_id):
+        """
+        Two pagination modes:
+        - ?cursor=<next_cursor> (empty for the first page): keyset pagination,
+          add &with_count=true to also get the total count
+        - ?offset=<n>: offset pagination (legacy)
+        """
         user = request.user
-        limit = int(request.query_params.get("limit", 20))
-        offset = int(request.query_params.get("offset", 0))
+        limit = page_limit(request.query_params.get("limit"), 20)
+        offset = page_offset(request.query_params.get("offset"))
 
         # Get all chat messages between user and the AI character
-        messages_qs = (
-            AICharacterChatMessages.objects
-            .filter(user=user, ai_character_id=character_id)
-            .select_related('ai_character')
-            .order_by('-created_at')  # newest first for pagination
-        )
+        messages_qs = self.get_messages_qs(user, character_id)
+
+        if "cursor" in request.query_params:
+            cursor = request.query_params["cursor"]
+            try:
+                position = decode_cursor(cursor) if cursor else None
+            except ValueError:
+                return response_data(success=False, message="Invalid cursor", status_code=400)
+
+            page, next_cursor = keyset_paginate(messages_qs, position, limit)
+
+            data = {
+                "next_cursor": next_cursor,
+                # reverse them before sending to display oldest-first in chat window
+                "data": UserAiChatsSerializer(reversed(page), many=True).data
+            }
+            if request.query_params.get("with_count") == "true":
+                data["count"] = messages_qs.count()
+            return response_data(success=True, data=data)
 
         total_count = messages_qs.count()
         paginated_messages = messages_qs[offset:offset + limit]
@@ -40,116 +68,89 @@ class ListUserAiChats(APIView):
             "data": serializer.data
         })
 
+    def get_messages_qs(self, user, character_id):
+        return (
+            AICharacterChatMessages.objects
+            .filter(user=user, ai_character_id=character_id)
+            .order_by('-created_at', '-id')  # newest first for pagination
+        )
 
-class ChatWithAICharacter(APIView):
-    permission_classes = [IsAuthenticated]
-
-    def post(self, request):
-        user = request.user
-        character_id = request.data.get("character_id")
-        user_message = request.data.get("message")
 
-        if not character_id or not user_message:
-            return response_data(success=False, message="character_id and message are required", status_code=400)
+class AICharacterChatMixin:
+    """
+    Shared steps of a chat turn: load the character and memory, build the
+    prompt messages and persist the turn once the reply is known.
+    """
 
+    def get_chat_context(self, user, character_id):
         ai_character = (
             AICharacter.objects.filter(id=character_id, is_active=True)
             .select_related("topic")
             .first()
         )
         if not ai_character:
-            return response_data(success=False, message="AI character not found", status_code=404)
+            return None, None
 
         memory, _ = AIChatMemory.objects.get_or_create(
             user=user,
             ai_character=ai_character,
             defaults={"summary": ""}
         )
+        return ai_character, memory
 
-        # --- Fetch clean recent messages for context ---
-        recent_messages = (
+    async def aget_chat_context(self, user, character_id):
+        ai_character = await (
+            AICharacter.objects.filter(id=character_id, is_active=True)
+            .select_related("topic")
+            .afirst()
+        )
+        if not ai_character:
+            return None, None
+
+        memory, _ = await AIChatMemory.objects.aget_or_create(
+            user=user,
+            ai_character=ai_character,
+            defaults={"summary": ""}
+        )
+        return ai_character, memory
+
+    def get_recent_messages_qs(self, user, ai_character):
+        return (
             AICharacterChatMessages.objects
             .filter(user=user, ai_character=ai_character)
             .exclude(message__exact="")  # skip empty messages
             .order_by("-created_at")[:4]
         )
-        recent_messages = reversed(recent_messages)  # chronological order
 
+    def build_messages(self, user, ai_character, memory, user_message, stream=False):
+        # --- Fetch clean recent messages for context ---
+        recent_messages = reversed(self.get_recent_messages_qs(user, ai_character))  # chronological order
+        return self.compose_messages(user, ai_character, memory, recent_messages, user_message, stream)
+
+    async def abuild_messages(self, user, ai_character, memory, user_message, stream=False):
+        recent_messages = [msg async for msg in self.get_recent_messages_qs(user, ai_character)]
+        recent_messages.reverse()  # chronological order
+        return self.compose_messages(user, ai_character, memory, recent_messages, user_message, stream)
+
+    def compose_messages(self, user, ai_character, memory, recent_messages, user_message, stream=False):
         chat_history = []
         for msg in recent_messages:
             role = "user" if msg.sender == AICharacterChatMessages.SENDER_USER else "assistant"
             chat_history.append({"role": role, "content": msg.message})
 
-        personality_str = (
-            ", ".join([f"{k}: {v}" for k, v in ai_character.personality.items()])
-            if ai_character.personality else "N/A"
+        system_prompt = build_system_prompt(
+            ai_character,
+            user_name=user.profile.name or user.username,
+            summary=summary_for_prompt(memory.summary),
+            stream=stream,
         )
 
-        # --- Stronger prompt for continuity ---
-        if ai_character.role == AICharacter.AI_ROLE_FRIEND:
-            system_prompt = f"""
-            always give response and summary strictly in JSON:
-            {{
-            "response": "<your message to the user>",
-            "summary": "<updated long-term summary reflecting this and past chats>"
-            }}
-            
-            Rules:
-            - No markdown, no code fences.
-            - Keep messages short and natural.
-            
-            You name is {ai_character.name}, a Friend companion chatting with {user.profile.name or user.username}.
-            "Topic": "{ai_character.topic.topic}",
-            "Personality": "{personality_str}",
-            "chat previous summary": "{memory.summary or 'None'}".
-            """
-        else:
-            system_prompt = f"""
-            always give response and summary strictly in JSON:
-            {{
-            "response": "<your message to the user>",
-            "summary": "<updated long-term summary reflecting this and past chats>"
-            }}
-            
-            Rules:
-            - No markdown, no code fences.
-            - Keep messages short and natural.
-            
-            Your name is "{ai_character.name}", a mentor guiding username:"{user.profile.name or user.username}" in "{ai_character.topic.topic}".
-            "your Personality" : "{personality_str}",
-            "chat Previous summary": "{memory.summary or 'None'}".
-            """
-
-        # --- Build and send messages ---
-        openai.api_key = settings.OPENAI_API_KEY
-
         messages = [{"role": "system", "content": system_prompt}]
         messages.extend(chat_history)
         messages.append({"role": "user", "content": user_message})
+        return messages
 
-        print("messages:", messages)
-
-        completion = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            temperature=0.7,
-            max_tokens=400
-        )
-
-        ai_output = completion.choices[0].message.content.strip()
-        print("[AI OUTPUT] :", ai_output)
-        
-        print()
-        print('-----------')
-
-        # --- Extract sections robustly ---
-        response_text, summary_update = self.extract_ai_json_response(ai_output)
-        
-        print('-response ---', response_text)
-        print()
-        print()
-        print('-summary ---', summary_update)
-
+    def save_chat_turn(self, user, ai_character, memory, user_message, response_text, summary_update):
         with transaction.atomic():
             AICharacterChatMessages.objects.create(
                 user=user,
@@ -164,58 +165,177 @@ class ChatWithAICharacter(APIView):
                 message=response_text,
             )
 
+            # merging (and compacting) the memory may call the LLM, leave it to a background job
             if summary_update:
-                memory.summary = (memory.summary.strip() + " " + summary_update).strip()
-                memory.save(update_fields=["summary", "updated_at"])
-
-        return response_data(success=True, data={"response": response_text})
-
+                enqueue("characters.update_chat_memory", memory_id=memory.id, summary_update=summary_update)
 
-    def extract_ai_json_response(self, ai_output: str):
+    def extract_ai_json_response(self, completion):
         """
-        Safely extracts structured JSON data from AI response.
+        Extracts structured JSON data from AI response, used as the `parse`
+        step of the gateway call.
 
-        The model is expected to return:
+        The model is asked for output matching CHAT_REPLY_SCHEMA:
         {
         "response": "<assistant message>",
         "summary": "<updated memory summary>"
         }
 
-        This helper:
-        - Removes unwanted Markdown code fences.
-        - Attempts to parse JSON.
-        - Falls back gracefully if parsing fails.
+        The reply is validated (with a local repair pass for stray code fences
+        or text around the JSON). If it still doesn't match StructuredOutputError
+        is raised, which records the call as invalid output, and the views try
+        salvage_ai_json_response on the raw output before giving up.
 
         Returns:
             tuple: (response_text, summary_text)
         """
-        if not ai_output:
-            return "", ""
+        data = parse_structured(completion.choices[0].message.content, CHAT_REPLY_SCHEMA)
+        return data["response"].strip(), data["summary"].strip()
+
+    def salvage_ai_json_response(self, content):
+        """
+        Pull complete "response" (and "summary") string fields out of a reply
+        that failed validation, e.g. one truncated after the response.
+        Raises StructuredOutputError when there is no non-empty response.
+        """
+        fields = {}
+        for name in ("response", "summary"):
+            match = re.search(rf'"{name}"\s*:\s*"((?:[^"\\]|\\.)*)"', content or "")
+            if match:
+                try:
+                    fields[name] = json.loads(f'"{match.group(1)}"').strip()
+                except ValueError:
+                    pass
+
+        if not fields.get("response"):
+            raise StructuredOutputError("no response in the reply", content)
+        return fields["response"], fields.get("summary", "")
+
+
+class ChatWithAICharacter(AICharacterChatMixin, APIView):
+    permission_classes = [IsAuthenticated]
 
-        # Clean any Markdown JSON fences
-        ai_output_clean = re.sub(r"^```json|```$", "", ai_output.strip(), flags=re.MULTILINE).strip()
+    def post(self, request):
+        user = request.user
+        character_id = request.data.get("character_id")
+        user_message = request.data.get("message")
+
+        if not character_id or not user_message:
+            return response_data(success=False, message="character_id and message are required", status_code=400)
+
+        try:
+            _, model_name = select_ai_model(request.data.get("model"))
+        except AIModels.DoesNotExist as e:
+            return response_data(success=False, message=str(e), status_code=400)
+
+        ai_character, memory = self.get_chat_context(user, character_id)
+        if not ai_character:
+            return response_data(success=False, message="AI character not found", status_code=404)
+
+        # --- Build and send messages ---
+        messages = self.build_messages(user, ai_character, memory, user_message)
 
         try:
-            data = json.loads(ai_output_clean)
-            response_text = str(data.get("response", "")).strip()
-            summary_text = str(data.get("summary", "")).strip()
-            return response_text, summary_text
+            response_text, summary_update = chat_completion(
+                "chat_reply",
+                messages,
+                model=model_name,
+                temperature=0.7,
+                response_format=json_schema_format("chat_reply", CHAT_REPLY_SCHEMA),
+                parse=self.extract_ai_json_response,
+                user=user,
+                ai_character=ai_character
+            )
+        except StructuredOutputError as e:
+            try:
+                response_text, summary_update = self.salvage_ai_json_response(e.content)
+            except StructuredOutputError as e:
+                return response_data(
+                    success=False,
+                    message="Failed to get a reply, please try again",
+                    status_code=502,
+                    error=str(e)
+                )
+        except LLMUnavailableError as e:
+            return response_data(success=False, message=str(e), status_code=503)
         except Exception as e:
-            # Try to extract manually if model output contains partial JSON
-            # Minimal fallback parsing
-            response_text, summary_text = "", ""
-            if '"response"' in ai_output_clean:
-                match = re.search(r'"response"\s*:\s*"([^"]+)"', ai_output_clean)
-                if match:
-                    response_text = match.group(1).strip()
-
-            if '"summary"' in ai_output_clean:
-                match = re.search(r'"summary"\s*:\s*"([^"]+)"', ai_output_clean)
-                if match:
-                    summary_text = match.group(1).strip()
-
-            # Fallback to full text if still empty
-            if not response_text and not summary_text:
-                response_text = ai_output_clean
-
-            return response_text, summary_text
+            return response_data(
+                success=False,
+                message="Failed to get a reply, please try again",
+                status_code=502,
+                error=str(e)
+            )
+
+        self.save_chat_turn(user, ai_character, memory, user_message, response_text, summary_update)
+
+        return response_data(success=True, data={"response": response_text})
+
+
+class ChatWithAICharacterStream(AICharacterChatMixin, APIView):
+    """
+    Streaming variant of ChatWithAICharacter.
+    Sends the reply as Server-Sent Events while it is generated:
+      event: token -> {"delta": "<text>"}   (repeated)
+      event: done  -> {"response": "<full reply>"}
+      event: error -> {"message": "...", "error": "..."}
+    Chat messages and the memory summary are saved once the stream finishes.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        user = request.user
+        character_id = request.data.get("character_id")
+        user_message = request.data.get("message")
+
+        if not character_id or not user_message:
+            return response_data(success=False, message="character_id and message are required", status_code=400)
+
+        try:
+            _, model_name = select_ai_model(request.data.get("model"))
+        except AIModels.DoesNotExist as e:
+            return response_data(success=False, message=str(e), status_code=400)
+
+        ai_character, memory = self.get_chat_context(user, character_id)
+        if not ai_character:
+            return response_data(success=False, message="AI character not found", status_code=404)
+
+        messages = self.build_messages(user, ai_character, memory, user_message, stream=True)
+
+        return sse_response(
+            self.stream_reply(user, ai_character, memory, user_message, messages, model_name)
+        )
+
+    def stream_reply(self, user, ai_character, memory, user_message, messages, model_name=None):
+        splitter = StreamedReplySplitter()
+
+        try:
+            stream = chat_completion(
+                "chat_stream",
+                messages,
+                model=model_name,
+                temperature=0.7,
+                stream=True,
+                user=user,
+                ai_character=ai_character
+            )
+
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = splitter.feed(chunk.choices[0].delta.content)
+                if delta:
+                    yield sse_event("token", {"delta": delta})
+
+            delta = splitter.flush()
+            if delta:
+                yield sse_event("token", {"delta": delta})
+
+        except Exception as e:
+            yield sse_event("error", {"message": "Failed to get a reply, please try again", "error": str(e)})
+            return
+
+        response_text = splitter.response.strip()
+        summary_update = splitter.summary.strip()
+
+        self.save_chat_turn(user, ai_character, memory, user_message, response_text, summary_update)
+
+        yield sse_event("done", {"response": response_text})
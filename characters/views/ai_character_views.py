@@ -2,6 +2,8 @@ from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from accounts.serializers.user_serializers import UserSerializer
 from utils.response import response_data
+from utils.catalog_cache import cache_catalog_response
+from utils.db_router import read_from_replica
 from django.shortcuts import get_object_or_404
 from characters.models import (
     AICharacter
@@ -11,6 +13,8 @@ from characters.serializers.ai_character_serializer import AiCharacterSerializer
 
 class ListAiCharacters(APIView):
 
+    @read_from_replica
+    @cache_catalog_response("ai_characters")
     def get(self, request):
         search = request.query_params.get("search")
         topic_id = request.query_params.get("topic_id")
@@ -18,7 +22,7 @@ class ListAiCharacters(APIView):
         limit = int(request.query_params.get("limit", 20))   # default 20
         offset = int(request.query_params.get("offset", 0))  # default 0
 
-        queryset = AICharacter.objects.filter(is_active=True).order_by("name")
+        queryset = AICharacter.objects.filter(is_active=True).select_related("topic").order_by("name")
 
         # Filtering
         if search:
@@ -43,6 +47,8 @@ class ListAiCharacters(APIView):
 
 class GetAiCharacterDetails(APIView):
 
+    @read_from_replica
+    @cache_catalog_response("ai_character_details")
     def get(self, request, character_id):
         # Use select_related for performance (fetch topic in same query)
         ai_character = get_object_or_404(
@@ -34,9 +34,12 @@ INSTALLED_APPS = [
     'accounts',
     'learn',
     'characters',
+    'jobs',
+    'llm_usage',
 ]
 
 MIDDLEWARE = [
+    'utils.profiling.RequestProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -66,16 +69,76 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'core.wsgi.application'
 
+# manage.py test, sets the settings tests need (see utils/test_runner.py)
+TEST_RUNNER = 'utils.test_runner.TestRunner'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# PostgreSQL when POSTGRES_DB is set, SQLite for local development otherwise
+if os.getenv('POSTGRES_DB'):
+    POSTGRES = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv('POSTGRES_DB'),
+        'USER': os.getenv('POSTGRES_USER'),
+        'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
+        'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
+        'PORT': os.getenv('POSTGRES_PORT', '5432'),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
+    }
+
+    # psycopg connection pool (needs psycopg[pool]), otherwise persistent connections
+    if os.getenv('POSTGRES_POOL', 'false').lower() == 'true':
+        POSTGRES['CONN_MAX_AGE'] = 0  # the pool manages connection lifetime
+        POSTGRES['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('POSTGRES_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('POSTGRES_POOL_MAX_SIZE', 10)),
+        }
+    else:
+        POSTGRES['CONN_MAX_AGE'] = int(os.getenv('POSTGRES_CONN_MAX_AGE', 60))
+
+    DATABASES = {'default': POSTGRES}
+
+    # read replicas, comma separated hosts, used by views marked @read_from_replica
+    for index, host in enumerate(filter(None, os.getenv('POSTGRES_REPLICA_HOSTS', '').split(',')), start=1):
+        DATABASES[f'replica{index}'] = {
+            **POSTGRES,
+            'HOST': host.strip(),
+            'OPTIONS': dict(POSTGRES['OPTIONS']),
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            # wait for concurrent writers instead of failing with "database is locked"
+            'OPTIONS': {'timeout': 20},
+        }
+    }
+
+DATABASE_ROUTERS = ['utils.db_router.PrimaryReplicaRouter']
+
+
+# Cache, shared by all workers (OTPs, throttling, response caches) when REDIS_URL is set.
+# Any Redis-compatible server works (Redis, Valkey, KeyDB), e.g. redis://localhost:6379/0
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+            'KEY_PREFIX': os.getenv('CACHE_KEY_PREFIX', 'learningmate'),
+        }
+    }
+else:
+    # per-process memory, only for local development and tests (a single worker)
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
     }
-}
 
 
 # Password validation
@@ -98,19 +161,36 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# password hashing (accounts.hashers), PASSWORD_HASHER is "pbkdf2" or "argon2" (needs argon2-cffi).
+# Hashes made with the other hasher or another cost are rehashed at the user's next login,
+# compare settings with the benchmark_password_hashers command
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'pbkdf2')
+PASSWORD_PBKDF2_ITERATIONS = int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', 0)) or None  # None: Django's default
+PASSWORD_ARGON2_TIME_COST = int(os.getenv('PASSWORD_ARGON2_TIME_COST', 2))
+PASSWORD_ARGON2_MEMORY_COST = int(os.getenv('PASSWORD_ARGON2_MEMORY_COST', 19456))  # KiB
+PASSWORD_ARGON2_PARALLELISM = int(os.getenv('PASSWORD_ARGON2_PARALLELISM', 1))
+PASSWORD_HASHERS = {
+    'pbkdf2': ['accounts.hashers.TunedPBKDF2PasswordHasher', 'accounts.hashers.TunedArgon2PasswordHasher'],
+    'argon2': ['accounts.hashers.TunedArgon2PasswordHasher', 'accounts.hashers.TunedPBKDF2PasswordHasher'],
+}[PASSWORD_HASHER]
+
 
 # Django REST auth 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "accounts.authentication.CachedJWTAuthentication",
+    ),
+    "DEFAULT_RENDERER_CLASSES": (
+        "utils.profiling.ProfiledJSONRenderer",  # times rendering for the profiling middleware
+        "rest_framework.renderers.BrowsableAPIRenderer",
     ),
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle',
+        'utils.throttling.AtomicAnonRateThrottle',
+        'utils.throttling.AtomicUserRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
-        'anon': '20/min',    # Unauthenticated users
-        'user': '100/min',   # Authenticated users
+        'anon': os.getenv('THROTTLE_ANON_RATE', '20/min'),    # Unauthenticated users
+        'user': os.getenv('THROTTLE_USER_RATE', '100/min'),   # Authenticated users
         'signup': '5/min',
         'login': '10/min',
         'otp': '5/min',
@@ -126,6 +206,8 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
+# seconds an authenticated user (with profile) is cached for, dropped on user or profile saves
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', 60))
 
 
 # CORS config
@@ -167,21 +249,98 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
 # EMAIL config 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-EMAIL_HOST = 'smtp.gmail.com'
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
+# for local development and tests point these at a stand-in, e.g. EMAIL_HOST=localhost
+# EMAIL_PORT=1025 EMAIL_USE_TLS=false with `python -m aiosmtpd -n -l localhost:1025`,
+# or EMAIL_BACKEND=django.core.mail.backends.console.EmailBackend
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', 587))
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'true').lower() == 'true'
+EMAIL_TIMEOUT = int(os.getenv('EMAIL_TIMEOUT', 30))
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# outbound email queue, send queued emails from a background thread of the web process,
+# set to false when the send_queued_emails command runs as a worker
+EMAIL_QUEUE_BACKGROUND_SEND = os.getenv('EMAIL_QUEUE_BACKGROUND_SEND', 'true').lower() == 'true'
+EMAIL_QUEUE_MAX_ATTEMPTS = int(os.getenv('EMAIL_QUEUE_MAX_ATTEMPTS', 5))
+EMAIL_QUEUE_RETRY_DELAY = int(os.getenv('EMAIL_QUEUE_RETRY_DELAY', 30))  # seconds, doubled after each failure
+
 
 # integrations config 
 GOOGLE_AUTH_CLIENT_ID = os.getenv('GOOGLE_AUTH_CLIENT_ID')
 GOOGLE_AUTH_CLIENT_SECRET = os.getenv('GOOGLE_AUTH_CLIENT_SECRET')
 GOOGLE_AUTH_SCOPE = os.getenv('GOOGLE_AUTH_SCOPE')
 GOOGLE_CALLBACK_URI = os.getenv('GOOGLE_CALLBACK_URI')
+# Google endpoints, point them at the mock_google_oauth_server command to sign in without Google
+GOOGLE_AUTH_URL = os.getenv('GOOGLE_AUTH_URL', 'https://accounts.google.com/o/oauth2/v2/auth')
+GOOGLE_TOKEN_URL = os.getenv('GOOGLE_TOKEN_URL', 'https://oauth2.googleapis.com/token')
+GOOGLE_USER_INFO_URL = os.getenv('GOOGLE_USER_INFO_URL', 'https://www.googleapis.com/oauth2/v2/userinfo')
+GOOGLE_JWKS_URL = os.getenv('GOOGLE_JWKS_URL', 'https://www.googleapis.com/oauth2/v3/certs')
+GOOGLE_HTTP_CONNECT_TIMEOUT = float(os.getenv('GOOGLE_HTTP_CONNECT_TIMEOUT', 3))
+GOOGLE_HTTP_TIMEOUT = float(os.getenv('GOOGLE_HTTP_TIMEOUT', 10))  # read timeout of each call to Google
+GOOGLE_HTTP_POOL_SIZE = int(os.getenv('GOOGLE_HTTP_POOL_SIZE', 10))
 
 
 # openAI API 
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
\ No newline at end of file
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+# e.g. http://localhost:8100/v1 for the mock_llm_server command (load tests, local development)
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or None
+
+# LLM gateway (utils.llm), model used when a request doesn't pick an AIModels row,
+# retries of failed calls within a retry budget and the circuit breaker
+LLM_DEFAULT_MODEL = os.getenv('LLM_DEFAULT_MODEL', 'gpt-4o-mini')
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', 5))  # seconds, read timeouts are per endpoint
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 2))
+LLM_RETRY_BUDGET_RATIO = float(os.getenv('LLM_RETRY_BUDGET_RATIO', 0.2))  # retries per call over time
+LLM_RETRY_BUDGET_RESERVE = int(os.getenv('LLM_RETRY_BUDGET_RESERVE', 10))
+LLM_CIRCUIT_FAILURES = int(os.getenv('LLM_CIRCUIT_FAILURES', 5))  # failures in a row that open the circuit
+LLM_CIRCUIT_RESET = int(os.getenv('LLM_CIRCUIT_RESET', 30))  # seconds between trial calls while open
+# record every LLM call (tokens, cost, latency, outcome) as an LLMCall row, written in batches
+LLM_USAGE_RECORDING = os.getenv('LLM_USAGE_RECORDING', 'true').lower() == 'true'
+LLM_USAGE_FLUSH_INTERVAL = int(os.getenv('LLM_USAGE_FLUSH_INTERVAL', 5))  # seconds
+LLM_USAGE_BUFFERED = os.getenv('LLM_USAGE_BUFFERED', 'true').lower() == 'true'  # false: one INSERT per call
+
+
+# question pool (pre-generated questions for GenerateQuestion)
+QUESTION_POOL_LOW_WATERMARK = int(os.getenv('QUESTION_POOL_LOW_WATERMARK', 5))
+QUESTION_POOL_HIGH_WATERMARK = int(os.getenv('QUESTION_POOL_HIGH_WATERMARK', 20))
+# refill low pools from a background thread of the web process,
+# set to false when the refill_question_pool command runs as a worker
+QUESTION_POOL_BACKGROUND_REFILL = os.getenv('QUESTION_POOL_BACKGROUND_REFILL', 'true').lower() == 'true'
+
+
+# AI character chat memory, max tokens of the long-term summary sent in each chat prompt
+CHAT_MEMORY_TOKEN_BUDGET = int(os.getenv('CHAT_MEMORY_TOKEN_BUDGET', 300))
+
+
+# AnswerResults review cache
+REVIEW_CACHE_TTL = int(os.getenv('REVIEW_CACHE_TTL', 60 * 60 * 24))
+# semantic tier: reuse reviews of near-identical answers (costs one embedding call per miss)
+REVIEW_CACHE_SEMANTIC = os.getenv('REVIEW_CACHE_SEMANTIC', 'false').lower() == 'true'
+REVIEW_CACHE_SIMILARITY = float(os.getenv('REVIEW_CACHE_SIMILARITY', 0.95))
+REVIEW_CACHE_MAX_ENTRIES = int(os.getenv('REVIEW_CACHE_MAX_ENTRIES', 10000))
+
+
+# leaderboards, Redis sorted sets for O(log n) ranks when set, the database index otherwise
+LEADERBOARD_REDIS_URL = os.getenv('LEADERBOARD_REDIS_URL', os.getenv('REDIS_URL'))
+
+
+# catalog endpoints cache (categories, topics, AI characters), invalidated on admin saves
+CATALOG_CACHE_TTL = int(os.getenv('CATALOG_CACHE_TTL', 60 * 60))
+
+
+# background jobs (chat memory upkeep, statistics roll-ups), run by a thread pool in the
+# web process, set JOBS_BACKGROUND_RUN to false when the run_jobs command runs as a worker
+JOBS_BACKGROUND_RUN = os.getenv('JOBS_BACKGROUND_RUN', 'true').lower() == 'true'
+JOBS_WORKERS = int(os.getenv('JOBS_WORKERS', 2))
+JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', 3))
+JOBS_RETRY_DELAY = int(os.getenv('JOBS_RETRY_DELAY', 10))  # seconds, doubled after each failure
+
+
+# request profiling (utils.profiling), requests slower than PROFILING_SLOW_MS are kept for
+# /debug/profiling/slow-requests, with DEBUG on every response gets a Server-Timing header
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'true').lower() == 'true'
+PROFILING_SLOW_MS = int(os.getenv('PROFILING_SLOW_MS', 500))
+PROFILING_BUFFER_SIZE = int(os.getenv('PROFILING_BUFFER_SIZE', 100))
@@ -16,10 +16,14 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from utils.profiling_views import SlowRequestsView
 
 urlpatterns = [
     path('super-admin/', admin.site.urls),
     path('user/', include('accounts.urls')),
     path('learn/', include('learn.urls')),
     path('ai-characters/', include('characters.urls')),
+
+    # admins only, slowest recent requests of the worker process answering
+    path('debug/profiling/slow-requests', SlowRequestsView.as_view()),
 ]
@@ -0,0 +1,46 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from jobs.models import Job
+from jobs.runner import BATCH_SIZE, run_due_jobs, workers
+from llm_usage.recorder import flush as flush_llm_usage
+
+
+class Command(BaseCommand):
+    help = "Run the queued background jobs that are due, retrying failed ones with backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help=f"Jobs claimed per batch (default {BATCH_SIZE})")
+        parser.add_argument("--workers", type=int, help="Worker threads (default JOBS_WORKERS)")
+        parser.add_argument("--loop", action="store_true", help="Keep running as a background worker")
+        parser.add_argument("--interval", type=int, default=5, help="Seconds between passes with --loop (default 5)")
+        parser.add_argument("--prune-days", type=int, default=7, help="Delete jobs finished more than this many days ago (default 7)")
+
+    def handle(self, *args, **options):
+        with ThreadPoolExecutor(max_workers=options["workers"] or workers()) as executor:
+            while True:
+                self.run_once(options, executor)
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
+
+    def run_once(self, options, executor):
+        total_done = total_failed = 0
+        while True:
+            done, failed = run_due_jobs(options["batch_size"], executor=executor)
+            if not done and not failed:
+                break
+            total_done += done
+            total_failed += failed
+        flush_llm_usage()  # the tasks' LLM calls, the process may exit before the background flush
+
+        if total_done or total_failed:
+            self.stdout.write(f"ran {total_done} jobs, {total_failed} failed attempts")
+
+        pruned, _ = Job.objects.filter(
+            status="done", finished_at__lt=timezone.now() - timedelta(days=options["prune_days"])
+        ).delete()
+        if pruned:
+            self.stdout.write(f"pruned {pruned} finished jobs")
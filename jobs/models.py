@@ -0,0 +1,33 @@
+from django.db import models
+
+# models here..
+
+class Job(models.Model):
+    """Deferred unit of work, run by jobs.runner with the registered task `name`."""
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)  # keyword arguments of the task
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField()
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Job"
+        verbose_name_plural = "Jobs"
+        ordering = ["id"]
+        indexes = [
+            # runner: filter (status, run_after <= now)
+            models.Index(fields=["status", "run_after"], name="job_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
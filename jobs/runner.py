@@ -0,0 +1,226 @@
+"""
+Background job runner for work a response doesn't have to wait for
+(chat memory upkeep, statistics roll-ups and similar bookkeeping).
+
+Views call enqueue(), which only inserts a Job row inside the caller's
+transaction. Jobs are run by a pool of JOBS_WORKERS threads, either in the web
+process (JOBS_BACKGROUND_RUN) or by the `run_jobs` management command. A job
+that raises is retried with exponential backoff up to JOBS_MAX_ATTEMPTS times.
+
+Tasks are functions registered with @task in an app's tasks.py and called with
+the job payload as keyword arguments. A job can run more than once (a retry
+after a partial failure, a worker dying mid-job), so tasks must be idempotent.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 20
+CLAIM_SECONDS = 10 * 60  # a running job is retried after this if its worker died
+MAX_SLEEP_SECONDS = 60 * 60
+
+_tasks = {}
+
+_runner_thread = None
+_runner_lock = threading.Lock()
+_wakeup = threading.Event()
+
+
+def workers():
+    return getattr(settings, "JOBS_WORKERS", 2)
+
+
+def max_attempts():
+    return getattr(settings, "JOBS_MAX_ATTEMPTS", 3)
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt: base, 2x base, 4x base..."""
+    base = getattr(settings, "JOBS_RETRY_DELAY", 10)
+    return timedelta(seconds=base * 2 ** (attempts - 1))
+
+
+# --- registering and queueing ---
+
+def task(name):
+    """Register a function as the task run for jobs called `name`."""
+    def decorator(func):
+        _tasks[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, **payload):
+    """Queue a job, the background runner is woken once the transaction commits."""
+    if name not in _tasks:
+        raise ValueError(f"No task registered as '{name}'")
+
+    job = Job.objects.create(name=name, payload=payload, run_after=timezone.now())
+    transaction.on_commit(request_run)
+    return job
+
+
+# --- running ---
+
+def due_jobs():
+    return Job.objects.filter(status="pending", run_after__lte=timezone.now())
+
+
+def claim_due_jobs(limit=BATCH_SIZE):
+    """
+    Mark up to `limit` due jobs as running, conditional on them being unchanged
+    so concurrent runners never take the same job.
+    """
+    now = timezone.now()
+    recover_stuck_jobs(now)
+
+    claimed = []
+    claim_until = now + timedelta(seconds=CLAIM_SECONDS)
+    for job in due_jobs().order_by("run_after", "id")[:limit]:
+        updated = Job.objects.filter(
+            id=job.id, status="pending", run_after=job.run_after
+        ).update(status="running", run_after=claim_until)
+        if updated:
+            claimed.append(job)
+    return claimed
+
+
+def recover_stuck_jobs(now):
+    """
+    Jobs left running by a dead worker are retried once their claim expired.
+    The lost run counts as an attempt, so a job that keeps killing its worker
+    fails after JOBS_MAX_ATTEMPTS like one that raises.
+    """
+    stuck = Job.objects.filter(status="running", run_after__lte=now)
+    error = "the worker running the job died"
+
+    failed = stuck.filter(attempts__gte=max_attempts() - 1).update(
+        status="failed", attempts=F("attempts") + 1, last_error=error, finished_at=now
+    )
+    retried = stuck.update(status="pending", attempts=F("attempts") + 1, last_error=error)
+    if failed or retried:
+        logger.warning("recovered stuck jobs: %s retried, %s failed", retried, failed)
+
+
+def run_job(job):
+    """Run one claimed job and record the outcome. Returns True when it succeeded."""
+    try:
+        func = _tasks.get(job.name)
+        if func is None:
+            raise LookupError(f"No task registered as '{job.name}'")
+
+        func(**job.payload)
+    except Exception as e:
+        job.attempts += 1
+        job.last_error = str(e)
+        if job.attempts >= max_attempts():
+            job.status = "failed"
+            job.finished_at = timezone.now()
+            logger.exception("giving up on job %s (%s)", job.id, job.name)
+        else:
+            job.status = "pending"
+            job.run_after = timezone.now() + retry_delay(job.attempts)
+            logger.warning("job %s (%s) attempt %s failed: %s", job.id, job.name, job.attempts, e)
+        job.save(update_fields=["attempts", "last_error", "status", "run_after", "finished_at"])
+        return False
+    else:
+        job.attempts += 1
+        job.status = "done"
+        job.last_error = ""
+        job.finished_at = timezone.now()
+        job.save(update_fields=["attempts", "last_error", "status", "finished_at"])
+        return True
+    finally:
+        connection.close()  # this worker thread's own DB connection
+
+
+def run_due_jobs(limit=BATCH_SIZE, executor=None):
+    """
+    Run the jobs that are due on the executor's threads (a temporary pool
+    when none is given). Returns (done, failed) counts of this batch.
+    """
+    jobs = claim_due_jobs(limit)
+    if not jobs:
+        return 0, 0
+
+    if executor is None:
+        with ThreadPoolExecutor(max_workers=workers()) as pool:
+            results = list(pool.map(run_job, jobs))
+    else:
+        results = list(executor.map(run_job, jobs))
+
+    done = sum(results)
+    return done, len(results) - done
+
+
+def seconds_until_next_job():
+    """Seconds until the earliest pending or running job is due, None when the queue is empty."""
+    run_after = (
+        Job.objects.filter(status__in=["pending", "running"])
+        .order_by("run_after")
+        .values_list("run_after", flat=True)
+        .first()
+    )
+    if run_after is None:
+        return None
+    return max((run_after - timezone.now()).total_seconds(), 0)
+
+
+# --- background runner ---
+
+def request_run():
+    """
+    Wake the background runner thread of this process, starting it if needed.
+    Does nothing when JOBS_BACKGROUND_RUN is off (jobs are then run only by
+    the management command).
+    """
+    global _runner_thread
+
+    if not getattr(settings, "JOBS_BACKGROUND_RUN", True):
+        return
+
+    with _runner_lock:
+        _wakeup.set()
+        if _runner_thread is not None:
+            return
+        _runner_thread = threading.Thread(target=_run_in_background, daemon=True)
+        _runner_thread.start()
+
+
+def _run_in_background():
+    global _runner_thread
+
+    executor = ThreadPoolExecutor(max_workers=workers(), thread_name_prefix="jobs")
+    try:
+        while True:
+            _wakeup.clear()
+            try:
+                while run_due_jobs(executor=executor) != (0, 0):
+                    pass
+                delay = seconds_until_next_job()
+            except Exception:
+                logger.exception("background job runner failed")
+                delay = CLAIM_SECONDS
+
+            with _runner_lock:
+                if delay is None and not _wakeup.is_set():
+                    _runner_thread = None
+                    return
+
+            # sleep until the next retry is due or a new job is queued
+            connection.close()
+            _wakeup.wait(timeout=min(delay if delay is not None else 0, MAX_SLEEP_SECONDS))
+    finally:
+        with _runner_lock:
+            if _runner_thread is threading.current_thread():
+                _runner_thread = None
+        executor.shutdown(wait=False)
+        connection.close()  # this thread's own DB connection
@@ -0,0 +1,127 @@
+from datetime import timedelta
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from jobs import runner
+from jobs.models import Job
+from jobs.runner import claim_due_jobs, due_jobs, enqueue, recover_stuck_jobs, request_run, run_job, task
+
+calls = []
+
+
+@task("jobs.tests.record")
+def record(**payload):
+    calls.append(payload)
+
+
+@task("jobs.tests.fail")
+def fail(**payload):
+    raise RuntimeError("upstream is down")
+
+
+@override_settings(JOBS_BACKGROUND_RUN=False, JOBS_MAX_ATTEMPTS=3, JOBS_RETRY_DELAY=10)
+class JobRunnerTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+        # run_job closes its worker thread's connection, which would end the test's transaction
+        patcher = mock.patch.object(runner, "connection")
+        self.connection = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_due(self):
+        Job.objects.filter(status="pending").update(run_after=timezone.now())
+
+    def run_claimed(self):
+        return [run_job(job) for job in claim_due_jobs()]
+
+    def test_enqueue_waits_for_the_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            job = enqueue("jobs.tests.record", topic_id=1)
+        self.assertEqual(callbacks, [request_run])
+        self.assertEqual((job.status, job.payload), ("pending", {"topic_id": 1}))
+
+        self.assertEqual(self.run_claimed(), [True])
+        self.assertEqual(calls, [{"topic_id": 1}])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("done", 1))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_unknown_task_is_refused(self):
+        with self.assertRaises(ValueError):
+            enqueue("jobs.tests.missing")
+        self.assertFalse(Job.objects.exists())
+
+    def test_a_due_job_is_claimed_once(self):
+        job = enqueue("jobs.tests.record")
+        # what a second runner read before the first one claimed the job
+        seen_by_second_runner = list(due_jobs())
+
+        self.assertEqual(claim_due_jobs(), [job])
+        with mock.patch.object(runner, "due_jobs") as second_due_jobs:
+            second_due_jobs.return_value.order_by.return_value.__getitem__.return_value = seen_by_second_runner
+            self.assertEqual(claim_due_jobs(), [])
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, "running")
+        self.assertGreater(job.run_after, timezone.now())
+
+    def test_failed_job_is_retried_with_backoff(self):
+        job = enqueue("jobs.tests.fail")
+
+        with self.assertLogs("jobs.runner", "WARNING"):
+            before = timezone.now()
+            self.assertEqual(self.run_claimed(), [False])
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, job.last_error), ("pending", 1, "upstream is down"))
+            self.assertGreaterEqual(job.run_after, before + timedelta(seconds=10))
+            self.assertEqual(claim_due_jobs(), [])  # not due before the backoff
+
+            self.make_due()
+            before = timezone.now()
+            self.assertEqual(self.run_claimed(), [False])
+            job.refresh_from_db()
+            self.assertEqual(job.attempts, 2)
+            self.assertGreaterEqual(job.run_after, before + timedelta(seconds=20))
+
+    def test_job_fails_after_max_attempts(self):
+        job = enqueue("jobs.tests.fail")
+
+        with self.assertLogs("jobs.runner", "WARNING") as logs:
+            for _ in range(3):
+                self.make_due()
+                self.assertEqual(self.run_claimed(), [False])
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("failed", 3))
+        self.assertIsNotNone(job.finished_at)
+        self.assertIn("giving up", logs.output[-1])
+
+        self.make_due()
+        self.assertEqual(claim_due_jobs(), [])
+
+    def test_stuck_job_counts_the_lost_run_as_an_attempt(self):
+        now = timezone.now()
+        stuck = Job.objects.create(name="jobs.tests.record", status="running", run_after=now - timedelta(seconds=1))
+        last_try = Job.objects.create(
+            name="jobs.tests.record", status="running", attempts=2, run_after=now - timedelta(seconds=1)
+        )
+        still_running = Job.objects.create(name="jobs.tests.record", status="running", run_after=now + timedelta(minutes=5))
+
+        with self.assertLogs("jobs.runner", "WARNING"):
+            recover_stuck_jobs(now)
+
+        stuck.refresh_from_db()
+        self.assertEqual((stuck.status, stuck.attempts), ("pending", 1))
+        self.assertEqual(stuck.last_error, "the worker running the job died")
+        last_try.refresh_from_db()
+        self.assertEqual((last_try.status, last_try.attempts), ("failed", 3))
+        still_running.refresh_from_db()
+        self.assertEqual((still_running.status, still_running.attempts), ("running", 0))
+
+    def test_run_job_closes_its_connection(self):
+        enqueue("jobs.tests.record")
+        enqueue("jobs.tests.fail")
+        with self.assertLogs("jobs.runner", "WARNING"):
+            self.assertEqual(self.run_claimed(), [True, False])
+        self.assertEqual(self.connection.close.call_count, 2)
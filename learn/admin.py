@@ -1,9 +1,11 @@
 from django.contrib import admin
-from learn.models import AIModels, LearningCategory, LearningTopic, UserLearningHistory
+from learn.models import AIModels, LearningCategory, LearningTopic, UserLearningHistory, PooledQuestion, LeaderboardScore
 # Register your models here.
 
 
 admin.site.register(AIModels)
 admin.site.register(LearningCategory)
 admin.site.register(LearningTopic)
-admin.site.register(UserLearningHistory)
\ No newline at end of file
+admin.site.register(UserLearningHistory)
+admin.site.register(PooledQuestion)
+admin.site.register(LeaderboardScore)
\ No newline at end of file
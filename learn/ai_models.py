@@ -0,0 +1,40 @@
+"""
+Per-request model selection from the AIModels table.
+
+Clients pick a model with a `model` parameter holding an AIModels name or
+label, the row's name is the model id sent to the LLM gateway. Without one
+LLM_DEFAULT_MODEL is used, linked to its AIModels row when it has one.
+"""
+from django.db.models import Q
+from learn.models import AIModels
+from utils.llm import default_model
+
+
+def requested_models(requested):
+    if requested:
+        return AIModels.objects.filter(Q(name=requested) | Q(label=requested)).order_by("id")
+    return AIModels.objects.filter(name=default_model())
+
+
+def select_ai_model(requested=None):
+    """
+    Return (ai_model, model_name) for a request, ai_model is None when the
+    default model has no AIModels row. Raises AIModels.DoesNotExist for an
+    unknown requested model.
+    """
+    ai_model = requested_models(requested).first()
+    if ai_model is None:
+        if requested:
+            raise AIModels.DoesNotExist(f"Unknown model '{requested}'")
+        return None, default_model()
+    return ai_model, ai_model.name
+
+
+async def aselect_ai_model(requested=None):
+    """Async version of select_ai_model."""
+    ai_model = await requested_models(requested).afirst()
+    if ai_model is None:
+        if requested:
+            raise AIModels.DoesNotExist(f"Unknown model '{requested}'")
+        return None, default_model()
+    return ai_model, ai_model.name
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class LearnConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'learn'
+
+    def ready(self):
+        from learn import signals  # noqa: F401
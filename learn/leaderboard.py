@@ -0,0 +1,289 @@
+"""
+Leaderboards: global, per topic and per category, all time and per ISO week.
+
+LeaderboardScore rows are the durable store. record_answer_score() adds each
+reviewed answer to the user's rows with atomic F() increments, and
+update_user_scores() rebuilds a user's rows from their learning history for
+repairs (see the rebuild_leaderboards command). Rankings are read from:
+- Redis sorted sets when LEADERBOARD_REDIS_URL is set: ZREVRANGE for the top N
+  and ZCOUNT above the user's score for their rank, both O(log n). A board
+  missing from Redis (new, or after a flush) is loaded from the table on first read.
+- otherwise the leaderboard_rank_idx index: the top N is an index range scan
+  and a rank counts the index entries above the user's score.
+
+Ranks are competition ranks, users with the same score share a rank.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+from accounts.models import MyUsers
+from learn.models import LeaderboardScore, UserLearningHistory
+
+GLOBAL_BOARD = "global"
+PERIODS = ("all", "week")
+WEEKLY_TTL_SECONDS = 8 * 7 * 24 * 60 * 60  # weekly sorted sets outlive their week for late readers
+LOAD_CHUNK_SIZE = 10000
+
+
+def topic_board(topic_id):
+    return f"topic:{topic_id}"
+
+
+def category_board(category_id):
+    return f"category:{category_id}"
+
+
+def week_start(now=None):
+    now = timezone.localtime(now or timezone.now())
+    monday = now.date() - timedelta(days=now.weekday())
+    return timezone.make_aware(datetime.combine(monday, time.min), now.tzinfo)
+
+
+def week_period(now=None):
+    year, week, _ = timezone.localtime(now or timezone.now()).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def resolve_period(period):
+    """Map the API's "all" / "week" to the stored period key."""
+    return week_period() if period == "week" else LeaderboardScore.PERIOD_ALL_TIME
+
+
+# --- ranking backends ---
+
+class DatabaseRanking:
+    """Ranks straight from the LeaderboardScore table and its (board, period, -score) index."""
+
+    def set_scores(self, scores):
+        pass  # the LeaderboardScore rows are the ranking
+
+    def reset(self, board=None, period=None):
+        pass
+
+    def top_qs(self, board, period):
+        return (
+            LeaderboardScore.objects
+            .filter(board=board, period=period)
+            .order_by("-score", "user_id")
+            .values_list("user_id", "score")
+        )
+
+    def above_qs(self, board, period, score):
+        return LeaderboardScore.objects.filter(board=board, period=period, score__gt=score)
+
+    def top(self, board, period, limit):
+        return list(self.top_qs(board, period)[:limit])
+
+    def rank(self, board, period, user_id):
+        """Return (rank, score) of the user, None when they have no score on the board."""
+        score = (
+            LeaderboardScore.objects
+            .filter(board=board, period=period, user_id=user_id)
+            .values_list("score", flat=True)
+            .first()
+        )
+        if score is None:
+            return None
+        above = self.above_qs(board, period, score).count()
+        return above + 1, score
+
+
+class RedisRanking:
+    """Ranks from one Redis sorted set per (board, period), member = user id."""
+    LOADED_KEY = "leaderboard:loaded"
+
+    def __init__(self, url):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+
+    def key(self, board, period):
+        return f"leaderboard:{board}:{period}"
+
+    def expire_weekly(self, pipe, key, period):
+        if period != LeaderboardScore.PERIOD_ALL_TIME:
+            pipe.expire(key, WEEKLY_TTL_SECONDS)
+
+    def set_scores(self, scores):
+        pipe = self.client.pipeline(transaction=False)
+        for entry in scores:
+            key = self.key(entry.board, entry.period)
+            pipe.zadd(key, {entry.user_id: entry.score})
+            self.expire_weekly(pipe, key, entry.period)
+        pipe.execute()
+
+    def ensure_loaded(self, board, period):
+        """Copy a board from the table into its sorted set the first time it's read."""
+        key = self.key(board, period)
+        if self.client.sismember(self.LOADED_KEY, key):
+            return key
+
+        rows = (
+            LeaderboardScore.objects
+            .filter(board=board, period=period)
+            .values_list("user_id", "score")
+            .iterator(chunk_size=LOAD_CHUNK_SIZE)
+        )
+        chunk = {}
+        for user_id, score in rows:
+            chunk[user_id] = score
+            if len(chunk) >= LOAD_CHUNK_SIZE:
+                self.client.zadd(key, chunk)
+                chunk = {}
+
+        pipe = self.client.pipeline(transaction=False)
+        if chunk:
+            pipe.zadd(key, chunk)
+        self.expire_weekly(pipe, key, period)
+        pipe.sadd(self.LOADED_KEY, key)
+        pipe.execute()
+        return key
+
+    def reset(self, board=None, period=None):
+        """Drop loaded sorted sets (all of them by default), they're reloaded from the table on next read."""
+        if board is not None:
+            keys = [self.key(board, period)]
+        else:
+            keys = [key.decode() for key in self.client.smembers(self.LOADED_KEY)]
+        if keys:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.srem(self.LOADED_KEY, *keys)
+            pipe.delete(*keys)
+            pipe.execute()
+
+    def top(self, board, period, limit):
+        key = self.ensure_loaded(board, period)
+        return [
+            (int(member), int(score))
+            for member, score in self.client.zrevrange(key, 0, limit - 1, withscores=True)
+        ]
+
+    def rank(self, board, period, user_id):
+        key = self.ensure_loaded(board, period)
+        score = self.client.zscore(key, user_id)
+        if score is None:
+            return None
+        above = self.client.zcount(key, f"({score}", "+inf")
+        return above + 1, int(score)
+
+
+_ranking = None
+
+
+def get_ranking():
+    global _ranking
+    if _ranking is None:
+        url = getattr(settings, "LEADERBOARD_REDIS_URL", None)
+        _ranking = RedisRanking(url) if url else DatabaseRanking()
+    return _ranking
+
+
+# --- maintaining scores ---
+
+def record_answer_score(user_id, topic_id, category_id, score, now=None):
+    """
+    Add one answered question with its score to the user's global, topic and
+    category boards, all time and this week. One UPDATE in the common case;
+    the sorted sets get the new totals once the transaction commits.
+    """
+    boards = (GLOBAL_BOARD, topic_board(topic_id), category_board(category_id))
+    periods = (LeaderboardScore.PERIOD_ALL_TIME, week_period(now))
+    increment = dict(score=F("score") + score, questions_asked=F("questions_asked") + 1, updated_at=timezone.now())
+    rows = LeaderboardScore.objects.filter(user_id=user_id, board__in=boards, period__in=periods)
+
+    if rows.update(**increment) < len(boards) * len(periods):
+        # first answer on some boards (or the first this week), a concurrent answer may create them first
+        existing = set(rows.values_list("board", "period"))
+        for board in boards:
+            for period in periods:
+                if (board, period) in existing:
+                    continue
+                try:
+                    with transaction.atomic():
+                        LeaderboardScore.objects.create(
+                            board=board, period=period, user_id=user_id, score=score, questions_asked=1
+                        )
+                except IntegrityError:
+                    rows.filter(board=board, period=period).update(**increment)
+
+    # absolute totals rather than increments, so a board loaded into Redis meanwhile isn't counted twice
+    transaction.on_commit(lambda: get_ranking().set_scores(list(rows)))
+
+
+def update_user_scores(user_id, now=None):
+    """
+    Rebuild all leaderboard scores of a user (all time and the current week)
+    from their learning history with one aggregate query and one bulk upsert.
+    """
+    start = week_start(now)
+    week = week_period(now)
+
+    rows = (
+        UserLearningHistory.objects
+        .filter(user_id=user_id)
+        .order_by()
+        .values("topic_id", "topic__category_id")
+        .annotate(
+            total_score=Sum("score"),
+            questions=Count("id"),
+            week_score=Sum("score", filter=Q(created_at__gte=start)),
+            week_questions=Count("id", filter=Q(created_at__gte=start)),
+        )
+    )
+
+    totals = defaultdict(lambda: [0, 0])  # (board, period) -> [score, questions]
+    for row in rows:
+        boards = (GLOBAL_BOARD, topic_board(row["topic_id"]), category_board(row["topic__category_id"]))
+        for board in boards:
+            totals[(board, LeaderboardScore.PERIOD_ALL_TIME)][0] += row["total_score"] or 0
+            totals[(board, LeaderboardScore.PERIOD_ALL_TIME)][1] += row["questions"]
+            if row["week_questions"]:
+                totals[(board, week)][0] += row["week_score"] or 0
+                totals[(board, week)][1] += row["week_questions"]
+
+    scores = [
+        LeaderboardScore(board=board, period=period, user_id=user_id, score=score, questions_asked=questions)
+        for (board, period), (score, questions) in totals.items()
+    ]
+    LeaderboardScore.objects.bulk_create(
+        scores,
+        update_conflicts=True,
+        unique_fields=["board", "period", "user"],
+        update_fields=["score", "questions_asked", "updated_at"]
+    )
+    get_ranking().set_scores(scores)
+    return len(scores)
+
+
+# --- reading ---
+
+def get_leaderboard(board, period="all", limit=10, user=None):
+    """Top `limit` users of a board, plus the requesting user's own rank when given."""
+    ranking = get_ranking()
+    period_key = resolve_period(period)
+
+    top = ranking.top(board, period_key, limit)
+    users = MyUsers.objects.select_related("profile").in_bulk([user_id for user_id, _ in top])
+
+    entries = []
+    rank = 0
+    previous_score = None
+    for position, (user_id, score) in enumerate(top, start=1):
+        if score != previous_score:
+            rank, previous_score = position, score
+        member = users.get(user_id)
+        entries.append({
+            "rank": rank,
+            "user_id": user_id,
+            "name": member.profile_name if member else None,
+            "score": score,
+        })
+
+    data = {"board": board, "period": period_key, "top": entries}
+    if user is not None:
+        mine = ranking.rank(board, period_key, user.id)
+        data["me"] = {"rank": mine[0], "score": mine[1]} if mine else None
+    return data
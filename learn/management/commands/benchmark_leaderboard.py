@@ -0,0 +1,82 @@
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from learn.leaderboard import DatabaseRanking, RedisRanking, get_ranking
+from learn.models import LeaderboardScore
+
+BOARD = "benchmark"
+PERIOD = LeaderboardScore.PERIOD_ALL_TIME
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Time top-N and rank lookups on a synthetic leaderboard of --rows users. "
+        "The rows are inserted in a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000, help="Leaderboard size (default 1000000)")
+        parser.add_argument("--lookups", type=int, default=200, help="Lookups timed per operation (default 200)")
+        parser.add_argument("--limit", type=int, default=10, help="Top N size (default 10)")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.insert_rows(options["rows"])
+                self.run(DatabaseRanking(), options)
+                ranking = get_ranking()
+                if isinstance(ranking, RedisRanking):
+                    try:
+                        self.run(ranking, options)
+                    finally:
+                        ranking.reset(BOARD, PERIOD)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def insert_rows(self, rows):
+        started = time.perf_counter()
+        # fake user ids, the foreign key is only checked at commit and this never commits
+        batch = []
+        for user_id in range(1, rows + 1):
+            batch.append(LeaderboardScore(board=BOARD, period=PERIOD, user_id=user_id, score=random.randint(0, 100_000)))
+            if len(batch) == 10_000:
+                LeaderboardScore.objects.bulk_create(batch)
+                batch = []
+        LeaderboardScore.objects.bulk_create(batch)
+        self.stdout.write(f"inserted {rows} rows in {time.perf_counter() - started:.1f}s")
+
+    def run(self, ranking, options):
+        name = type(ranking).__name__
+        if isinstance(ranking, RedisRanking):
+            started = time.perf_counter()
+            ranking.ensure_loaded(BOARD, PERIOD)
+            self.stdout.write(f"{name}: loaded the sorted set in {time.perf_counter() - started:.1f}s")
+
+        self.report(name, "top", [
+            self.timed(ranking.top, BOARD, PERIOD, options["limit"])
+            for _ in range(options["lookups"])
+        ])
+        self.report(name, "my rank", [
+            self.timed(ranking.rank, BOARD, PERIOD, random.randint(1, options["rows"]))
+            for _ in range(options["lookups"])
+        ])
+
+    def timed(self, func, *args):
+        started = time.perf_counter()
+        func(*args)
+        return (time.perf_counter() - started) * 1000
+
+    def report(self, name, operation, timings):
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1] if timings else 0
+        self.stdout.write(
+            f"{name} {operation}: median {statistics.median(timings):.2f}ms, "
+            f"p95 {p95:.2f}ms, max {timings[-1]:.2f}ms"
+        )
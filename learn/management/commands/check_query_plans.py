@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from learn.query_plans import HOT_QUERIES, SUPPORTED_VENDORS, explain
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the hot ORM queries and fail if any of them falls back to a full table scan "
+        "or a sort instead of using an index. Supports SQLite and PostgreSQL. "
+        "The same checks run in the learn tests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default", help="Database alias to check (default: default)")
+        parser.add_argument("--verbose-plans", action="store_true", help="Print every plan, not only failing ones")
+
+    def handle(self, *args, **options):
+        alias = options["database"]
+        vendor = connections[alias].vendor
+        if vendor not in SUPPORTED_VENDORS:
+            raise CommandError(f"query plan checks support sqlite and postgresql, not {vendor}")
+
+        failures = []
+        for name, query in HOT_QUERIES:
+            plan, problems = explain(query(), using=alias)
+
+            if problems:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"FAIL {name}"))
+                for problem in problems:
+                    self.stdout.write(f"    {problem}")
+            else:
+                self.stdout.write(self.style.SUCCESS(f"ok   {name}"))
+
+            if problems or options["verbose_plans"]:
+                self.stdout.write("    " + plan.replace("\n", "\n    "))
+
+        if failures:
+            raise CommandError(f"{len(failures)} hot queries don't use an index: {', '.join(failures)}")
@@ -0,0 +1,244 @@
+import http.client
+import json
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+from accounts.models import MyUsers
+from characters.models import AICharacter
+from learn.models import LearningTopic
+
+ENDPOINTS = ("question", "answer", "chat", "chat_stream")
+AUTH_REQUIRED = ("chat", "chat_stream")
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    # the smallest value with at least percent% of the values at or below it
+    rank = math.ceil(percent * len(sorted_values) / 100)
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the LLM backed endpoints of a running server and report RPS and p50/p95/p99 "
+        "latency per endpoint. Run the server against the mock_llm_server command "
+        "(OPENAI_BASE_URL) to measure the app without OpenAI, and raise THROTTLE_ANON_RATE / "
+        "THROTTLE_USER_RATE on it or most requests get a 429."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="Server under test (default http://127.0.0.1:8000)")
+        parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help=f"Comma separated, any of {', '.join(ENDPOINTS)} (default all)")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint (default 200)")
+        parser.add_argument("--concurrency", type=int, default=10, help="Concurrent clients (default 10)")
+        parser.add_argument("--async-views", action="store_true", help="Hit the async (ASGI) variants of the endpoints")
+        parser.add_argument("--topic-id", type=int, help="Topic to ask about (default the first topic)")
+        parser.add_argument("--character-id", type=int, help="AI character to chat with (default the first active one)")
+        parser.add_argument("--difficulty", default="easy", help="Question difficulty (default easy)")
+        parser.add_argument("--model", help="AIModels name or label to request, also bypasses the question pool")
+        parser.add_argument("--user-email", help="User to sign the requests as, a JWT is minted from this database (default the first active user)")
+        parser.add_argument("--token", help="JWT access token to send instead of minting one")
+        parser.add_argument("--timeout", type=float, default=60, help="Client timeout per request in seconds (default 60)")
+        parser.add_argument("--max-p95-ms", type=float, help="Fail when an endpoint's p95 latency is above this")
+        parser.add_argument("--max-error-rate", type=float, help="Fail when an endpoint's error rate is above this fraction")
+
+    def handle(self, *args, **options):
+        endpoints = [name.strip() for name in options["endpoints"].split(",") if name.strip()]
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        url = urlsplit(options["base_url"])
+        self.connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self.netloc = url.netloc
+        self.prefix = url.path.rstrip("/")
+        self.timeout = options["timeout"]
+        self.local = threading.local()
+        self.connections = []
+        self.connections_lock = threading.Lock()
+
+        topic = self.get_topic(options["topic_id"])
+        character = self.get_character(options["character_id"]) if set(endpoints) & {"chat", "chat_stream"} else None
+        token = options["token"] or self.mint_token(options["user_email"])
+        if not token and set(endpoints) & set(AUTH_REQUIRED):
+            raise CommandError("The chat endpoints need a user, pass --user-email or --token")
+        self.headers = {"Content-Type": "application/json"}
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+
+        self.stdout.write(
+            f"{options['requests']} requests per endpoint, {options['concurrency']} concurrent clients, "
+            f"against {options['base_url']}"
+        )
+        self.stdout.write(
+            f"{'endpoint':<12} {'requests':>8} {'errors':>6} {'rps':>8} "
+            f"{'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}  (ms)"
+        )
+
+        failures = []
+        for name in endpoints:
+            build = getattr(self, f"{name}_request")
+            requests = [
+                build(i, topic, character, options)
+                for i in range(options["requests"])
+            ]
+            report = self.run_endpoint(requests, options["concurrency"])
+            self.print_report(name, report)
+            failures.extend(self.check_thresholds(name, report, options))
+
+        if failures:
+            raise CommandError("; ".join(failures))
+
+    # --- fixtures ---
+
+    def get_topic(self, topic_id):
+        topics = LearningTopic.objects.all()
+        topic = topics.filter(id=topic_id).first() if topic_id else topics.order_by("id").first()
+        if topic is None:
+            raise CommandError("No learning topic to test with")
+        return topic
+
+    def get_character(self, character_id):
+        characters = AICharacter.objects.filter(is_active=True)
+        character = characters.filter(id=character_id).first() if character_id else characters.order_by("id").first()
+        if character is None:
+            raise CommandError("No active AI character to chat with")
+        return character
+
+    def mint_token(self, email):
+        users = MyUsers.objects.filter(is_active=True)
+        user = users.filter(email=email).first() if email else users.order_by("id").first()
+        if email and user is None:
+            raise CommandError(f"No active user {email}")
+        return str(RefreshToken.for_user(user).access_token) if user else None
+
+    # --- requests, (method, path, body, streamed) ---
+
+    def path(self, app, path, options):
+        return f"{self.prefix}/{app}/{'async/' if options['async_views'] else ''}{path}"
+
+    def question_request(self, i, topic, character, options):
+        params = {"difficulty": options["difficulty"]}
+        if options["model"]:
+            params["model"] = options["model"]
+        return "GET", self.path("learn", f"generate/{topic.id}/question", options) + "?" + urlencode(params), None, False
+
+    def answer_request(self, i, topic, character, options):
+        # a distinct answer per request, so the review cache doesn't answer for the LLM
+        body = {
+            "question": f"Load test question {i}",
+            "answer": f"Load test answer {uuid.uuid4().hex}",
+            "topic_id": topic.id,
+            "difficulty": options["difficulty"],
+        }
+        if options["model"]:
+            body["model"] = options["model"]
+        return "POST", self.path("learn", "question/answer/result", options), body, False
+
+    def chat_request(self, i, topic, character, options, stream=False):
+        body = {"character_id": character.id, "message": f"Load test message {i}"}
+        if options["model"]:
+            body["model"] = options["model"]
+        path = self.path("ai-characters", "chat/stream" if stream else "chat", options)
+        return "POST", path, body, stream
+
+    def chat_stream_request(self, i, topic, character, options):
+        return self.chat_request(i, topic, character, options, stream=True)
+
+    # --- running ---
+
+    def connection(self):
+        # one keep-alive connection per client thread
+        if getattr(self.local, "connection", None) is None:
+            self.local.connection = self.connection_class(self.netloc, timeout=self.timeout)
+            with self.connections_lock:
+                self.connections.append(self.local.connection)
+        return self.local.connection
+
+    def send(self, request):
+        """Returns (ok, status, latency ms, time to first byte ms)."""
+        method, path, body, streamed = request
+        payload = json.dumps(body).encode() if body is not None else None
+        started = time.perf_counter()
+        try:
+            connection = self.connection()
+            connection.request(method, path, body=payload, headers=self.headers)
+            response = connection.getresponse()
+            first = response.read(1)
+            first_byte_ms = (time.perf_counter() - started) * 1000
+            content = first + response.read()
+        except (OSError, http.client.HTTPException) as e:
+            if getattr(self.local, "connection", None) is not None:
+                self.local.connection.close()
+                self.local.connection = None
+            return False, type(e).__name__, (time.perf_counter() - started) * 1000, None
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        ok = response.status < 400
+        if ok and streamed:
+            ok = b"event: error" not in content
+        elif ok:
+            try:
+                ok = json.loads(content).get("success", True) is not False
+            except ValueError:
+                ok = False
+        return ok, response.status, latency_ms, first_byte_ms
+
+    def run_endpoint(self, requests, concurrency):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="load") as pool:
+            results = list(pool.map(self.send, requests))
+        elapsed = time.perf_counter() - started
+        with self.connections_lock:
+            for connection in self.connections:
+                connection.close()
+            self.connections = []
+
+        statuses = {}
+        for ok, status, _, _ in results:
+            if not ok:
+                statuses[status] = statuses.get(status, 0) + 1
+        return {
+            "requests": len(results),
+            "errors": sum(statuses.values()),
+            "error_statuses": statuses,
+            "rps": len(results) / elapsed if elapsed else 0.0,
+            "latencies": sorted(latency for _, _, latency, _ in results),
+            "first_bytes": sorted(first for _, _, _, first in results if first is not None),
+        }
+
+    # --- reporting ---
+
+    def print_report(self, name, report):
+        latencies = report["latencies"]
+        self.stdout.write(
+            f"{name:<12} {report['requests']:>8} {report['errors']:>6} {report['rps']:>8.1f} "
+            f"{percentile(latencies, 50):>9.1f} {percentile(latencies, 95):>9.1f} "
+            f"{percentile(latencies, 99):>9.1f} {(latencies[-1] if latencies else 0):>9.1f}"
+        )
+        if name == "chat_stream":
+            first_bytes = report["first_bytes"]
+            self.stdout.write(
+                f"{'  first byte':<12} {'':>8} {'':>6} {'':>8} "
+                f"{percentile(first_bytes, 50):>9.1f} {percentile(first_bytes, 95):>9.1f} "
+                f"{percentile(first_bytes, 99):>9.1f} {(first_bytes[-1] if first_bytes else 0):>9.1f}"
+            )
+        if report["error_statuses"]:
+            self.stdout.write(f"{'':<12} errors by status: {report['error_statuses']}")
+
+    def check_thresholds(self, name, report, options):
+        failures = []
+        p95 = percentile(report["latencies"], 95)
+        if options["max_p95_ms"] is not None and p95 > options["max_p95_ms"]:
+            failures.append(f"{name} p95 {p95:.1f}ms is above {options['max_p95_ms']:g}ms")
+        error_rate = report["errors"] / report["requests"] if report["requests"] else 0
+        if options["max_error_rate"] is not None and error_rate > options["max_error_rate"]:
+            failures.append(f"{name} error rate {error_rate:.2%} is above {options['max_error_rate']:.2%}")
+        return failures
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from utils.mock_llm import LATENCY_DISTRIBUTIONS, MockLLMConfig, MockLLMServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Run an OpenAI compatible stub server with simulated latency, token rate and failures. "
+        "Start the app with OPENAI_BASE_URL=http://<host>:<port>/v1 to send its LLM calls there."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default 127.0.0.1)")
+        parser.add_argument("--port", type=int, default=8100, help="Port to listen on (default 8100)")
+        parser.add_argument("--latency-ms", type=float, default=300, help="Median time to the first token (default 300)")
+        parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="lognormal", help="Distribution of the time to the first token (default lognormal)")
+        parser.add_argument("--jitter", type=float, default=0.5, help="Spread of the latency as a fraction of it (default 0.5)")
+        parser.add_argument("--tokens-per-second", type=float, default=50, help="Generation speed after the first token, 0 for instant (default 50)")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 500 (default 0)")
+        parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with a 429 (default 0)")
+        parser.add_argument("--hang-rate", type=float, default=0.0, help="Fraction of requests never answered, to test client timeouts (default 0)")
+        parser.add_argument("--hang-seconds", type=float, default=120, help="How long a hanging request is held before the connection is closed (default 120)")
+        parser.add_argument("--seed", type=int, help="Random seed, for repeatable runs")
+
+    def handle(self, *args, **options):
+        config = MockLLMConfig(
+            latency_ms=options["latency_ms"],
+            latency_dist=options["latency_dist"],
+            jitter=options["jitter"],
+            tokens_per_second=options["tokens_per_second"],
+            error_rate=options["error_rate"],
+            rate_limit_rate=options["rate_limit_rate"],
+            hang_rate=options["hang_rate"],
+            hang_seconds=options["hang_seconds"],
+            seed=options["seed"],
+        )
+        server = MockLLMServer((options["host"], options["port"]), config)
+        self.stdout.write(
+            f"mock LLM listening on http://{options['host']}:{options['port']}/v1 "
+            f"({options['latency_dist']} latency, median {options['latency_ms']:g}ms, "
+            f"{options['tokens_per_second']:g} tokens/s), Ctrl-C to stop"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"requests served: {server.counts}")
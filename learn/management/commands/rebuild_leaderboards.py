@@ -0,0 +1,45 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from learn.leaderboard import get_ranking, update_user_scores, week_period
+from learn.models import LeaderboardScore, UserLearningHistory
+
+
+class Command(BaseCommand):
+    help = "Rebuild the leaderboard scores of every user from their learning history."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, help="Only rebuild this user id")
+        parser.add_argument("--prune-weeks", type=int, default=8, help="Delete weekly scores older than this many weeks (default 8)")
+
+    def handle(self, *args, **options):
+        if options["user"]:
+            user_ids = [options["user"]]
+        else:
+            user_ids = (
+                UserLearningHistory.objects
+                .order_by("user_id")
+                .values_list("user_id", flat=True)
+                .distinct()
+                .iterator()
+            )
+            # sorted sets reload from the rebuilt table on their next read
+            get_ranking().reset()
+
+        rebuilt = 0
+        for rebuilt, user_id in enumerate(user_ids, start=1):
+            update_user_scores(user_id)
+            if rebuilt % 1000 == 0:
+                self.stdout.write(f"{rebuilt} users rebuilt")
+
+        oldest_week = week_period(timezone.now() - timedelta(weeks=options["prune_weeks"]))
+        pruned, _ = (
+            LeaderboardScore.objects
+            .exclude(period=LeaderboardScore.PERIOD_ALL_TIME)
+            .filter(period__lt=oldest_week)
+            .delete()
+        )
+        if pruned:
+            self.stdout.write(f"pruned {pruned} old weekly scores")
+
+        self.stdout.write(self.style.SUCCESS(f"rebuilt leaderboard scores of {rebuilt} users"))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from learn.models import UserLearningHistory, UserTopicStatistics
+from learn.statistics import recompute_statistics
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild UserTopicStatistics from UserLearningHistory, one aggregate query "
+        "and one bulk upsert per batch of users."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Users per batch (default 500)")
+        parser.add_argument("--user", type=int, help="Only this user id")
+        parser.add_argument("--topic", type=int, help="Only this topic id")
+
+    def handle(self, *args, **options):
+        if options["user"]:
+            user_ids = [options["user"]]
+        else:
+            # users with history or with statistics left to clean up
+            user_ids = sorted(
+                set(UserLearningHistory.objects.values_list("user_id", flat=True).order_by().distinct())
+                | set(UserTopicStatistics.objects.values_list("user_id", flat=True).order_by().distinct())
+            )
+
+        written = 0
+        batch_size = options["batch_size"]
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            written += recompute_statistics(batch, topic_id=options["topic"])
+            self.stdout.write(f"users {start + 1}-{start + len(batch)} of {len(user_ids)}: {written} statistics written")
+
+        self.stdout.write(self.style.SUCCESS(f"recomputed {written} topic statistics"))
@@ -0,0 +1,72 @@
+import time
+from datetime import timedelta
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from learn.models import LearningTopic, PooledQuestion, UserLearningHistory
+from learn.question_pool import (
+    REFILL_LOCK_SECONDS, available_questions, get_pool_metrics, high_watermark, low_watermark,
+    refill_lock_key, refill_pool
+)
+from llm_usage.recorder import flush as flush_llm_usage
+
+
+class Command(BaseCommand):
+    help = "Top up the pre-generated question pools that are below the low watermark."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--topic", type=int, help="Only refill this topic id")
+        parser.add_argument(
+            "--difficulty",
+            choices=[choice for choice, _ in UserLearningHistory.DIFFICULTY_CHOICES],
+            help="Only refill this difficulty"
+        )
+        parser.add_argument("--all", action="store_true", help="Refill every pool up to the high watermark, not only the low ones")
+        parser.add_argument("--loop", action="store_true", help="Keep running as a background worker")
+        parser.add_argument("--interval", type=int, default=60, help="Seconds between passes with --loop (default 60)")
+        parser.add_argument("--prune-days", type=int, default=7, help="Delete questions served more than this many days ago (default 7)")
+
+    def handle(self, *args, **options):
+        while True:
+            self.refill_once(options)
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+    def refill_once(self, options):
+        topics = LearningTopic.objects.select_related("category").order_by("id")
+        if options["topic"]:
+            topics = topics.filter(id=options["topic"])
+
+        difficulties = (
+            [options["difficulty"]] if options["difficulty"]
+            else [choice for choice, _ in UserLearningHistory.DIFFICULTY_CHOICES]
+        )
+
+        for topic in topics:
+            for difficulty in difficulties:
+                if not options["all"] and available_questions(topic.id, difficulty).count() >= low_watermark():
+                    continue
+                # the same lock as the web processes' background refills
+                lock_key = refill_lock_key(topic.id, difficulty)
+                if not cache.add(lock_key, 1, timeout=REFILL_LOCK_SECONDS):
+                    self.stdout.write(f"{topic.topic} ({difficulty}): already being refilled, skipped")
+                    continue
+                try:
+                    added = refill_pool(topic, difficulty, target=high_watermark())
+                except Exception as e:
+                    self.stderr.write(f"{topic.topic} ({difficulty}): refill failed - {e}")
+                    continue
+                finally:
+                    cache.delete(lock_key)
+                self.stdout.write(f"{topic.topic} ({difficulty}): added {added} questions")
+
+        flush_llm_usage()  # the process may exit before the background flush
+
+        pruned, _ = PooledQuestion.objects.filter(
+            served_at__lt=timezone.now() - timedelta(days=options["prune_days"])
+        ).delete()
+        if pruned:
+            self.stdout.write(f"pruned {pruned} served questions")
+
+        self.stdout.write(f"pool metrics: {get_pool_metrics()}")
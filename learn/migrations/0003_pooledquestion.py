@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learn', '0002_usertopicstatistics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PooledQuestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('difficulty', models.CharField(choices=[('easy', 'Easy'), ('medium', 'Medium'), ('hard', 'Hard')], max_length=50)),
+                ('question', models.TextField()),
+                ('served_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('topic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pooled_questions', to='learn.learningtopic')),
+            ],
+            options={
+                'verbose_name': 'Pooled Question',
+                'verbose_name_plural': 'Pooled Questions',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['topic', 'difficulty', 'served_at'], name='learn_poole_topic_i_c45c52_idx')],
+            },
+        ),
+    ]
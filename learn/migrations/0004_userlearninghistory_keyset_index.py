@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learn', '0003_pooledquestion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userlearninghistory',
+            index=models.Index(fields=['user', 'topic', '-created_at', '-id'], name='history_user_topic_created_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learn', '0004_userlearninghistory_keyset_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='pooledquestion',
+            name='learn_poole_topic_i_c45c52_idx',
+        ),
+        migrations.AddIndex(
+            model_name='pooledquestion',
+            index=models.Index(fields=['topic', 'difficulty', 'served_at', 'id'], name='pooled_question_available_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userlearninghistory',
+            index=models.Index(fields=['user', 'topic', 'difficulty', '-created_at'], name='history_user_topic_diff_idx'),
+        ),
+    ]
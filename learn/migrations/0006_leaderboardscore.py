@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learn', '0005_hot_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(max_length=50)),
+                ('period', models.CharField(max_length=10)),
+                ('score', models.IntegerField(default=0)),
+                ('questions_asked', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_scores', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Leaderboard Score',
+                'verbose_name_plural': 'Leaderboard Scores',
+                'indexes': [models.Index(fields=['board', 'period', '-score', 'user'], name='leaderboard_rank_idx')],
+                'unique_together': {('board', 'period', 'user')},
+            },
+        ),
+    ]
@@ -76,6 +76,12 @@ class UserLearningHistory(models.Model):
         verbose_name = "User Learning History"
         verbose_name_plural = "User Learning Histories"
         ordering = ["-created_at"]
+        indexes = [
+            # history pages: filter (user, topic), newest first, keyset on (created_at, id)
+            models.Index(fields=["user", "topic", "-created_at", "-id"], name="history_user_topic_created_idx"),
+            # recently asked questions: filter (user, topic, difficulty), newest first
+            models.Index(fields=["user", "topic", "difficulty", "-created_at"], name="history_user_topic_diff_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user} - {self.topic.topic} ({self.score})"
@@ -96,4 +102,48 @@ class UserTopicStatistics(models.Model):
         ordering = ["-total_score"]
 
     def __str__(self):
-        return f"{self.user} - {self.topic.topic}: {self.total_score} points"
\ No newline at end of file
+        return f"{self.user} - {self.topic.topic}: {self.total_score} points"
+
+class PooledQuestion(models.Model):
+    """Pre-generated question waiting to be served by GenerateQuestion."""
+    topic = models.ForeignKey(LearningTopic, on_delete=models.CASCADE, related_name="pooled_questions")
+    difficulty = models.CharField(max_length=50, choices=UserLearningHistory.DIFFICULTY_CHOICES)
+    question = models.TextField()
+    served_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Pooled Question"
+        verbose_name_plural = "Pooled Questions"
+        ordering = ["id"]
+        indexes = [
+            # pop: filter (topic, difficulty, served_at IS NULL), oldest first
+            models.Index(fields=["topic", "difficulty", "served_at", "id"], name="pooled_question_available_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.topic.topic} ({self.difficulty}) - {self.question[:40]}"
+
+
+class LeaderboardScore(models.Model):
+    """A user's score on one leaderboard and period, maintained by learn.leaderboard."""
+    PERIOD_ALL_TIME = "all"
+
+    board = models.CharField(max_length=50)  # "global", "topic:<id>" or "category:<id>"
+    period = models.CharField(max_length=10)  # "all" or an ISO week like "2025-W07"
+    user = models.ForeignKey(MyUsers, on_delete=models.CASCADE, related_name="leaderboard_scores")
+    score = models.IntegerField(default=0)
+    questions_asked = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Leaderboard Score"
+        verbose_name_plural = "Leaderboard Scores"
+        unique_together = ("board", "period", "user")
+        indexes = [
+            # top N and "my rank": filter (board, period), highest score first
+            models.Index(fields=["board", "period", "-score", "user"], name="leaderboard_rank_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.board} {self.period} - {self.user}: {self.score}"
@@ -0,0 +1,77 @@
+QUESTION_SYSTEM_PROMPT = "You are a helpful, friendly mentor."
+REVIEW_SYSTEM_PROMPT = "You are a helpful, friendly mentor and reviewer."
+
+# JSON schemas of the replies, sent as structured output formats and validated by utils.llm
+QUESTION_SCHEMA = {
+    "type": "object",
+    "properties": {"question": {"type": "string"}},
+    "required": ["question"],
+    "additionalProperties": False,
+}
+
+QUESTION_BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {"questions": {"type": "array", "items": {"type": "string"}}},
+    "required": ["questions"],
+    "additionalProperties": False,
+}
+
+REVIEW_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "feedback": {"type": "string"},
+        "improved_answer": {"type": "string"},
+        "score": {"type": "integer"},
+    },
+    "required": ["feedback", "improved_answer", "score"],
+    "additionalProperties": False,
+}
+
+
+def build_question_prompt(topic_name, topic_category, difficulty, asked_questions):
+    avoid_text = "\n".join(f"- {q}" for q in asked_questions) if asked_questions else "none"
+
+    return f"""
+        You are a friendly mentor. Ask one random theoretical question from the topic "{topic_name}"
+        in the category "{topic_category}" with "{difficulty}" difficulty.
+        Avoid these previously asked questions:
+        [{avoid_text}]
+        Instructions:
+        1. Respond ONLY in JSON format with the following structure:
+        {{
+            "question": "<the question here as a string and do not put answer here>"
+        }}
+        2. Do NOT include any text, explanation, code blocks, or extra formatting outside the JSON.
+        3. Make the question clear, concise, and suitable for an interview or learning assessment.
+        """
+
+
+def build_question_batch_prompt(topic_name, topic_category, difficulty, count, avoid_questions):
+    avoid_text = "\n".join(f"- {q}" for q in avoid_questions) if avoid_questions else "none"
+
+    return f"""
+        You are a friendly mentor. Write {count} different random theoretical questions from the topic "{topic_name}"
+        in the category "{topic_category}" with "{difficulty}" difficulty.
+        Do not repeat any of these questions:
+        [{avoid_text}]
+        Instructions:
+        1. Respond ONLY in JSON format with the following structure:
+        {{
+            "questions": ["<question 1 as a string and do not put answer here>", "..."]
+        }}
+        2. Do NOT include any text, explanation, code blocks, or extra formatting outside the JSON.
+        3. Make each question clear, concise, and suitable for an interview or learning assessment.
+        """
+
+
+def build_review_prompt(question, answer, topic_name, topic_category):
+    return f"""
+        Review this answer "{answer}" for question "{question}" (Topic: {topic_name}, Category: {topic_category}).
+        ignore these already asked questions "[]"
+        Instructions:
+        - Provide JSON only: {{"feedback": "...", "improved_answer": "...", "score": 0-10}}.
+        - Score 10-8: mostly correct, minor gaps. 5-7: partially correct. 1-4: incorrect, - 0: Completely irrelevant or does not attempt to answer.
+        - Feedback should be short, friendly, slightly funny.
+        - Do not include text outside JSON.
+        """
+
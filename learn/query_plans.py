@@ -0,0 +1,121 @@
+"""
+The ORM queries on the request hot paths and their EXPLAIN checks.
+
+Each query must be served by an index seek: a full table or index scan or a
+sort means a missing or unusable index. The queries are built by the code
+that runs them (views, pagination, question pool, leaderboard), with
+placeholder ids, so a change to a view's query is checked too. learn/tests.py
+asserts this for every query, and the check_query_plans command runs the same
+checks against a real database. Supports SQLite and PostgreSQL.
+"""
+from datetime import datetime, timezone
+from django.db import connections, transaction
+from characters.models import AIChatMemory
+from characters.views.ai_character_chat_views import AICharacterChatMixin, ListUserAiChats
+from learn.leaderboard import GLOBAL_BOARD, DatabaseRanking
+from learn.models import LeaderboardScore, UserTopicStatistics
+from learn.question_pool import pop_candidates_qs
+from learn.views.learn_views import ListUserLearningHistory, recent_questions_qs
+from utils.pagination import keyset_page_queryset
+
+SUPPORTED_VENDORS = ("sqlite", "postgresql")
+
+# placeholder values, EXPLAIN doesn't need matching rows
+USER_ID = 1
+CHARACTER_ID = 1
+TOPIC_ID = 1
+DIFFICULTY = "easy"
+CURSOR = (datetime(2025, 1, 1, tzinfo=timezone.utc), 1000)
+PAGE_SIZE = 20
+
+
+def recent_chat_messages():
+    return AICharacterChatMixin().get_recent_messages_qs(USER_ID, CHARACTER_ID)
+
+
+def chat_messages_page():
+    return keyset_page_queryset(ListUserAiChats().get_messages_qs(USER_ID, CHARACTER_ID), None, PAGE_SIZE)
+
+
+def chat_messages_page_after_cursor():
+    return keyset_page_queryset(ListUserAiChats().get_messages_qs(USER_ID, CHARACTER_ID), CURSOR, PAGE_SIZE)
+
+
+def chat_memory():
+    # the lookup of AICharacterChatMixin's get_or_create(), which drops the default ordering
+    return AIChatMemory.objects.filter(user_id=USER_ID, ai_character_id=CHARACTER_ID).order_by()
+
+
+def history_page():
+    return keyset_page_queryset(ListUserLearningHistory().get_histories_qs(USER_ID, TOPIC_ID), None, PAGE_SIZE)
+
+
+def history_page_after_cursor():
+    return keyset_page_queryset(ListUserLearningHistory().get_histories_qs(USER_ID, TOPIC_ID), CURSOR, PAGE_SIZE)
+
+
+def recently_asked_questions():
+    return recent_questions_qs(USER_ID, TOPIC_ID, DIFFICULTY)
+
+
+def pop_pooled_question():
+    return pop_candidates_qs(TOPIC_ID, DIFFICULTY, USER_ID)
+
+
+def topic_statistics():
+    # record_answer's update and the topic view's lookup
+    return UserTopicStatistics.objects.filter(user_id=USER_ID, topic_id=TOPIC_ID)
+
+
+def leaderboard_top():
+    return DatabaseRanking().top_qs(GLOBAL_BOARD, LeaderboardScore.PERIOD_ALL_TIME)[:10]
+
+
+def leaderboard_users_above():
+    return DatabaseRanking().above_qs(GLOBAL_BOARD, LeaderboardScore.PERIOD_ALL_TIME, 100)
+
+
+HOT_QUERIES = [
+    ("chat: recent messages for the prompt", recent_chat_messages),
+    ("chat: messages page", chat_messages_page),
+    ("chat: messages page after cursor", chat_messages_page_after_cursor),
+    ("chat: memory", chat_memory),
+    ("learn: history page", history_page),
+    ("learn: history page after cursor", history_page_after_cursor),
+    ("learn: recently asked questions", recently_asked_questions),
+    ("learn: pop pooled question", pop_pooled_question),
+    ("learn: topic statistics", topic_statistics),
+    ("leaderboard: top", leaderboard_top),
+    ("leaderboard: users above a score", leaderboard_users_above),
+]
+
+
+def plan_problems(vendor, plan):
+    """Return the full scans and sorts found in an EXPLAIN output."""
+    problems = []
+    for line in plan.splitlines():
+        text = line.strip(" |-`>")
+        if vendor == "sqlite":
+            # SEARCH ... USING (COVERING) INDEX is a seek, SCAN reads the whole table or index
+            if text.startswith("SCAN "):
+                problems.append(f"full scan: {text}")
+            if "USE TEMP B-TREE" in text:
+                problems.append(f"temporary sort: {text}")
+        elif vendor == "postgresql":
+            if text.startswith("Seq Scan"):
+                problems.append(f"full scan: {text}")
+            if text.startswith(("Sort  ", "Incremental Sort  ")):  # plan nodes, not "Sort Key:" details
+                problems.append(f"sort: {text}")
+    return problems
+
+
+def explain(queryset, using="default"):
+    """(plan, problems) of a queryset on the `using` database."""
+    vendor = connections[using].vendor
+    with transaction.atomic(using=using):
+        if vendor == "postgresql":
+            # tiny test tables make seq scans look cheapest, ask whether an index path exists at all
+            with connections[using].cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = queryset.using(using).explain()
+    return plan, plan_problems(vendor, plan)
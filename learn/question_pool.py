@@ -0,0 +1,209 @@
+"""
+Pool of pre-generated questions per (topic, difficulty).
+
+GenerateQuestion pops a question the user hasn't answered yet from the pool,
+which is a couple of DB queries instead of a live LLM round-trip. When the
+pool drops below QUESTION_POOL_LOW_WATERMARK it is topped back up to
+QUESTION_POOL_HIGH_WATERMARK, either by a background thread in the web
+process or by the `refill_question_pool` management command. A lock in the
+shared cache lets only one process refill a given pool at a time.
+"""
+import logging
+import random
+import threading
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+from learn.models import LearningTopic, PooledQuestion, UserLearningHistory
+from learn.prompts import QUESTION_BATCH_SCHEMA, QUESTION_SYSTEM_PROMPT, build_question_batch_prompt
+from utils.llm import complete_structured
+from utils.metrics import get_counters, hit_rate, incr_counter
+
+logger = logging.getLogger(__name__)
+
+POP_CANDIDATES = 5  # questions tried when concurrent requests race for the same row
+REFILL_BATCH_SIZE = 10  # questions generated per LLM call
+REFILL_LOCK_SECONDS = 5 * 60  # a refill lock is released after this if its process died
+WATERMARK_CHECK_SECONDS = 10  # a pool's size is counted at most this often
+
+METRIC_KEYS = ("hits", "misses", "refills", "generated")
+
+_refilling = set()
+_refilling_lock = threading.Lock()
+
+
+def low_watermark():
+    return getattr(settings, "QUESTION_POOL_LOW_WATERMARK", 5)
+
+
+def high_watermark():
+    return getattr(settings, "QUESTION_POOL_HIGH_WATERMARK", 20)
+
+
+# --- metrics ---
+
+def incr_metric(name, amount=1):
+    incr_counter(f"question_pool:{name}", amount)
+
+
+def get_pool_metrics():
+    """Return hit/miss counters and the hit rate of the question pool."""
+    metrics = get_counters("question_pool", METRIC_KEYS)
+    metrics["hit_rate"] = hit_rate(metrics["hits"], metrics["hits"] + metrics["misses"])
+    return metrics
+
+
+# --- serving ---
+
+def available_questions(topic_id, difficulty):
+    return PooledQuestion.objects.filter(
+        topic_id=topic_id,
+        difficulty=difficulty,
+        served_at__isnull=True
+    )
+
+
+def pop_candidates_qs(topic_id, difficulty, user_id=None):
+    """The first unserved questions of a pool, without those the user already answered."""
+    queryset = available_questions(topic_id, difficulty)
+    if user_id:
+        queryset = queryset.exclude(
+            question__in=UserLearningHistory.objects.filter(
+                user_id=user_id,
+                topic_id=topic_id,
+                difficulty=difficulty
+            ).values("question")
+        )
+    return queryset.order_by("id").values_list("id", "question")[:POP_CANDIDATES]
+
+
+def pop_question(topic, difficulty, user=None):
+    """
+    Take an unserved question from the pool, skipping questions the user already answered.
+    Returns the question text, or None when the pool has nothing suitable.
+    """
+    candidates = list(pop_candidates_qs(topic.id, difficulty, user.id if user else None))
+    random.shuffle(candidates)  # spread concurrent requests over different rows
+
+    question = None
+    for pooled_id, text in candidates:
+        # conditional update so only one request can claim the row
+        claimed = PooledQuestion.objects.filter(
+            id=pooled_id, served_at__isnull=True
+        ).update(served_at=timezone.now())
+        if claimed:
+            question = text
+            break
+
+    incr_metric("hits" if question else "misses")
+
+    if question is None:
+        request_refill(topic.id, difficulty)
+    elif cache.add(watermark_check_key(topic.id, difficulty), 1, timeout=WATERMARK_CHECK_SECONDS):
+        # the first pop of the period counts the pool, the others skip the COUNT query
+        if available_questions(topic.id, difficulty).count() < low_watermark():
+            request_refill(topic.id, difficulty)
+
+    return question
+
+
+# --- refilling ---
+
+def generate_questions(topic, difficulty, count, avoid_questions=()):
+    """Ask the LLM for `count` new questions in a single completion."""
+    prompt = build_question_batch_prompt(
+        topic.topic, topic.category.category, difficulty, count, list(avoid_questions)
+    )
+
+    data = complete_structured(
+        [
+            {"role": "system", "content": QUESTION_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        "question_batch",
+        QUESTION_BATCH_SCHEMA,
+        temperature=0.9,
+        max_tokens=80 * count
+    )
+    questions = [q.strip() for q in data["questions"] if q.strip()]
+    return questions[:count]
+
+
+def refill_pool(topic, difficulty, target=None):
+    """
+    Top up the pool of a (topic, difficulty) to `target` unserved questions.
+    Returns the number of questions added.
+    """
+    target = target or high_watermark()
+    added = 0
+
+    while True:
+        pooled = list(available_questions(topic.id, difficulty).values_list("question", flat=True))
+        missing = target - len(pooled)
+        if missing <= 0:
+            break
+
+        questions = generate_questions(
+            topic, difficulty, min(missing, REFILL_BATCH_SIZE), avoid_questions=pooled[-20:]
+        )
+        questions = [q for q in dict.fromkeys(questions) if q not in pooled]
+        if not questions:
+            break
+
+        PooledQuestion.objects.bulk_create([
+            PooledQuestion(topic=topic, difficulty=difficulty, question=q) for q in questions
+        ])
+        added += len(questions)
+
+    if added:
+        incr_metric("refills")
+        incr_metric("generated", added)
+    return added
+
+
+def refill_lock_key(topic_id, difficulty):
+    return f"question_pool:refilling:{topic_id}:{difficulty}"
+
+
+def watermark_check_key(topic_id, difficulty):
+    return f"question_pool:checked:{topic_id}:{difficulty}"
+
+
+def request_refill(topic_id, difficulty):
+    """
+    Refill a pool in a background thread of this process.
+    Does nothing when QUESTION_POOL_BACKGROUND_REFILL is off (pools are then
+    refilled only by the management command) or a refill is already running,
+    in this process or, through the cache lock, in another one.
+    """
+    if not getattr(settings, "QUESTION_POOL_BACKGROUND_REFILL", True):
+        return
+
+    key = (topic_id, difficulty)
+    with _refilling_lock:
+        if key in _refilling:
+            return
+        _refilling.add(key)
+
+    # cache.add() is atomic, only the first process to ask gets the lock
+    if not cache.add(refill_lock_key(topic_id, difficulty), 1, timeout=REFILL_LOCK_SECONDS):
+        with _refilling_lock:
+            _refilling.discard(key)
+        return
+
+    thread = threading.Thread(target=_refill_in_background, args=key, daemon=True)
+    thread.start()
+
+
+def _refill_in_background(topic_id, difficulty):
+    try:
+        topic = LearningTopic.objects.select_related("category").get(id=topic_id)
+        refill_pool(topic, difficulty)
+    except Exception:
+        logger.exception("question pool refill failed for topic=%s difficulty=%s", topic_id, difficulty)
+    finally:
+        cache.delete(refill_lock_key(topic_id, difficulty))
+        with _refilling_lock:
+            _refilling.discard((topic_id, difficulty))
+        connection.close()  # this thread's own DB connection
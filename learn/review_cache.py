@@ -0,0 +1,173 @@
+"""
+Cache of AnswerResults reviews.
+
+Two tiers, both keyed on (model, topic, difficulty, normalized question), so
+a review is only reused for requests graded by the same model:
+- exact: the normalized answer hashed into a Django cache key, expires after
+  REVIEW_CACHE_TTL seconds (eviction beyond that is the cache backend's LRU).
+- semantic (REVIEW_CACHE_SEMANTIC=true): an in-process vector index of answer
+  embeddings. An answer whose cosine similarity to an already graded answer of
+  the same question is at least REVIEW_CACHE_SIMILARITY reuses its review.
+  Entries expire after REVIEW_CACHE_TTL and the least recently used ones are
+  dropped beyond REVIEW_CACHE_MAX_ENTRIES.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from utils.llm import create_embedding
+from utils.metrics import get_counters, hit_rate, incr_counter
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+METRIC_KEYS = ("exact_hits", "semantic_hits", "misses")
+
+
+def cache_ttl():
+    return getattr(settings, "REVIEW_CACHE_TTL", 60 * 60 * 24)
+
+
+def semantic_enabled():
+    return getattr(settings, "REVIEW_CACHE_SEMANTIC", False)
+
+
+def normalize_text(text):
+    """
+    Lowercase and collapse whitespace so trivial edits hit the cache. Punctuation
+    is kept, "a > b" and "a < b" or "O(n^2)" and "O(n2)" are different answers.
+    """
+    return " ".join(str(text).lower().split())
+
+
+def question_key(model, topic_id, difficulty, question):
+    return f"{model}:{topic_id}:{difficulty}:{normalize_text(question)}"
+
+
+def exact_cache_key(model, topic_id, difficulty, question, answer):
+    raw = f"{question_key(model, topic_id, difficulty, question)}:{normalize_text(answer)}"
+    return f"review_cache:{hashlib.sha256(raw.encode()).hexdigest()}"
+
+
+class SemanticReviewIndex:
+    """
+    Process-local vector index of graded answers, grouped by question.
+    Vectors are stored normalized so cosine similarity is a dot product.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # (question_key, answer_hash) -> (vector, review, expires_at), LRU order
+        self._by_question = {}  # question_key -> set of entry keys
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def search(self, q_key, vector, threshold):
+        now = time.monotonic()
+        best_key, best_score = None, threshold
+        with self._lock:
+            for key in list(self._by_question.get(q_key, ())):
+                entry_vector, _, expires_at = self._entries[key]
+                if expires_at < now:
+                    self._remove(key)
+                    continue
+                score = sum(a * b for a, b in zip(vector, entry_vector))
+                if score >= best_score:
+                    best_key, best_score = key, score
+
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            return self._entries[best_key][1]
+
+    def add(self, q_key, answer_hash, vector, review):
+        key = (q_key, answer_hash)
+        with self._lock:
+            self._entries[key] = (vector, review, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            self._by_question.setdefault(q_key, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        keys = self._by_question.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_question[key[0]]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_semantic_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SemanticReviewIndex(
+                max_entries=getattr(settings, "REVIEW_CACHE_MAX_ENTRIES", 10000),
+                ttl=cache_ttl(),
+            )
+    return _index
+
+
+def embed_text(text):
+    vector = create_embedding(text, EMBEDDING_MODEL)
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def lookup_review(model, topic_id, difficulty, question, answer):
+    """
+    Return (review, embedding). review is None on a miss; embedding is the
+    answer's vector when the semantic tier computed one, pass it to store_review.
+    """
+    review = cache.get(exact_cache_key(model, topic_id, difficulty, question, answer))
+    if review is not None:
+        incr_counter("review_cache:exact_hits")
+        return review, None
+
+    embedding = None
+    if semantic_enabled():
+        try:
+            embedding = embed_text(normalize_text(answer))
+            review = get_semantic_index().search(
+                question_key(model, topic_id, difficulty, question),
+                embedding,
+                getattr(settings, "REVIEW_CACHE_SIMILARITY", 0.95),
+            )
+        except Exception:
+            logger.exception("semantic review cache lookup failed")
+
+        if review is not None:
+            incr_counter("review_cache:semantic_hits")
+            return review, embedding
+
+    incr_counter("review_cache:misses")
+    return None, embedding
+
+
+def store_review(model, topic_id, difficulty, question, answer, review, embedding=None):
+    cache_key = exact_cache_key(model, topic_id, difficulty, question, answer)
+    cache.set(cache_key, review, timeout=cache_ttl())
+
+    if semantic_enabled() and embedding is not None:
+        get_semantic_index().add(
+            question_key(model, topic_id, difficulty, question), cache_key, embedding, review
+        )
+
+
+def get_review_cache_metrics():
+    metrics = get_counters("review_cache", METRIC_KEYS)
+    hits = metrics["exact_hits"] + metrics["semantic_hits"]
+    metrics["hit_rate"] = hit_rate(hits, hits + metrics["misses"])
+    return metrics
@@ -0,0 +1,8 @@
+from django.db.models.signals import post_delete, post_save
+from learn.models import LearningCategory, LearningTopic
+from utils.catalog_cache import bump_catalog_version
+
+# catalog responses embed categories and topics, drop them all on any change
+for model in (LearningCategory, LearningTopic):
+    post_save.connect(bump_catalog_version, sender=model, dispatch_uid=f"catalog_save_{model.__name__}")
+    post_delete.connect(bump_catalog_version, sender=model, dispatch_uid=f"catalog_delete_{model.__name__}")
@@ -0,0 +1,79 @@
+"""
+Maintenance of UserTopicStatistics.
+
+record_answer() keeps the statistics current on every reviewed answer with an
+atomic F() increment, one UPDATE in the common case, so concurrent answers
+can't overwrite each other's counts. recompute_statistics() rebuilds them from
+UserLearningHistory for repairs (see the `recompute_topic_statistics` command).
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+from learn.models import UserLearningHistory, UserTopicStatistics
+
+
+def record_answer(user_id, topic_id, score):
+    """Add one answered question with its score to the user's topic statistics."""
+    increment = dict(
+        total_score=F("total_score") + score,
+        questions_asked=F("questions_asked") + 1,
+        updated_at=timezone.now()
+    )
+    stats = UserTopicStatistics.objects.filter(user_id=user_id, topic_id=topic_id)
+
+    if stats.update(**increment):
+        return
+
+    # first answer on this topic, a concurrent request may create the row first
+    try:
+        with transaction.atomic():
+            UserTopicStatistics.objects.create(
+                user_id=user_id, topic_id=topic_id, total_score=score, questions_asked=1
+            )
+    except IntegrityError:
+        stats.update(**increment)
+
+
+def recompute_statistics(user_ids, topic_id=None):
+    """
+    Rebuild the statistics of the given users from their learning history with
+    one aggregate query, written back with one bulk upsert. Statistics without
+    any history left are deleted. Returns the number of rows written.
+    """
+    history = UserLearningHistory.objects.filter(user_id__in=user_ids)
+    existing = UserTopicStatistics.objects.filter(user_id__in=user_ids)
+    if topic_id is not None:
+        history = history.filter(topic_id=topic_id)
+        existing = existing.filter(topic_id=topic_id)
+
+    totals = (
+        history.order_by()
+        .values("user_id", "topic_id")
+        .annotate(total_score=Sum("score"), questions_asked=Count("id"))
+    )
+    rows = [
+        UserTopicStatistics(
+            user_id=row["user_id"],
+            topic_id=row["topic_id"],
+            total_score=row["total_score"] or 0,
+            questions_asked=row["questions_asked"]
+        )
+        for row in totals.iterator()
+    ]
+
+    with transaction.atomic():
+        UserTopicStatistics.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["user", "topic"],
+            update_fields=["total_score", "questions_asked", "updated_at"]
+        )
+        keep = {(row.user_id, row.topic_id) for row in rows}
+        stale = [
+            stats_id for stats_id, user_id, topic in existing.values_list("id", "user_id", "topic_id")
+            if (user_id, topic) not in keep
+        ]
+        if stale:
+            UserTopicStatistics.objects.filter(id__in=stale).delete()
+
+    return len(rows)
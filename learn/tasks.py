@@ -0,0 +1,10 @@
+from learn.statistics import recompute_statistics
+from jobs.runner import task
+
+
+# Nothing enqueues this any more, record_answer updates the statistics inline.
+# Kept for one release so the jobs queued by the previous one still run, remove it after.
+@task("learn.update_topic_statistics")
+def update_topic_statistics(user_id, topic_id):
+    """Rebuild a user's topic statistics from their learning history."""
+    recompute_statistics([user_id], topic_id=topic_id)
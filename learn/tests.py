@@ -1,3 +1,512 @@
-from django.test import TestCase
+import base64
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from unittest import mock, skipUnless
+import openai
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from accounts.models import MyUsers
+from characters.prompts import CHAT_REPLY_SCHEMA
+from learn import query_plans, question_pool, review_cache
+from learn.management.commands.load_test import percentile
+from learn.models import LearningCategory, LearningTopic, PooledQuestion, UserLearningHistory
+from learn.prompts import QUESTION_BATCH_SCHEMA, QUESTION_SCHEMA, REVIEW_SCHEMA
+from learn.question_pool import pop_question, refill_lock_key
+from learn.review_cache import SemanticReviewIndex, exact_cache_key, lookup_review, normalize_text, store_review
+from utils import catalog_cache
+from utils import llm
+from llm_usage.models import LLMCall
+from utils.llm import (
+    CircuitBreaker, LLMUnavailableError, RetryBudget, StructuredOutputError, complete_structured,
+    json_schema_format, parse_structured, validate
+)
+from utils.mock_llm import MockLLMConfig, MockLLMServer, reply_content
+from utils.pagination import MAX_PAGE_SIZE, decode_cursor, encode_cursor, page_limit, page_offset
 
-# Create your tests here.
+
+@skipUnless(connection.vendor in query_plans.SUPPORTED_VENDORS, "query plans are checked on sqlite and postgresql")
+class QueryPlanTests(TestCase):
+    """EXPLAIN each hot query and fail on a full scan or a sort, it must be served by an index."""
+
+    def test_hot_queries_use_an_index(self):
+        for name, query in query_plans.HOT_QUERIES:
+            with self.subTest(name=name):
+                plan, problems = query_plans.explain(query())
+                self.assertEqual(problems, [], f"\n{plan}")
+
+    def test_full_index_scan_is_a_problem(self):
+        plan = "SCAN learn_leaderboardscore USING INDEX leaderboard_rank_idx"
+        self.assertEqual(query_plans.plan_problems("sqlite", plan), [f"full scan: {plan}"])
+
+
+@override_settings(QUESTION_POOL_LOW_WATERMARK=5, QUESTION_POOL_HIGH_WATERMARK=20)
+class QuestionPoolTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        category = LearningCategory.objects.create(category="Programming")
+        self.topic = LearningTopic.objects.create(category=category, topic="Python")
+
+        patcher = mock.patch.object(question_pool, "request_refill")
+        self.request_refill = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def add_questions(self, count):
+        PooledQuestion.objects.bulk_create([
+            PooledQuestion(topic=self.topic, difficulty="easy", question=f"Question {i}?") for i in range(count)
+        ])
+
+    def test_pool_is_counted_once_per_period(self):
+        self.add_questions(4)
+
+        with self.assertNumQueries(3):  # candidates, claim, count
+            self.assertIsNotNone(pop_question(self.topic, "easy"))
+        self.request_refill.assert_called_once_with(self.topic.id, "easy")
+
+        with self.assertNumQueries(2):
+            self.assertIsNotNone(pop_question(self.topic, "easy"))
+        self.assertEqual(self.request_refill.call_count, 1)
+
+    def test_full_pool_is_not_refilled(self):
+        self.add_questions(10)
+        pop_question(self.topic, "easy")
+        self.request_refill.assert_not_called()
+
+    def test_miss_requests_a_refill_without_counting(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(pop_question(self.topic, "easy"))
+        self.request_refill.assert_called_once_with(self.topic.id, "easy")
+
+    def refill_command(self):
+        out = StringIO()
+        with mock.patch("learn.management.commands.refill_question_pool.refill_pool", return_value=20) as refill_pool:
+            call_command("refill_question_pool", topic=self.topic.id, difficulty="easy", stdout=out)
+        return refill_pool, out.getvalue()
+
+    def test_refill_command_takes_the_refill_lock(self):
+        refill_pool, out = self.refill_command()
+        refill_pool.assert_called_once_with(self.topic, "easy", target=20)
+        self.assertIn("added 20 questions", out)
+        self.assertTrue(cache.add(refill_lock_key(self.topic.id, "easy"), 1))  # released
+
+    def test_refill_command_skips_a_locked_pool(self):
+        cache.add(refill_lock_key(self.topic.id, "easy"), 1)
+        refill_pool, out = self.refill_command()
+        refill_pool.assert_not_called()
+        self.assertIn("already being refilled", out)
+
+
+class CatalogCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.addCleanup(catalog_cache._local.clear)
+        category = LearningCategory.objects.create(category="Programming")
+        self.topic = LearningTopic.objects.create(category=category, topic="Python")
+
+    def shared_cache(self):
+        # a single test process sees the locmem cache like every worker sees Redis
+        return mock.patch.object(catalog_cache, "cache_is_shared", return_value=True)
+
+    def topic_names(self):
+        response = self.client.get("/learn/topics/list")
+        self.assertEqual(response.status_code, 200)
+        return [topic["topic"] for topic in response.json()["data"]["data"]]
+
+    def test_cached_until_a_topic_is_saved(self):
+        with self.shared_cache():
+            self.assertEqual(self.topic_names(), ["Python"])
+            with self.assertNumQueries(0):
+                self.assertEqual(self.topic_names(), ["Python"])
+
+            version = catalog_cache.get_catalog_version()
+            self.topic.topic = "Django"
+            self.topic.save()
+            self.assertEqual(catalog_cache.get_catalog_version(), version + 1)
+            self.assertEqual(self.topic_names(), ["Django"])
+
+    def test_cache_dropped_when_a_topic_is_deleted(self):
+        with self.shared_cache():
+            self.assertEqual(self.topic_names(), ["Python"])
+            version = catalog_cache.get_catalog_version()
+            self.topic.delete()
+            self.assertEqual(catalog_cache.get_catalog_version(), version + 1)
+            self.assertEqual(self.topic_names(), [])
+
+    def test_not_modified(self):
+        with self.shared_cache():
+            etag = self.client.get("/learn/topics/list")["ETag"]
+            response = self.client.get("/learn/topics/list", headers={"If-None-Match": etag})
+            self.assertEqual((response.status_code, response["ETag"], response.content), (304, etag, b""))
+
+            response = self.client.get(f"/learn/topic/{self.topic.id}/details", headers={"If-None-Match": '"stale", ' + etag})
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get(f"/learn/topic/{self.topic.id}/details", headers={"If-None-Match": response["ETag"]})
+            self.assertEqual(response.status_code, 304)
+
+    def test_process_local_cache_is_bypassed(self):
+        self.assertEqual(self.topic_names(), ["Python"])
+        etag = self.client.get("/learn/topics/list")["ETag"]
+        self.assertEqual(catalog_cache._local, {})
+
+        # another process renamed the topic, this one never heard of it
+        LearningTopic.objects.filter(id=self.topic.id).update(topic="Django")
+        self.assertEqual(self.topic_names(), ["Django"])
+        response = self.client.get("/learn/topics/list", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+
+
+class ReviewCacheTests(SimpleTestCase):
+    review = {"score": 8, "feedback": "Good"}
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text("  A list\n is  MUTABLE "), "a list is mutable")
+        self.assertEqual(normalize_text(42), "42")
+
+    def test_key_ignores_case_and_whitespace(self):
+        key = exact_cache_key("gpt-4o-mini", 1, "easy", "What is a list?", "A mutable  sequence")
+        self.assertEqual(key, exact_cache_key("gpt-4o-mini", 1, "easy", " what is a LIST? ", "a mutable sequence\n"))
+
+    def test_key_keeps_punctuation(self):
+        self.assertNotEqual(
+            exact_cache_key("gpt-4o-mini", 1, "easy", "Compare", "a > b"),
+            exact_cache_key("gpt-4o-mini", 1, "easy", "Compare", "a < b"),
+        )
+        self.assertNotEqual(
+            exact_cache_key("gpt-4o-mini", 1, "easy", "Complexity?", "O(n^2)"),
+            exact_cache_key("gpt-4o-mini", 1, "easy", "Complexity?", "O(n2)"),
+        )
+
+    def test_key_is_per_model_topic_and_difficulty(self):
+        key = exact_cache_key("gpt-4o-mini", 1, "easy", "Q", "A")
+        for other in (("gpt-4o", 1, "easy"), ("gpt-4o-mini", 2, "easy"), ("gpt-4o-mini", 1, "hard")):
+            with self.subTest(other=other):
+                self.assertNotEqual(key, exact_cache_key(*other, "Q", "A"))
+
+    def test_exact_hit(self):
+        store_review("gpt-4o-mini", 1, "easy", "What is a list?", "A mutable sequence", self.review)
+        self.assertEqual(lookup_review("gpt-4o-mini", 1, "easy", "what is a list?", "a mutable sequence"), (self.review, None))
+        self.assertEqual(lookup_review("gpt-4o", 1, "easy", "What is a list?", "A mutable sequence"), (None, None))
+
+    @override_settings(REVIEW_CACHE_SEMANTIC=True, REVIEW_CACHE_SIMILARITY=0.95)
+    def test_semantic_hit(self):
+        vectors = {"a mutable sequence": [3, 4], "a sequence you can change": [3.1, 4], "an immutable sequence": [4, -3]}
+        with mock.patch.object(review_cache, "_index", None), \
+                mock.patch.object(review_cache, "create_embedding", side_effect=lambda text, model: vectors[text]):
+            review, embedding = lookup_review("gpt-4o-mini", 1, "easy", "What is a list?", "A mutable sequence")
+            self.assertIsNone(review)
+            self.assertEqual(embedding, [0.6, 0.8])
+            store_review("gpt-4o-mini", 1, "easy", "What is a list?", "A mutable sequence", self.review, embedding)
+
+            self.assertEqual(lookup_review("gpt-4o-mini", 1, "easy", "What is a list?", "A sequence you can change")[0], self.review)
+            self.assertIsNone(lookup_review("gpt-4o-mini", 1, "easy", "What is a list?", "An immutable sequence")[0])
+            self.assertIsNone(lookup_review("gpt-4o", 1, "easy", "What is a list?", "A sequence you can change")[0])
+
+    def test_semantic_index_drops_the_least_recently_used(self):
+        index = SemanticReviewIndex(max_entries=2, ttl=60)
+        index.add("q", "a", [1, 0], "review a")
+        index.add("q", "b", [0, 1], "review b")
+        self.assertEqual(index.search("q", [1, 0], 0.9), "review a")  # a is now the most recent
+        index.add("q", "c", [0.6, 0.8], "review c")
+
+        self.assertEqual(len(index), 2)
+        self.assertIsNone(index.search("q", [0, 1], 0.99))
+        self.assertEqual(index.search("q", [1, 0], 0.99), "review a")
+
+    def test_semantic_index_expiry(self):
+        index = SemanticReviewIndex(max_entries=10, ttl=-1)
+        index.add("q", "a", [1, 0], "review a")
+        self.assertIsNone(index.search("q", [1, 0], 0.9))
+        self.assertEqual(len(index), 0)
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        user = MyUsers.objects.create_user("ada@example.com", username="ada")
+        category = LearningCategory.objects.create(category="Programming")
+        self.topic = LearningTopic.objects.create(category=category, topic="Python")
+        UserLearningHistory.objects.bulk_create([
+            UserLearningHistory(user=user, topic=self.topic, question=f"Q{i}", difficulty="easy", user_answer="A")
+            for i in range(5)
+        ])
+        # three rows created in the same instant, the id breaks the tie
+        created_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        ids = list(UserLearningHistory.objects.order_by("id").values_list("id", flat=True))
+        for id, delta in zip(ids, (0, 1, 1, 1, 2)):
+            UserLearningHistory.objects.filter(id=id).update(created_at=created_at + timedelta(minutes=delta))
+        self.newest_first = [ids[4], ids[3], ids[2], ids[1], ids[0]]
+
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.url = f"/learn/topic/{self.topic.id}/history"
+
+    def get_page(self, **params):
+        response = self.client.get(self.url, params)
+        return response.status_code, response.json()
+
+    def test_pages_return_every_row_once(self):
+        ids, cursor = [], ""
+        while cursor is not None:
+            status, body = self.get_page(cursor=cursor, limit=2)
+            self.assertEqual(status, 200)
+            ids += [history["id"] for history in body["data"]["data"]]
+            cursor = body["data"]["next_cursor"]
+        self.assertEqual(ids, self.newest_first)
+
+    def test_with_count(self):
+        _, body = self.get_page(cursor="", limit=2, with_count="true")
+        self.assertEqual(body["data"]["count"], 5)
+
+    def test_invalid_cursor(self):
+        wrong_types = base64.urlsafe_b64encode(json.dumps(["2025-01-01T00:00:00+00:00", "1"]).encode()).decode()
+        for cursor in ("garbage", "e30", wrong_types):
+            with self.subTest(cursor=cursor):
+                status, body = self.get_page(cursor=cursor)
+                self.assertEqual((status, body["message"]), (400, "Invalid cursor"))
+
+    def test_limit_is_validated_apart_from_the_cursor(self):
+        status, body = self.get_page(cursor="", limit="abc")
+        self.assertEqual(status, 200)
+        self.assertEqual(len(body["data"]["data"]), 5)
+
+    def test_cursor_round_trip(self):
+        history = UserLearningHistory.objects.get(id=self.newest_first[0])
+        self.assertEqual(decode_cursor(encode_cursor(history)), (history.created_at, history.id))
+
+    def test_page_limit_and_offset(self):
+        self.assertEqual([page_limit(value, 20) for value in (None, "", "5", "0", "-3", "abc", "1000")],
+                         [20, 20, 5, 1, 1, 20, MAX_PAGE_SIZE])
+        self.assertEqual([page_offset(value) for value in (None, "7", "-1", "x")], [0, 7, 0, 0])
+
+
+class ParseStructuredTests(SimpleTestCase):
+    review = {"feedback": "Good", "improved_answer": "A list is mutable.", "score": 8}
+
+    def test_valid_reply(self):
+        self.assertEqual(parse_structured(json.dumps(self.review), REVIEW_SCHEMA), self.review)
+
+    def test_repaired_replies(self):
+        body = json.dumps(self.review)
+        for content in (
+            f"```json\n{body}\n```",
+            f"Here is the review: {body} Hope it helps!",
+            body[:-1] + ",}",
+        ):
+            with self.subTest(content=content):
+                self.assertEqual(parse_structured(content, REVIEW_SCHEMA), self.review)
+
+    def test_coerced_and_cleaned(self):
+        content = json.dumps({**self.review, "score": "8", "extra": "dropped"})
+        self.assertEqual(parse_structured(content, REVIEW_SCHEMA), self.review)
+
+    def test_invalid_replies_keep_the_content(self):
+        for content, message in (
+            ("", "empty reply"),
+            ("no json here", "reply is not JSON"),
+            (json.dumps({"feedback": "Good", "score": 8}), "$: missing improved_answer"),
+            (json.dumps({**self.review, "score": "eight"}), "$.score: expected integer, got str"),
+        ):
+            with self.subTest(content=content):
+                with self.assertRaisesMessage(StructuredOutputError, message) as raised:
+                    parse_structured(content, REVIEW_SCHEMA)
+                self.assertEqual(raised.exception.content, content)
+
+
+class RetryBudgetTests(SimpleTestCase):
+
+    def test_starts_with_the_reserve(self):
+        budget = RetryBudget(ratio=0.2, reserve=2)
+        self.assertEqual([budget.withdraw() for _ in range(3)], [True, True, False])
+
+    def test_calls_earn_retries(self):
+        budget = RetryBudget(ratio=0.2, reserve=2)
+        budget.tokens = 0
+        for _ in range(4):
+            budget.deposit()
+        self.assertFalse(budget.withdraw())
+        budget.deposit()
+        self.assertTrue(budget.withdraw())  # one retry per five calls
+
+    def test_capped_at_the_reserve(self):
+        budget = RetryBudget(ratio=1, reserve=2)
+        for _ in range(10):
+            budget.deposit()
+        self.assertEqual(budget.tokens, 2)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 100.0
+        patcher = mock.patch("utils.llm.time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30)
+
+    def fail(self, times):
+        with self.assertLogs("utils.llm", "ERROR"):
+            for _ in range(times):
+                self.breaker.record_failure()
+
+    def test_opens_after_failures_in_a_row(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+
+        self.fail(1)
+        self.assertTrue(self.breaker.is_open)
+        self.assertFalse(self.breaker.allow())
+
+    def test_one_trial_call_after_the_reset(self):
+        self.fail(3)
+        self.now += 30
+        self.assertEqual([self.breaker.allow(), self.breaker.allow()], [True, False])
+
+        self.breaker.record_failure()  # the trial failed, wait again
+        self.now += 29
+        self.assertFalse(self.breaker.allow())
+        self.now += 1
+        self.assertTrue(self.breaker.allow())
+
+        self.breaker.record_success()
+        self.assertFalse(self.breaker.is_open)
+        self.assertEqual([self.breaker.allow(), self.breaker.allow()], [True, True])
+
+
+@override_settings(LLM_MAX_RETRIES=2, LLM_CIRCUIT_FAILURES=3, LLM_RETRY_BUDGET_RESERVE=10)
+class GatewayRetryTests(TestCase):
+    connection_error = openai.APIConnectionError(request=mock.Mock())
+    bad_request = openai.BadRequestError("bad", response=mock.Mock(status_code=400, headers={}), body=None)
+
+    def setUp(self):
+        # the budget and breaker are per-process singletons
+        for name in ("_retry_budget", "_circuit_breaker"):
+            setattr(llm, name, None)
+            self.addCleanup(setattr, llm, name, None)
+        patcher = mock.patch.object(llm, "backoff_delay", return_value=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_transient_error_is_retried(self):
+        create = mock.Mock(side_effect=[self.connection_error, "reply"])
+        with self.assertLogs("utils.llm", "WARNING"):
+            self.assertEqual(llm.call(create, "question", model="gpt-4o-mini"), "reply")
+
+        self.assertEqual(create.call_count, 2)
+        call = LLMCall.objects.get()
+        self.assertEqual((call.status, call.attempts), (LLMCall.STATUS_OK, 2))
+
+    def test_gives_up_after_max_retries(self):
+        create = mock.Mock(side_effect=self.connection_error)
+        with self.assertLogs("utils.llm", "WARNING"), self.assertRaises(openai.APIConnectionError):
+            llm.call(create, "question", model="gpt-4o-mini")
+        self.assertEqual(create.call_count, 3)
+        self.assertEqual(LLMCall.objects.get().status, LLMCall.STATUS_ERROR)
+
+    def test_bad_request_is_not_retried(self):
+        create = mock.Mock(side_effect=self.bad_request)
+        with self.assertRaises(openai.BadRequestError):
+            llm.call(create, "question", model="gpt-4o-mini")
+        self.assertEqual(create.call_count, 1)
+
+    @override_settings(LLM_RETRY_BUDGET_RESERVE=0)
+    def test_no_retry_without_budget(self):
+        create = mock.Mock(side_effect=[self.connection_error, "reply"])
+        with self.assertRaises(openai.APIConnectionError):
+            llm.call(create, "question", model="gpt-4o-mini")
+        self.assertEqual(create.call_count, 1)
+
+    def test_open_circuit_fails_fast(self):
+        create = mock.Mock(side_effect=self.connection_error)
+        with self.assertLogs("utils.llm", "WARNING"), self.assertRaises(openai.APIConnectionError):
+            llm.call(create, "question", model="gpt-4o-mini")  # three failures open the circuit
+
+        with self.assertRaises(LLMUnavailableError):
+            llm.call(create, "question", model="gpt-4o-mini")
+        self.assertEqual(create.call_count, 3)
+        self.assertEqual(LLMCall.objects.latest("id").status, LLMCall.STATUS_UNAVAILABLE)
+
+
+class MockLLMTests(TestCase):
+    """The LLM gateway against the mock_llm_server stub."""
+    schemas = [
+        ("question", QUESTION_SCHEMA),
+        ("question_batch", QUESTION_BATCH_SCHEMA),
+        ("answer_review", REVIEW_SCHEMA),
+        ("chat_reply", CHAT_REPLY_SCHEMA),
+    ]
+
+    def start_server(self):
+        server = MockLLMServer(("127.0.0.1", 0), MockLLMConfig(latency_ms=0, tokens_per_second=0, seed=1))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        settings_override = override_settings(
+            OPENAI_API_KEY="mock", OPENAI_BASE_URL=f"http://127.0.0.1:{server.server_address[1]}/v1"
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        # the client is a singleton bound to OPENAI_BASE_URL
+        llm._client = None
+        self.addCleanup(setattr, llm, "_client", None)
+        return server
+
+    def test_replies_match_the_schemas(self):
+        config = MockLLMConfig(seed=1)
+        for name, schema in self.schemas:
+            with self.subTest(name):
+                body = {"response_format": json_schema_format(name, schema)}
+                for _ in range(20):
+                    validate(json.loads(reply_content(body, config)), schema)
+
+    def test_complete_structured_passes_validate(self):
+        server = self.start_server()
+        messages = [{"role": "user", "content": "Ask me about Python"}]
+        for name, schema in self.schemas:
+            with self.subTest(name):
+                data = complete_structured(messages, name, schema)
+                self.assertEqual(validate(data, schema), data)
+                self.assertEqual(set(data), set(schema["properties"]))
+
+        # valid on the first attempt, no retry was needed
+        self.assertEqual(server.counts, {"ok": len(self.schemas)})
+
+
+class PercentileTests(SimpleTestCase):
+
+    def test_empty(self):
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_single_value(self):
+        for percent in (0, 50, 99, 100):
+            self.assertEqual(percentile([7.5], percent), 7.5)
+
+    def test_bounds(self):
+        values = list(range(1, 11))
+        self.assertEqual(percentile(values, 0), 1)
+        self.assertEqual(percentile(values, 100), 10)
+        self.assertEqual(percentile(values, 150), 10)
+
+    def test_nearest_rank(self):
+        self.assertEqual(percentile([1, 2], 50), 1)
+        self.assertEqual(percentile(list(range(1, 11)), 50), 5)
+        self.assertEqual(percentile(list(range(1, 11)), 51), 6)
+        self.assertEqual(percentile(list(range(1, 21)), 95), 19)
+        self.assertEqual(percentile(list(range(1, 31)), 95), 29)  # rank 28.5 rounds up
+        self.assertEqual(percentile(list(range(1, 101)), 99), 99)
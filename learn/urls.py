@@ -4,6 +4,8 @@ from learn.views.learning_topic_views import ListLearningTopics, TopicDetailView
 from learn.views.learn_views import (
     GenerateQuestion, AnswerResults, ListUserLearningHistory
 )
+from learn.views.learn_async_views import AsyncGenerateQuestion, AsyncAnswerResults
+from learn.views.leaderboard_views import LeaderboardView
 
 # base url - /learn/
 
@@ -15,4 +17,13 @@ urlpatterns = [
     path('generate/<int:topic_id>/question', GenerateQuestion.as_view()),
     path('question/answer/result', AnswerResults.as_view()),
     path('topic/<int:topic_id>/history', ListUserLearningHistory.as_view()),
+
+    # leaderboards, ?period=all|week&limit=10
+    path('leaderboard', LeaderboardView.as_view()),
+    path('leaderboard/topic/<int:topic_id>', LeaderboardView.as_view()),
+    path('leaderboard/category/<int:category_id>', LeaderboardView.as_view()),
+
+    # async (ASGI) endpoints
+    path('async/generate/<int:topic_id>/question', AsyncGenerateQuestion.as_view()),
+    path('async/question/answer/result', AsyncAnswerResults.as_view()),
 ]
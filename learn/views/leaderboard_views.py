@@ -0,0 +1,35 @@
+from rest_framework.views import APIView
+from utils.response import response_data
+from utils.db_router import read_from_replica
+from learn.leaderboard import (
+    GLOBAL_BOARD, PERIODS, category_board, get_leaderboard, topic_board
+)
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+
+
+class LeaderboardView(APIView):
+    permission_classes = []  # public, "me" is added for authenticated users
+
+    @read_from_replica
+    def get(self, request, topic_id=None, category_id=None):
+        period = request.query_params.get("period", "all")
+        try:
+            limit = int(request.query_params.get("limit") or DEFAULT_LIMIT)
+        except ValueError:
+            limit = DEFAULT_LIMIT
+        limit = max(1, min(limit, MAX_LIMIT))
+
+        if period not in PERIODS:
+            return response_data(success=False, message="period must be 'all' or 'week'", status_code=400)
+
+        if topic_id is not None:
+            board = topic_board(topic_id)
+        elif category_id is not None:
+            board = category_board(category_id)
+        else:
+            board = GLOBAL_BOARD
+
+        user = request.user if request.user.is_authenticated else None
+        return response_data(success=True, data=get_leaderboard(board, period, limit, user))
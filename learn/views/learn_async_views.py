@@ -0,0 +1,155 @@
+from asgiref.sync import sync_to_async
+from utils.async_views import AsyncAPIView
+from utils.llm import LLMUnavailableError, StructuredOutputError, acomplete_structured
+from utils.response import json_response_data
+from learn.models import AIModels, LearningTopic
+from learn.ai_models import aselect_ai_model
+from learn.prompts import (
+    QUESTION_SYSTEM_PROMPT, REVIEW_SYSTEM_PROMPT, QUESTION_SCHEMA, REVIEW_SCHEMA,
+    build_question_prompt, build_review_prompt
+)
+from learn.question_pool import pop_question
+from learn.review_cache import lookup_review, store_review
+from learn.views.learn_views import recent_questions_qs, save_answer_result
+
+# Async (ASGI) versions of the LLM backed learn endpoints.
+# While waiting on OpenAI the event loop serves other requests instead of holding a worker thread.
+
+
+class AsyncGenerateQuestion(AsyncAPIView):
+
+    async def get(self, request, topic_id):
+        difficulty = request.GET.get('difficulty', "easy").lower()
+
+        # Validate topic
+        topic = await LearningTopic.objects.select_related("category").filter(id=topic_id).afirst()
+        if not topic:
+            return json_response_data(
+                success=False,
+                message="Topic not found",
+            )
+
+        # Validate difficulty
+        if difficulty not in ["easy", "medium", "hard"]:
+            difficulty = "easy"
+
+        requested_model = request.GET.get("model")
+        try:
+            ai_model, model_name = await aselect_ai_model(requested_model)
+        except AIModels.DoesNotExist as e:
+            return json_response_data(success=False, message=str(e), status_code=400)
+
+        user = request.user if request.user.is_authenticated else None
+
+        # Serve a pre-generated question when the pool has one the user hasn't answered,
+        # pooled questions come from the default model
+        pooled_question = None if requested_model else await sync_to_async(pop_question)(topic, difficulty, user)
+        if pooled_question:
+            return json_response_data(success=True, data={"question": {"question": pooled_question}})
+
+        # Get last 5 asked questions for this user and topic to avoid duplicate
+        asked_questions = []
+        if user:
+            asked_questions = [question async for question in recent_questions_qs(user, topic, difficulty)]
+
+        prompt = build_question_prompt(topic.topic, topic.category.category, difficulty, asked_questions)
+
+        try:
+            question_json = await acomplete_structured(
+                [
+                    {"role": "system", "content": QUESTION_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                "question",
+                QUESTION_SCHEMA,
+                model=model_name,
+                temperature=0.7,
+                user=user
+            )
+
+        except LLMUnavailableError as e:
+            return json_response_data(success=False, message=str(e), status_code=503)
+
+        except Exception as e:
+            return json_response_data(
+                success=False,
+                message=f"Failed to generate question: {str(e)}"
+            )
+
+        return json_response_data(success=True, data={"question": question_json})
+
+
+class AsyncAnswerResults(AsyncAPIView):
+
+    async def post(self, request):
+        user = request.user if request.user.is_authenticated else None
+        question = request.data.get('question')
+        answer = request.data.get('answer')
+        topic_id = request.data.get('topic_id')
+        difficulty = (request.data.get('difficulty') or 'easy').lower()
+
+        if not question or not answer or not topic_id:
+            return json_response_data(
+                success=False,
+                message="Please provide 'question', 'answer', and 'topic'."
+            )
+
+        # Validate topic
+        topic = await LearningTopic.objects.select_related("category").filter(id=topic_id).afirst()
+        if not topic:
+            return json_response_data(success=False, message="Topic not found")
+
+        # Validate difficulty
+        if difficulty not in ['easy', 'medium', 'hard']:
+            difficulty = 'easy'
+
+        try:
+            ai_model, model_name = await aselect_ai_model(request.data.get("model"))
+        except AIModels.DoesNotExist as e:
+            return json_response_data(success=False, message=str(e), status_code=400)
+
+        prompt = build_review_prompt(question, answer, topic.topic, topic.category.category)
+
+        # Reuse the review of the same (or a near-identical) answer graded before
+        review_json, answer_embedding = await sync_to_async(lookup_review)(model_name, topic.id, difficulty, question, answer)
+
+        try:
+            if review_json is None:
+                try:
+                    review_json = await acomplete_structured(
+                        [
+                            {"role": "system", "content": REVIEW_SYSTEM_PROMPT},
+                            {"role": "user", "content": prompt}
+                        ],
+                        "answer_review",
+                        REVIEW_SCHEMA,
+                        model=model_name,
+                        temperature=0.7,
+                        user=user
+                    )
+                except StructuredOutputError as e:
+                    return json_response_data(
+                        success=False,
+                        message="failed to get results, please try again",
+                        error=f"failed to get expected response - error : {str(e)}"
+                    )
+
+                await sync_to_async(store_review)(model_name, topic.id, difficulty, question, answer, review_json, answer_embedding)
+
+            # Save user learning history only if authenticated
+            if user:
+                await sync_to_async(save_answer_result)(user, topic, question, answer, difficulty, review_json, ai_model)
+
+        except LLMUnavailableError as e:
+            return json_response_data(success=False, message=str(e), status_code=503)
+
+        except Exception as e:
+            return json_response_data(
+                success=False,
+                message=f"Failed to review answer: {str(e)}",
+                status_code=500
+            )
+
+        # Always return GPT review, regardless of authentication
+        return json_response_data(success=True, data={"review": review_json})
+
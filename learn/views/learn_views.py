@@ -1,16 +1,51 @@
-import openai
-import json
-import re
 from django.contrib.auth import authenticate
 from django.contrib.auth.hashers import make_password
 from django.db import IntegrityError, transaction
-from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from accounts.serializers.user_serializers import UserSerializer
 from utils.response import response_data
-from learn.models import LearningTopic, AIModels, UserLearningHistory, UserTopicStatistics
+from utils.llm import LLMUnavailableError, StructuredOutputError, complete_structured
+from learn.models import LearningTopic, AIModels, UserLearningHistory
+from learn.ai_models import select_ai_model
 from learn.serializers.learning_history_serializer import UserLearningHistorySerializer
+from utils.pagination import decode_cursor, keyset_paginate, page_limit, page_offset
+from utils.db_router import read_from_replica
+from learn.question_pool import pop_question
+from learn.review_cache import lookup_review, store_review
+from learn.statistics import record_answer
+from learn.leaderboard import record_answer_score
+from learn.prompts import (
+    QUESTION_SYSTEM_PROMPT, REVIEW_SYSTEM_PROMPT, QUESTION_SCHEMA, REVIEW_SCHEMA,
+    build_question_prompt, build_review_prompt
+)
+
+
+def save_answer_result(user, topic, question, answer, difficulty, review_json, ai_model=None):
+    """Store a reviewed answer in the user's history and update their topic statistics and leaderboard scores."""
+    with transaction.atomic():
+        UserLearningHistory.objects.create(
+            user=user,
+            topic=topic,
+            ai_model=ai_model,
+            question=question,
+            difficulty=difficulty,
+            user_answer=answer,
+            feedback=review_json.get("feedback", ""),
+            improved_answer=review_json.get("improved_answer", ""),
+            score=int(review_json.get("score", 0))
+        )
+        record_answer(user.id, topic.id, int(review_json.get("score", 0)))
+        record_answer_score(user.id, topic.id, topic.category_id, int(review_json.get("score", 0)))
+
+
+def recent_questions_qs(user, topic, difficulty):
+    """The last 5 questions the user was asked on a topic, to avoid asking them again."""
+    return UserLearningHistory.objects.filter(
+        user=user,
+        topic=topic,
+        difficulty=difficulty
+    ).order_by('-created_at').values_list("question", flat=True)[:5]
 
 
 class GenerateQuestion(APIView):
@@ -21,7 +56,7 @@ class GenerateQuestion(APIView):
 
         # Validate topic
         try:
-            topic = LearningTopic.objects.get(id=topic_id)
+            topic = LearningTopic.objects.select_related("category").get(id=topic_id)
         except LearningTopic.DoesNotExist:
             return response_data(
                 success=False,
@@ -32,52 +67,45 @@ class GenerateQuestion(APIView):
         if difficulty not in ["easy", "medium", "hard"]:
             difficulty = "easy"
 
+        requested_model = request.query_params.get("model")
+        try:
+            ai_model, model_name = select_ai_model(requested_model)
+        except AIModels.DoesNotExist as e:
+            return response_data(success=False, message=str(e), status_code=400)
+
         topic_name = topic.topic
         topic_category = topic.category.category
         
-        # Get last 5 asked questions for this user and topic to avoid duplicate
         user = request.user if request.user.is_authenticated else None
+
+        # Serve a pre-generated question when the pool has one the user hasn't answered,
+        # pooled questions come from the default model
+        pooled_question = None if requested_model else pop_question(topic, difficulty, user)
+        if pooled_question:
+            return response_data(success=True, data={"question": {"question": pooled_question}})
+
+        # Get last 5 asked questions for this user and topic to avoid duplicate
         asked_questions = []
         if user:
-            asked_questions = list(UserLearningHistory.objects.filter(
-                user=user,
-                topic=topic,
-                difficulty=difficulty
-            ).order_by('-created_at').values_list("question", flat=True)[:5])
-
-        avoid_text = "\n".join(f"- {q}" for q in asked_questions) if asked_questions else "none"
-
-        prompt = f"""
-        You are a friendly mentor. Ask one random theoretical question from the topic "{topic_name}" 
-        in the category "{topic_category}" with "{difficulty}" difficulty. 
-        Avoid these previously asked questions:
-        [{avoid_text}]
-        Instructions:
-        1. Respond ONLY in JSON format with the following structure:
-        {{
-            "question": "<the question here as a string and do not put answer here>"
-        }}
-        2. Do NOT include any text, explanation, code blocks, or extra formatting outside the JSON.
-        3. Make the question clear, concise, and suitable for an interview or learning assessment.
-        """
+            asked_questions = list(recent_questions_qs(user, topic, difficulty))
 
-        openai.api_key = settings.OPENAI_API_KEY
+        prompt = build_question_prompt(topic_name, topic_category, difficulty, asked_questions)
 
         try:
-            response = openai.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a helpful, friendly mentor."},
+            question_json = complete_structured(
+                [
+                    {"role": "system", "content": QUESTION_SYSTEM_PROMPT},
                     {"role": "user", "content": prompt}
                 ],
+                "question",
+                QUESTION_SCHEMA,
+                model=model_name,
                 temperature=0.7,
-                max_tokens=150
+                user=user
             )
 
-            gpt_content = response.choices[0].message.content
-            gpt_content = re.sub(r"^```json|```$", "", gpt_content.strip(), flags=re.MULTILINE).strip()
-
-            question_json = json.loads(gpt_content)
+        except LLMUnavailableError as e:
+            return response_data(success=False, message=str(e), status_code=503)
 
         except Exception as e:
             return response_data(
@@ -106,85 +134,56 @@ class AnswerResults(APIView):
 
         # Validate topic
         try:
-            topic = LearningTopic.objects.get(id=topic_id)
+            topic = LearningTopic.objects.select_related("category").get(id=topic_id)
         except Exception as e:
             return response_data(success=False, message="Topic not found")
 
         # Validate difficulty
         if difficulty not in ['easy', 'medium', 'hard']:
             difficulty = 'easy'
-            
-        avoid_text = ""
-        if user:
-            asked_questions = list(UserLearningHistory.objects.filter(
-                user=request.user if request.user.is_authenticated else None,
-                topic=topic,
-                difficulty=difficulty
-            ).values_list("question", flat=True))
-
-            avoid_text = "\n".join(f"- {q}" for q in asked_questions[-5:]) if asked_questions else ""
-            
+
+        try:
+            ai_model, model_name = select_ai_model(request.data.get("model"))
+        except AIModels.DoesNotExist as e:
+            return response_data(success=False, message=str(e), status_code=400)
+
         topic_category = topic.category.category
 
         # Prepare GPT prompt
-        prompt = f"""
-        Review this answer "{answer}" for question "{question}" (Topic: {topic.topic}, Category: {topic_category}). 
-        ignore these already asked questions "[]"
-        Instructions:
-        - Provide JSON only: {{"feedback": "...", "improved_answer": "...", "score": 0-10}}.
-        - Score 10-8: mostly correct, minor gaps. 5-7: partially correct. 1-4: incorrect, - 0: Completely irrelevant or does not attempt to answer.
-        - Feedback should be short, friendly, slightly funny.
-        - Do not include text outside JSON.
-        """
+        prompt = build_review_prompt(question, answer, topic.topic, topic_category)
 
-        openai.api_key = settings.OPENAI_API_KEY
+        # Reuse the review of the same (or a near-identical) answer graded before
+        review_json, answer_embedding = lookup_review(model_name, topic.id, difficulty, question, answer)
 
         try:
-            response = openai.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a helpful, friendly mentor and reviewer."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=300
-            )
+            if review_json is None:
+                try:
+                    review_json = complete_structured(
+                        [
+                            {"role": "system", "content": REVIEW_SYSTEM_PROMPT},
+                            {"role": "user", "content": prompt}
+                        ],
+                        "answer_review",
+                        REVIEW_SCHEMA,
+                        model=model_name,
+                        temperature=0.7,
+                        user=user
+                    )
+                except StructuredOutputError as e:
+                    return response_data(
+                        success=False,
+                        message="failed to get results, please try again",
+                        error=f"failed to get expected response - error : {str(e)}"
+                    )
 
-            gpt_content = response.choices[0].message.content
-            gpt_content = re.sub(r"^```json|```$", "", gpt_content.strip(), flags=re.MULTILINE).strip()
-
-            try:
-                review_json = json.loads(gpt_content)
-            except Exception as e:
-                return response_data(
-                    success=False,
-                    message="failed to get results, please try again",
-                    error=f"failed to get expected response - error : {str(e)}"
-                )
+                store_review(model_name, topic.id, difficulty, question, answer, review_json, answer_embedding)
 
             # Save user learning history only if authenticated
             if user:
-                with transaction.atomic():
-                    UserLearningHistory.objects.create(
-                        user=user,
-                        topic=topic,
-                        question=question,
-                        difficulty=difficulty,
-                        user_answer=answer,
-                        feedback=review_json.get("feedback", ""),
-                        improved_answer=review_json.get("improved_answer", ""),
-                        score=int(review_json.get("score", 0))
-                    )
-                    # Update or create topic statistics
-                    stats, created = UserTopicStatistics.objects.get_or_create(
-                        user=user,
-                        topic=topic,
-                        defaults={"total_score": review_json.get("score", 0), "questions_asked": 1}
-                    )
-                    if not created:
-                        stats.total_score += review_json.get("score", 0)
-                        stats.questions_asked += 1
-                        stats.save()
+                save_answer_result(user, topic, question, answer, difficulty, review_json, ai_model)
+
+        except LLMUnavailableError as e:
+            return response_data(success=False, message=str(e), status_code=503)
 
         except Exception as e:
             return response_data(
@@ -201,15 +200,37 @@ class AnswerResults(APIView):
 class ListUserLearningHistory(APIView):
     permission_classes = [IsAuthenticated]
 
+    @read_from_replica
     def get(self, request, topic_id):
+        """
+        Two pagination modes:
+        - ?cursor=<next_cursor> (empty for the first page): keyset pagination,
+          add &with_count=true to also get the total count
+        - ?offset=<n>: offset pagination (legacy)
+        """
         user = request.user
-        limit = int(request.query_params.get("limit") or 50)
-        offset = int(request.query_params.get("offset") or 0)
+        limit = page_limit(request.query_params.get("limit"), 50)
+        offset = page_offset(request.query_params.get("offset"))
         
-        histories = UserLearningHistory.objects.filter(
-            user=user, topic=topic_id
-        ).order_by("-created_at")
-       
+        histories = self.get_histories_qs(user, topic_id)
+
+        if "cursor" in request.query_params:
+            cursor = request.query_params["cursor"]
+            try:
+                position = decode_cursor(cursor) if cursor else None
+            except ValueError:
+                return response_data(success=False, message="Invalid cursor", status_code=400)
+
+            page, next_cursor = keyset_paginate(histories, position, limit)
+
+            data = {
+                "next_cursor": next_cursor,
+                "data": UserLearningHistorySerializer(page, many=True).data
+            }
+            if request.query_params.get("with_count") == "true":
+                data["count"] = histories.count()
+            return response_data(success=True, data=data)
+
         total_count = histories.count()
         paginated = histories[offset:offset+limit]
 
@@ -221,4 +242,9 @@ class ListUserLearningHistory(APIView):
             "count": total_count,
             "next_offset": offset + limit if offset + limit < total_count else None,
             "data": serializer.data
-        })
\ No newline at end of file
+        })
+
+    def get_histories_qs(self, user, topic_id):
+        return UserLearningHistory.objects.filter(
+            user=user, topic=topic_id
+        ).order_by("-created_at", "-id")
@@ -5,6 +5,8 @@ from accounts.models import (
 )
 from accounts.serializers.user_serializers import UserSerializer
 from utils.response import response_data
+from utils.catalog_cache import cache_catalog_response
+from utils.db_router import read_from_replica
 from learn.models import LearningCategory
 from learn.serializers.learning_category_serializers import LearningCategorySerializer
 
@@ -12,6 +14,8 @@ from learn.serializers.learning_category_serializers import LearningCategorySeri
 class ListLearningCategories(APIView):
     permission_classes = []
 
+    @read_from_replica
+    @cache_catalog_response("categories")
     def get(self, request):
         search = request.query_params.get("search")
         limit = int(request.query_params.get("limit", 20))   # default 20
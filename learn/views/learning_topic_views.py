@@ -2,6 +2,8 @@ from django.conf import settings
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
 from utils.response import response_data
+from utils.catalog_cache import cache_catalog_response, get_or_build, with_etag
+from utils.db_router import read_from_replica
 from learn.models import LearningTopic, UserTopicStatistics
 from learn.serializers.learning_topics_serializers import LearningTopicSerializer
 
@@ -9,13 +11,15 @@ from learn.serializers.learning_topics_serializers import LearningTopicSerialize
 class ListLearningTopics(APIView):
     permission_classes = []
 
+    @read_from_replica
+    @cache_catalog_response("topics")
     def get(self, request):
         search = request.query_params.get("search")
         category = request.query_params.get("category")
         limit = int(request.query_params.get("limit", 20))   # default 20
         offset = int(request.query_params.get("offset", 0))  # default 0
 
-        queryset = LearningTopic.objects.all().order_by("topic")
+        queryset = LearningTopic.objects.select_related("category").order_by("topic")
 
         if search:
             queryset = queryset.filter(topic__icontains=search)
@@ -39,20 +43,23 @@ class ListLearningTopics(APIView):
 class TopicDetailView(APIView):
     permission_classes = []
 
+    @read_from_replica
     def get(self, request, topic_id):
-        # Fetch topic
-        topic = get_object_or_404(LearningTopic, id=topic_id)
         user = request.user if request.user.is_authenticated else None
 
-        # Topic basic info
-        topic_data = LearningTopicSerializer(topic).data
+        # Topic basic info, cached (the statistics below are per user)
+        def build_topic_data():
+            topic = get_object_or_404(LearningTopic.objects.select_related("category"), id=topic_id)
+            return LearningTopicSerializer(topic).data
+
+        topic_data = dict(get_or_build("topic_details", {"topic_id": topic_id}, build_topic_data)["data"])
 
         # User-specific statistics
         if user:
-            stats = UserTopicStatistics.objects.filter(user=user, topic=topic).first()
+            stats = UserTopicStatistics.objects.filter(user=user, topic_id=topic_id).first()
             topic_data["user_statistics"] = {
                 "total_score": stats.total_score if stats else 0,
                 "questions_asked": stats.questions_asked if stats else 0
             }
 
-        return response_data(success=True, data=topic_data)
\ No newline at end of file
+        return with_etag(request, response_data(success=True, data=topic_data))
\ No newline at end of file
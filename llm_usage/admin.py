@@ -0,0 +1,55 @@
+from django.contrib import admin
+from django.db.models import Avg, Count, F, Q, Sum
+from llm_usage.models import LLMCall
+# Register your models here.
+
+SUMMARY_ROWS = 20
+
+SUMMARY_TOTALS = dict(
+    calls=Count("id"),
+    prompt_tokens=Sum("prompt_tokens"),
+    completion_tokens=Sum("completion_tokens"),
+    cost=Sum("cost"),
+    avg_latency_ms=Avg("latency_ms"),
+    invalid_outputs=Count("id", filter=Q(status=LLMCall.STATUS_INVALID_OUTPUT)),
+    errors=Count("id", filter=Q(status__in=[LLMCall.STATUS_ERROR, LLMCall.STATUS_UNAVAILABLE])),
+)
+
+
+@admin.register(LLMCall)
+class LLMCallAdmin(admin.ModelAdmin):
+    """Call log with usage totals by endpoint, user and AI character of the filtered calls."""
+    list_display = (
+        "created_at", "endpoint", "model", "user", "ai_character", "status",
+        "prompt_tokens", "completion_tokens", "cost", "latency_ms", "first_token_ms", "attempts",
+    )
+    list_filter = ("endpoint", "model", "status", "created_at")
+    search_fields = ("user__email", "ai_character__name", "error")
+    date_hierarchy = "created_at"
+    list_select_related = ("user", "ai_character")
+    raw_id_fields = ("user", "ai_character")
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        try:
+            queryset = response.context_data["cl"].queryset
+        except (AttributeError, KeyError):  # redirects and error pages
+            return response
+
+        response.context_data["usage_summaries"] = [
+            (title, self.summarize(queryset, group))
+            for title, group in (
+                ("Endpoint", "endpoint"),
+                ("User", "user__email"),
+                ("AI character", "ai_character__name"),
+            )
+        ]
+        return response
+
+    def summarize(self, queryset, group):
+        return list(
+            queryset.order_by()
+            .values(group_name=F(group))
+            .annotate(**SUMMARY_TOTALS)
+            .order_by("-calls")[:SUMMARY_ROWS]
+        )
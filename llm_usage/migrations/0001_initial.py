@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('characters', '0003_chat_messages_keyset_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMCall',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endpoint', models.CharField(max_length=50)),
+                ('model', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('ok', 'OK'), ('invalid_output', 'Invalid output'), ('error', 'Error'), ('unavailable', 'Circuit open')], default='ok', max_length=20)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('prompt_tokens', models.PositiveIntegerField(default=0)),
+                ('completion_tokens', models.PositiveIntegerField(default=0)),
+                ('cost', models.DecimalField(blank=True, decimal_places=6, max_digits=12, null=True)),
+                ('latency_ms', models.PositiveIntegerField(default=0)),
+                ('first_token_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=1)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('ai_character', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='llm_calls', to='characters.aicharacter')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='llm_calls', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'LLM Call',
+                'verbose_name_plural': 'LLM Calls',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['created_at'], name='llm_call_created_idx'), models.Index(fields=['endpoint', 'created_at'], name='llm_call_endpoint_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+from django.db import models
+from django.utils import timezone
+from accounts.models import MyUsers
+from characters.models import AICharacter
+
+# models here..
+
+class LLMCall(models.Model):
+    """One call through the LLM gateway (utils.llm): tokens, cost, latency and outcome."""
+    STATUS_OK = "ok"
+    STATUS_INVALID_OUTPUT = "invalid_output"
+    STATUS_ERROR = "error"
+    STATUS_UNAVAILABLE = "unavailable"
+
+    STATUS_CHOICES = [
+        (STATUS_OK, "OK"),
+        (STATUS_INVALID_OUTPUT, "Invalid output"),  # reply didn't match the expected schema
+        (STATUS_ERROR, "Error"),
+        (STATUS_UNAVAILABLE, "Circuit open"),
+    ]
+
+    endpoint = models.CharField(max_length=50)  # utils.llm.ENDPOINTS key
+    model = models.CharField(max_length=100)
+    user = models.ForeignKey(MyUsers, on_delete=models.SET_NULL, null=True, blank=True, related_name="llm_calls")
+    ai_character = models.ForeignKey(AICharacter, on_delete=models.SET_NULL, null=True, blank=True, related_name="llm_calls")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_OK)
+    error = models.CharField(max_length=255, blank=True)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+    cost = models.DecimalField(max_digits=12, decimal_places=6, null=True, blank=True)  # USD, empty for unpriced models
+    latency_ms = models.PositiveIntegerField(default=0)  # whole call including retries (whole stream for streams)
+    first_token_ms = models.PositiveIntegerField(null=True, blank=True)  # streams only
+    attempts = models.PositiveSmallIntegerField(default=1)
+    created_at = models.DateTimeField(default=timezone.now)  # when the call was made, rows are written later in batches
+
+    class Meta:
+        verbose_name = "LLM Call"
+        verbose_name_plural = "LLM Calls"
+        ordering = ["-created_at"]
+        indexes = [
+            # admin: newest first, aggregates over a date range
+            models.Index(fields=["created_at"], name="llm_call_created_idx"),
+            models.Index(fields=["endpoint", "created_at"], name="llm_call_endpoint_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.endpoint} ({self.model}) {self.status}"
@@ -0,0 +1,150 @@
+"""
+Recording of LLM gateway calls as LLMCall rows.
+
+utils.llm calls record_call() once per call. Rows are buffered in memory and
+written with one bulk INSERT every LLM_USAGE_FLUSH_INTERVAL seconds (sooner
+once FLUSH_SIZE rows are waiting) by a background thread, so recording adds
+no query to the request. Rows still buffered when a process exits are lost:
+management commands that call the LLM flush() after each pass.
+
+With LLM_USAGE_BUFFERED off every call is written as it is recorded, which
+the test runner does, a buffered row could outlive the test database.
+"""
+import asyncio
+import logging
+import threading
+from decimal import Decimal
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SIZE = 200
+
+# USD per 1M tokens (prompt, completion), update with OpenAI's price list
+MODEL_PRICES = {
+    "gpt-4o-mini": (Decimal("0.15"), Decimal("0.60")),
+    "gpt-4o": (Decimal("2.50"), Decimal("10.00")),
+    "gpt-4.1-mini": (Decimal("0.40"), Decimal("1.60")),
+    "gpt-4.1": (Decimal("2.00"), Decimal("8.00")),
+    "text-embedding-3-small": (Decimal("0.02"), Decimal("0")),
+    "text-embedding-3-large": (Decimal("0.13"), Decimal("0")),
+}
+
+_buffer = []
+_buffer_lock = threading.Lock()
+_flusher_thread = None
+_wakeup = threading.Event()
+
+
+def recording_enabled():
+    return getattr(settings, "LLM_USAGE_RECORDING", True)
+
+
+def buffering_enabled():
+    return getattr(settings, "LLM_USAGE_BUFFERED", True)
+
+
+def flush_interval():
+    return getattr(settings, "LLM_USAGE_FLUSH_INTERVAL", 5)
+
+
+def call_cost(model, prompt_tokens, completion_tokens):
+    """USD cost of a call, None for a model without a known price."""
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    cost = (prices[0] * prompt_tokens + prices[1] * completion_tokens) / 1_000_000
+    return cost.quantize(Decimal("0.000001"))
+
+
+def record_call(endpoint, model, status, latency_ms, prompt_tokens=0, completion_tokens=0,
+                user=None, ai_character=None, error="", attempts=1, first_token_ms=None):
+    """Buffer one gateway call. user and ai_character are instances or ids."""
+    if not recording_enabled():
+        return
+
+    row = {
+        "endpoint": endpoint,
+        "model": model,
+        "user_id": getattr(user, "pk", user),
+        "ai_character_id": getattr(ai_character, "pk", ai_character),
+        "status": status,
+        "error": error[:255],
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cost": call_cost(model, prompt_tokens, completion_tokens),
+        "latency_ms": round(latency_ms),
+        "first_token_ms": round(first_token_ms) if first_token_ms is not None else None,
+        "attempts": attempts,
+        "created_at": timezone.now(),
+    }
+
+    if not buffering_enabled():
+        if on_event_loop():
+            # no queries on the event loop's thread, write from another one
+            thread = threading.Thread(target=_write_in_thread, args=(row,))
+            thread.start()
+            thread.join()
+        else:
+            write(row)
+        return
+
+    global _flusher_thread
+    with _buffer_lock:
+        _buffer.append(row)
+        if len(_buffer) >= FLUSH_SIZE:
+            _wakeup.set()
+        if _flusher_thread is None:
+            _flusher_thread = threading.Thread(target=_flush_in_background, daemon=True)
+            _flusher_thread.start()
+
+
+def write(row):
+    from llm_usage.models import LLMCall
+
+    try:
+        LLMCall.objects.create(**row)
+    except Exception:
+        logger.exception("writing an LLM usage record failed")
+
+
+def _write_in_thread(row):
+    try:
+        write(row)
+    finally:
+        connection.close()  # this thread's own DB connection
+
+
+def on_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def flush():
+    """Write the buffered calls, returns how many."""
+    with _buffer_lock:
+        rows = _buffer[:]
+        _buffer.clear()
+    if rows:
+        from llm_usage.models import LLMCall
+
+        LLMCall.objects.bulk_create([LLMCall(**row) for row in rows], batch_size=FLUSH_SIZE)
+    return len(rows)
+
+
+def _flush_in_background():
+    while True:
+        _wakeup.wait(timeout=flush_interval())
+        _wakeup.clear()
+        try:
+            flush()
+        except Exception:
+            logger.exception("writing LLM usage records failed")
+        finally:
+            connection.close()  # this thread's own DB connection
+
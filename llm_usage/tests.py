@@ -0,0 +1,63 @@
+import asyncio
+from decimal import Decimal
+from unittest import mock
+from django.test import TestCase, TransactionTestCase, override_settings
+from llm_usage import recorder
+from llm_usage.models import LLMCall
+from llm_usage.recorder import call_cost, flush, record_call
+
+
+class RecordCallTests(TestCase):
+
+    def test_written_as_recorded_in_tests(self):
+        record_call("answer_review", "gpt-4o-mini", LLMCall.STATUS_OK, 812.4, prompt_tokens=1000, completion_tokens=500)
+
+        call = LLMCall.objects.get()
+        self.assertEqual((call.endpoint, call.model, call.status), ("answer_review", "gpt-4o-mini", "ok"))
+        self.assertEqual((call.prompt_tokens, call.completion_tokens, call.latency_ms), (1000, 500, 812))
+        self.assertEqual(call.cost, Decimal("0.000450"))
+        self.assertEqual(recorder._buffer, [])
+
+    def test_error_is_truncated(self):
+        record_call("question", "gpt-4o-mini", LLMCall.STATUS_ERROR, 10, error="x" * 1000)
+        self.assertEqual(len(LLMCall.objects.get().error), 255)
+
+    def test_error_is_logged_not_raised(self):
+        with mock.patch.object(LLMCall.objects, "create", side_effect=RuntimeError("database is down")):
+            with self.assertLogs("llm_usage.recorder", "ERROR"):
+                record_call("question", "gpt-4o-mini", LLMCall.STATUS_OK, 10)
+
+    @override_settings(LLM_USAGE_RECORDING=False)
+    def test_recording_off(self):
+        record_call("question", "gpt-4o-mini", LLMCall.STATUS_OK, 10)
+        self.assertFalse(LLMCall.objects.exists())
+
+    @override_settings(LLM_USAGE_BUFFERED=True)
+    def test_buffered_until_flush(self):
+        self.addCleanup(recorder._buffer.clear)
+        # no background flusher, the test flushes
+        with mock.patch.object(recorder, "_flusher_thread", object()):
+            record_call("question", "gpt-4o-mini", LLMCall.STATUS_OK, 10, user=None)
+            record_call("chat_reply", "unknown-model", LLMCall.STATUS_OK, 20, prompt_tokens=5)
+
+        self.assertFalse(LLMCall.objects.exists())
+        self.assertEqual(flush(), 2)
+        self.assertEqual(
+            sorted(LLMCall.objects.values_list("endpoint", "cost")),
+            [("chat_reply", None), ("question", Decimal("0"))],
+        )
+        self.assertEqual(flush(), 0)
+
+    def test_call_cost(self):
+        self.assertEqual(call_cost("gpt-4o", 1_000_000, 1_000_000), Decimal("12.500000"))
+        self.assertIsNone(call_cost("unknown-model", 10, 10))
+
+
+class RecordCallAsyncTests(TransactionTestCase):
+
+    def test_written_from_the_event_loop(self):
+        async def call():
+            record_call("chat_stream", "gpt-4o-mini", LLMCall.STATUS_OK, 10, first_token_ms=3.2)
+
+        asyncio.run(call())
+        self.assertEqual(LLMCall.objects.get().first_token_ms, 3)
@@ -0,0 +1,100 @@
+import json
+import math
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.settings import api_settings
+from accounts.authentication import aget_cached_user, check_user, token_user_id
+from utils.response import json_response_data
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncAPIView(View):
+    """
+    Minimal async counterpart of DRF's APIView for ASGI deployments.
+
+    DRF views are sync only, so async endpoints are plain Django views that:
+    - authenticate the JWT bearer token (same tokens as the DRF views)
+    - apply throttle_classes, DRF's DEFAULT_THROTTLE_CLASSES unless overridden
+    - parse the JSON body into request.data
+    - return json_response_data() responses
+
+    Set authentication_required = True to reject anonymous requests.
+    Handlers must be declared with `async def`.
+    """
+    authentication_required = False
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            user = await self.authenticate(request)
+        except (InvalidToken, TokenError) as e:
+            return json_response_data(
+                success=False,
+                message="Invalid or expired token",
+                status_code=401,
+                error=str(e)
+            )
+
+        request.user = user or AnonymousUser()
+        if self.authentication_required and not request.user.is_authenticated:
+            return json_response_data(
+                success=False,
+                message="Authentication credentials were not provided.",
+                status_code=401
+            )
+
+        wait = await self.check_throttles(request)
+        if wait is not None:
+            response = json_response_data(
+                success=False,
+                message=f"Request was throttled. Expected available in {math.ceil(wait)} seconds.",
+                status_code=429
+            )
+            response["Retry-After"] = str(math.ceil(wait))
+            return response
+
+        try:
+            if request.content_type == "application/json":
+                request.data = json.loads(request.body or b"{}")
+            else:
+                request.data = request.POST.dict()
+        except ValueError:
+            return json_response_data(success=False, message="Invalid JSON body", status_code=400)
+
+        return await super().dispatch(request, *args, **kwargs)
+
+    def get_throttles(self):
+        return [throttle() for throttle in self.throttle_classes]
+
+    async def check_throttles(self, request):
+        """Seconds until the request would be allowed, None when no throttle rejects it."""
+        waits = []
+        for throttle in self.get_throttles():
+            # the throttles count in the cache, which is sync only
+            if not await sync_to_async(throttle.allow_request)(request, self):
+                waits.append(throttle.wait() or 0)
+        return max(waits) if waits else None
+
+    async def authenticate(self, request):
+        """Return the user for the bearer token, None when no token was sent."""
+        authenticator = JWTAuthentication()
+        header = authenticator.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = authenticator.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = authenticator.get_validated_token(raw_token)
+        user = await aget_cached_user(token_user_id(validated_token))  # with its profile, chat prompts read it
+        try:
+            return check_user(user, validated_token)
+        except AuthenticationFailed as e:
+            raise InvalidToken(e.detail)
@@ -0,0 +1,162 @@
+"""
+Versioned response cache for the catalog endpoints (categories, topics, AI characters).
+
+Every cache key embeds the current catalog version. Saving or deleting a
+LearningCategory, LearningTopic or AICharacter bumps the version (see the
+apps' signals.py), which makes all cached catalog responses unreachable at once
+instead of deleting keys one by one.
+
+Responses are kept in the shared Django cache and in a small in-process LRU in
+front of it, and carry an ETag so clients can revalidate with If-None-Match.
+Without REDIS_URL the cache, and so the version, is per process: a save in one
+process would never invalidate another's entries, so nothing is cached and
+every response (and its ETag) is built fresh.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from utils.metrics import cache_is_shared
+
+VERSION_KEY = "catalog:version"
+LOCAL_MAX_ENTRIES = 512
+
+_local = OrderedDict()  # key -> (expires_at, payload)
+_local_lock = threading.Lock()
+
+
+def cache_ttl():
+    return getattr(settings, "CATALOG_CACHE_TTL", 60 * 60)
+
+
+def get_catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # start from a timestamp so a lost version key can't bring back old entries
+        cache.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_catalog_version(**kwargs):
+    """Invalidate every cached catalog response. Usable directly as a signal receiver."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:  # no version yet, nothing cached under it
+        cache.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+
+    with _local_lock:
+        _local.clear()
+
+
+def catalog_key(name, params=None):
+    raw = json.dumps([name, sorted((params or {}).items())])
+    return f"catalog:{get_catalog_version()}:{hashlib.md5(raw.encode()).hexdigest()}"
+
+
+def compute_etag(data):
+    body = json.dumps(data, cls=JSONEncoder, sort_keys=True)
+    return f'"{hashlib.md5(body.encode()).hexdigest()}"'
+
+
+def _local_get(key):
+    with _local_lock:
+        item = _local.get(key)
+        if item is None:
+            return None
+        if item[0] < time.monotonic():
+            del _local[key]
+            return None
+        _local.move_to_end(key)
+        return item[1]
+
+
+def _local_set(key, payload):
+    with _local_lock:
+        _local[key] = (time.monotonic() + cache_ttl(), payload)
+        _local.move_to_end(key)
+        while len(_local) > LOCAL_MAX_ENTRIES:
+            _local.popitem(last=False)
+
+
+def lookup(key):
+    payload = _local_get(key)
+    if payload is None:
+        payload = cache.get(key)
+        if payload is not None:
+            _local_set(key, payload)
+    return payload
+
+
+def store(key, data):
+    """Store response data as plain JSON together with its ETag: {"data": ..., "etag": ...}."""
+    payload = build_payload(data)
+    cache.set(key, payload, timeout=cache_ttl())
+    _local_set(key, payload)
+    return payload
+
+
+def build_payload(data):
+    data = json.loads(json.dumps(data, cls=JSONEncoder))
+    return {"data": data, "etag": compute_etag(data)}
+
+
+def get_or_build(name, params, builder):
+    """Return the cached payload for (name, params), calling builder() for the data on a miss."""
+    if not cache_is_shared():
+        return build_payload(builder())
+    key = catalog_key(name, params)
+    return lookup(key) or store(key, builder())
+
+
+def etag_matches(request, etag):
+    if_none_match = request.headers.get("If-None-Match", "")
+    return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+
+
+def not_modified(etag):
+    return Response(status=304, headers={"ETag": etag})
+
+
+def with_etag(request, response):
+    """Add an ETag to a response, or answer 304 when the client already has it."""
+    etag = compute_etag(response.data)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response["ETag"] = etag
+    return response
+
+
+def cache_catalog_response(name):
+    """
+    Cache a catalog APIView.get per URL kwargs and query params.
+    Only successful (200) responses are cached.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if not cache_is_shared():
+                response = view_method(self, request, *args, **kwargs)
+                return with_etag(request, response) if response.status_code == 200 else response
+
+            key = catalog_key(name, {**kwargs, **request.query_params.dict()})
+
+            payload = lookup(key)
+            if payload is None:
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                payload = store(key, response.data)
+
+            if etag_matches(request, payload["etag"]):
+                return not_modified(payload["etag"])
+            return Response(payload["data"], headers={"ETag": payload["etag"]})
+
+        return wrapper
+    return decorator
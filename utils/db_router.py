@@ -0,0 +1,56 @@
+"""
+Primary/replica database routing.
+
+Every query goes to the primary ("default") unless it runs inside a view
+marked with @read_from_replica. Those read-only endpoints (history, chat
+listing, catalogs) read from one of the replicas configured with
+POSTGRES_REPLICA_HOSTS. Without replicas everything stays on the primary.
+
+Replicas lag slightly behind the primary, so only mark endpoints that can
+tolerate reading a just-written row a moment late.
+"""
+import random
+from contextvars import ContextVar
+from functools import wraps
+from django.conf import settings
+
+PRIMARY = "default"
+
+_use_replica = ContextVar("use_replica", default=False)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith("replica")]
+
+
+def read_from_replica(view_method):
+    """Send the reads of a view method to a replica."""
+    @wraps(view_method)
+    def wrapper(*args, **kwargs):
+        token = _use_replica.set(True)
+        try:
+            return view_method(*args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get():
+            replicas = replica_aliases()
+            if replicas:
+                return random.choice(replicas)
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get the schema through replication
+        return db == PRIMARY
@@ -0,0 +1,574 @@
+"""
+Gateway for all OpenAI calls.
+
+- One long-lived client per process (and one AsyncOpenAI client per event
+  loop), so HTTP connections are pooled and reused across requests.
+- Every call belongs to an endpoint in ENDPOINTS, which sets its timeout and
+  default max_tokens. A stalled upstream fails the call instead of holding
+  the worker.
+- Connection errors, timeouts, 429s and 5xx responses are retried with
+  jittered exponential backoff, up to LLM_MAX_RETRIES times per call and
+  within a retry budget shared by the process, so retries can't multiply the
+  load on an upstream that is already failing.
+- After LLM_CIRCUIT_FAILURES upstream failures in a row the circuit opens:
+  calls fail fast with LLMUnavailableError, and one trial call is let through
+  every LLM_CIRCUIT_RESET seconds until one succeeds.
+
+The model is the AIModels row picked by the request (see learn.ai_models),
+LLM_DEFAULT_MODEL otherwise.
+"""
+import asyncio
+import json
+import logging
+import random
+import re
+import threading
+import time
+import weakref
+import openai
+from django.conf import settings
+from llm_usage.models import LLMCall
+from llm_usage.recorder import record_call
+from utils.metrics import get_counters, incr_counter
+from utils.profiling import add_span
+
+logger = logging.getLogger(__name__)
+
+ENDPOINTS = {
+    # timeout in seconds (between chunks for streams), default max_tokens
+    "question": {"timeout": 15, "max_tokens": 150},
+    "question_batch": {"timeout": 45, "max_tokens": 800},
+    "answer_review": {"timeout": 20, "max_tokens": 300},
+    "chat_reply": {"timeout": 30, "max_tokens": 400},
+    "chat_stream": {"timeout": 20, "max_tokens": 400},
+    "memory_compaction": {"timeout": 30, "max_tokens": 300},
+    "embedding": {"timeout": 10},
+}
+DEFAULT_ENDPOINT = {"timeout": 30, "max_tokens": 400}
+
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8
+
+# APITimeoutError is an APIConnectionError
+RETRYABLE_ERRORS = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+# errors that say the upstream itself is unhealthy, counted by the circuit breaker
+UPSTREAM_ERRORS = (openai.APIConnectionError, openai.InternalServerError)
+
+METRIC_KEYS = ("requests", "retries", "retry_budget_exhausted", "short_circuited")
+
+
+class LLMUnavailableError(Exception):
+    """The circuit is open, the LLM upstream has been failing and isn't called for now."""
+
+
+def default_model():
+    return getattr(settings, "LLM_DEFAULT_MODEL", "gpt-4o-mini")
+
+
+def connect_timeout():
+    return getattr(settings, "LLM_CONNECT_TIMEOUT", 5)
+
+
+def max_retries():
+    return getattr(settings, "LLM_MAX_RETRIES", 2)
+
+
+def backoff_delay(attempt):
+    """Full jitter: uniform between 0 and base, 2x base, 4x base... capped."""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempt - 1)))
+
+
+# --- clients ---
+
+_client = None
+_client_lock = threading.Lock()
+
+# one AsyncOpenAI client per event loop, its connection pool can't be shared across loops
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def client_options():
+    # retries are done by the gateway, within the retry budget
+    return {
+        "api_key": settings.OPENAI_API_KEY,
+        "base_url": getattr(settings, "OPENAI_BASE_URL", None),
+        "max_retries": 0,
+        "timeout": openai.Timeout(DEFAULT_ENDPOINT["timeout"], connect=connect_timeout()),
+    }
+
+
+def get_openai_client():
+    """Return the process wide OpenAI client, created on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = openai.OpenAI(**client_options())
+    return _client
+
+
+def get_async_openai_client():
+    """
+    Return the AsyncOpenAI client for the running event loop.
+    Under ASGI there is a single long-lived loop, so the client and its
+    HTTP connection pool are reused across requests.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = openai.AsyncOpenAI(**client_options())
+        _async_clients[loop] = client
+    return client
+
+
+# --- retry budget and circuit breaker ---
+
+class RetryBudget:
+    """
+    Token bucket shared by all calls of the process: every call deposits
+    `ratio` tokens and every retry takes one, so over time retries stay below
+    `ratio` of the calls. Starts (and is capped) at `reserve` tokens.
+    """
+
+    def __init__(self, ratio, reserve):
+        self.ratio = ratio
+        self.reserve = reserve
+        self.tokens = float(reserve)
+        self.lock = threading.Lock()
+
+    def deposit(self):
+        with self.lock:
+            self.tokens = min(self.tokens + self.ratio, self.reserve)
+
+    def withdraw(self):
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` upstream failures in a row. While open,
+    one trial call is allowed every `reset_seconds`; a success closes it again.
+    """
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.failures >= self.failure_threshold
+
+    def allow(self):
+        with self.lock:
+            if not self.is_open:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at >= self.reset_seconds:
+                self.opened_at = now  # let this trial call through, hold the others back
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            if self.is_open:
+                logger.info("LLM circuit closed")
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures == self.failure_threshold:
+                logger.error("LLM circuit opened after %s failures in a row", self.failures)
+            if self.is_open:
+                self.opened_at = time.monotonic()
+
+
+_retry_budget = None
+_circuit_breaker = None
+_guard_lock = threading.Lock()
+
+
+def get_retry_budget():
+    global _retry_budget
+    with _guard_lock:
+        if _retry_budget is None:
+            _retry_budget = RetryBudget(
+                ratio=getattr(settings, "LLM_RETRY_BUDGET_RATIO", 0.2),
+                reserve=getattr(settings, "LLM_RETRY_BUDGET_RESERVE", 10),
+            )
+    return _retry_budget
+
+
+def get_circuit_breaker():
+    global _circuit_breaker
+    with _guard_lock:
+        if _circuit_breaker is None:
+            _circuit_breaker = CircuitBreaker(
+                failure_threshold=getattr(settings, "LLM_CIRCUIT_FAILURES", 5),
+                reset_seconds=getattr(settings, "LLM_CIRCUIT_RESET", 30),
+            )
+    return _circuit_breaker
+
+
+def get_llm_metrics():
+    metrics = get_counters("llm", METRIC_KEYS)
+    metrics["circuit_open"] = get_circuit_breaker().is_open
+    return metrics
+
+
+# --- calls ---
+
+def request_options(endpoint, **kwargs):
+    """kwargs of an API call with the endpoint's timeout and default max_tokens filled in."""
+    config = ENDPOINTS.get(endpoint, DEFAULT_ENDPOINT)
+    kwargs.setdefault("timeout", openai.Timeout(config["timeout"], connect=connect_timeout()))
+    if "max_tokens" in config:
+        kwargs.setdefault("max_tokens", config["max_tokens"])
+    return kwargs
+
+
+def start_call():
+    if not get_circuit_breaker().allow():
+        incr_counter("llm:short_circuited")
+        raise LLMUnavailableError("The AI service is unavailable right now, please try again shortly")
+    get_retry_budget().deposit()
+    incr_counter("llm:requests")
+
+
+def retry_delay_after(error, endpoint, attempt):
+    """
+    Record a failed attempt. Returns the backoff before retrying it, None when
+    the error isn't retryable or no retry is left (attempts, budget, circuit).
+    """
+    breaker = get_circuit_breaker()
+    if not isinstance(error, RETRYABLE_ERRORS):
+        if isinstance(error, openai.APIStatusError):
+            breaker.record_success()  # the upstream answered, the request was bad
+        return None
+
+    if isinstance(error, UPSTREAM_ERRORS):
+        breaker.record_failure()
+    if attempt > max_retries() or not breaker.allow():
+        return None
+    if not get_retry_budget().withdraw():
+        incr_counter("llm:retry_budget_exhausted")
+        return None
+
+    incr_counter("llm:retries")
+    logger.warning("%s call failed (attempt %s), retrying: %s", endpoint, attempt, error)
+    return backoff_delay(attempt)
+
+
+class CallRecord:
+    """Measures one gateway call and hands it to llm_usage when the call ends."""
+
+    def __init__(self, endpoint, model, user=None, ai_character=None):
+        self.endpoint = endpoint
+        self.model = model or ""
+        self.user = user
+        self.ai_character = ai_character
+        self.started = time.perf_counter()
+        self.attempts = 0
+        self.usage = None
+        self.first_token_ms = None
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def finish(self, status, error=None):
+        latency_ms = self.elapsed_ms()
+        add_span("llm", latency_ms)
+        record_call(
+            self.endpoint,
+            self.model,
+            status,
+            latency_ms,
+            prompt_tokens=getattr(self.usage, "prompt_tokens", 0) or 0,
+            completion_tokens=getattr(self.usage, "completion_tokens", 0) or 0,
+            user=self.user,
+            ai_character=self.ai_character,
+            error=f"{type(error).__name__}: {error}" if error else "",
+            attempts=max(self.attempts, 1),
+            first_token_ms=self.first_token_ms,
+        )
+
+    def complete(self, result, stream=False, parse=None):
+        """Record a successful API call, returns its result (parsed with `parse` when given)."""
+        if stream:
+            return RecordedStream(result, self)
+
+        self.usage = getattr(result, "usage", None)
+        if parse is None:
+            self.finish(LLMCall.STATUS_OK)
+            return result
+        try:
+            value = parse(result)
+        except StructuredOutputError as e:
+            self.finish(LLMCall.STATUS_INVALID_OUTPUT, e)
+            raise
+        self.finish(LLMCall.STATUS_OK)
+        return value
+
+
+class RecordedStream:
+    """
+    A streamed completion, iterated like the stream it wraps. The call is
+    recorded when the stream ends, with the usage of its last chunk.
+    """
+
+    def __init__(self, stream, record):
+        self.stream = stream
+        self.record = record
+
+    def observe(self, chunk):
+        if self.record.first_token_ms is None and chunk.choices:
+            self.record.first_token_ms = self.record.elapsed_ms()
+        if getattr(chunk, "usage", None):
+            self.record.usage = chunk.usage
+
+    def __iter__(self):
+        error = None
+        try:
+            for chunk in self.stream:
+                self.observe(chunk)
+                yield chunk
+        except BaseException as e:  # GeneratorExit when the client went away
+            error = e
+            raise
+        finally:
+            self.record.finish(LLMCall.STATUS_ERROR if error else LLMCall.STATUS_OK, error)
+
+    async def __aiter__(self):
+        error = None
+        try:
+            async for chunk in self.stream:
+                self.observe(chunk)
+                yield chunk
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.record.finish(LLMCall.STATUS_ERROR if error else LLMCall.STATUS_OK, error)
+
+
+def call(create, endpoint, parse=None, user=None, ai_character=None, **kwargs):
+    """
+    Run an API call through the circuit breaker, with timeout and retries, and
+    record it (tokens, latency, outcome) for llm_usage. `parse` turns the
+    response into the returned value, a StructuredOutputError it raises is
+    recorded as invalid output. user and ai_character attribute the call.
+    """
+    record = CallRecord(endpoint, kwargs.get("model"), user, ai_character)
+    try:
+        start_call()
+    except LLMUnavailableError as e:
+        record.finish(LLMCall.STATUS_UNAVAILABLE, e)
+        raise
+
+    kwargs = request_options(endpoint, **kwargs)
+    while True:
+        record.attempts += 1
+        try:
+            result = create(**kwargs)
+        except Exception as e:
+            delay = retry_delay_after(e, endpoint, record.attempts)
+            if delay is None:
+                record.finish(LLMCall.STATUS_ERROR, e)
+                raise
+            time.sleep(delay)
+        else:
+            get_circuit_breaker().record_success()
+            return record.complete(result, kwargs.get("stream"), parse)
+
+
+async def acall(create, endpoint, parse=None, user=None, ai_character=None, **kwargs):
+    """Async version of call()."""
+    record = CallRecord(endpoint, kwargs.get("model"), user, ai_character)
+    try:
+        start_call()
+    except LLMUnavailableError as e:
+        record.finish(LLMCall.STATUS_UNAVAILABLE, e)
+        raise
+
+    kwargs = request_options(endpoint, **kwargs)
+    while True:
+        record.attempts += 1
+        try:
+            result = await create(**kwargs)
+        except Exception as e:
+            delay = retry_delay_after(e, endpoint, record.attempts)
+            if delay is None:
+                record.finish(LLMCall.STATUS_ERROR, e)
+                raise
+            await asyncio.sleep(delay)
+        else:
+            get_circuit_breaker().record_success()
+            return record.complete(result, kwargs.get("stream"), parse)
+
+
+def chat_options(messages, model, kwargs):
+    if kwargs.get("stream"):
+        kwargs.setdefault("stream_options", {"include_usage": True})  # token counts in the last chunk
+    return dict(kwargs, model=model or default_model(), messages=messages)
+
+
+def chat_completion(endpoint, messages, model=None, **kwargs):
+    """
+    Chat completion for an endpoint of ENDPOINTS. With stream=True only opening
+    the stream is retried, chunks already sent to the client can't be taken back.
+    """
+    return call(get_openai_client().chat.completions.create, endpoint, **chat_options(messages, model, kwargs))
+
+
+async def achat_completion(endpoint, messages, model=None, **kwargs):
+    """Async version of chat_completion(), on the event loop's AsyncOpenAI client."""
+    return await acall(get_async_openai_client().chat.completions.create, endpoint, **chat_options(messages, model, kwargs))
+
+
+def create_embedding(text, model):
+    response = call(get_openai_client().embeddings.create, "embedding", model=model, input=text)
+    return response.data[0].embedding
+
+
+# --- structured (JSON schema) output ---
+
+class StructuredOutputError(ValueError):
+    """The model's reply doesn't match the expected schema, even after the local repair."""
+
+    def __init__(self, message, content=None):
+        super().__init__(message)
+        self.content = content  # the raw reply, set by parse_structured
+
+
+JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+}
+
+
+def json_schema_format(name, schema):
+    """response_format asking OpenAI for output constrained to `schema` (structured outputs)."""
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": name, "schema": schema, "strict": True},
+    }
+
+
+def repair_json(content):
+    """
+    Cheap local fixes for near-JSON replies before paying for a retry:
+    Markdown code fences, text around the object and trailing commas.
+    """
+    text = re.sub(r"^```(?:json)?|```$", "", content.strip(), flags=re.MULTILINE).strip()
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        text = text[start:end + 1]
+    text = re.sub(r",\s*([}\]])", r"\1", text)
+    return json.loads(text)
+
+
+def validate(data, schema, path="$"):
+    """
+    Check data against the JSON schema subset our schemas use (type, properties,
+    required, items, enum). Numeric strings are coerced for integer/number
+    fields and unknown object keys are dropped. Returns the cleaned data.
+    """
+    expected = schema.get("type")
+
+    if expected in ("integer", "number") and isinstance(data, str):
+        try:
+            data = float(data.strip())
+        except ValueError:
+            pass
+    if expected == "integer" and isinstance(data, float) and data.is_integer():
+        data = int(data)
+
+    if expected and (
+        not isinstance(data, JSON_TYPES[expected])
+        or (isinstance(data, bool) and expected in ("integer", "number"))
+    ):
+        raise StructuredOutputError(f"{path}: expected {expected}, got {type(data).__name__}")
+
+    if "enum" in schema and data not in schema["enum"]:
+        raise StructuredOutputError(f"{path}: {data!r} is not one of {schema['enum']}")
+
+    if expected == "object":
+        missing = [key for key in schema.get("required", []) if key not in data]
+        if missing:
+            raise StructuredOutputError(f"{path}: missing {', '.join(missing)}")
+        properties = schema.get("properties", {})
+        return {
+            key: validate(value, properties[key], f"{path}.{key}")
+            for key, value in data.items() if key in properties
+        }
+
+    if expected == "array":
+        return [validate(item, schema.get("items", {}), f"{path}[{i}]") for i, item in enumerate(data)]
+
+    return data
+
+
+def parse_structured(content, schema):
+    """Parse and validate a model reply, with a local repair pass when it isn't valid JSON."""
+    if not content:
+        raise StructuredOutputError("empty reply", content)
+    try:
+        try:
+            data = json.loads(content)
+        except ValueError:
+            try:
+                data = repair_json(content)
+            except ValueError as e:
+                raise StructuredOutputError(f"reply is not JSON: {e}")
+        return validate(data, schema)
+    except StructuredOutputError as e:
+        e.content = content
+        raise
+
+
+def complete_structured(messages, name, schema, retries=1, model=None, **kwargs):
+    """
+    Chat completion constrained to a JSON schema, returns the validated data.
+    `name` is both the schema name and the gateway endpoint. Only a reply that
+    still fails validation after the local repair costs one of the `retries`
+    extra completions, then StructuredOutputError is raised.
+    """
+    def parse(response):
+        return parse_structured(response.choices[0].message.content, schema)
+
+    for attempt in range(retries + 1):
+        try:
+            return chat_completion(
+                name, messages, model=model, response_format=json_schema_format(name, schema), parse=parse, **kwargs
+            )
+        except StructuredOutputError as e:
+            logger.warning("invalid %s output (attempt %s): %s", name, attempt + 1, e)
+            if attempt == retries:
+                raise
+
+
+async def acomplete_structured(messages, name, schema, retries=1, model=None, **kwargs):
+    """Async version of complete_structured."""
+    def parse(response):
+        return parse_structured(response.choices[0].message.content, schema)
+
+    for attempt in range(retries + 1):
+        try:
+            return await achat_completion(
+                name, messages, model=model, response_format=json_schema_format(name, schema), parse=parse, **kwargs
+            )
+        except StructuredOutputError as e:
+            logger.warning("invalid %s output (attempt %s): %s", name, attempt + 1, e)
+            if attempt == retries:
+                raise
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.cache import cache
+
+# backends whose entries only the current process sees
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def cache_is_shared():
+    """True when every worker process reads and writes the same cache (Redis)."""
+    return settings.CACHES["default"]["BACKEND"] not in PROCESS_LOCAL_CACHES
+
+
+def incr_counter(key, amount=1):
+    """Increment a counter kept in the cache (shared by all workers when the cache is)."""
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, amount)
+    except ValueError:  # evicted between add and incr
+        cache.set(key, amount, timeout=None)
+
+
+def get_counters(prefix, names):
+    """Read the counters `<prefix>:<name>` as a dict."""
+    values = cache.get_many([f"{prefix}:{name}" for name in names])
+    return {name: values.get(f"{prefix}:{name}", 0) for name in names}
+
+
+def hit_rate(hits, total):
+    return round(hits / total, 4) if total else 0.0
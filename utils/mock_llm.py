@@ -0,0 +1,300 @@
+"""
+OpenAI compatible stub server for load tests and local development.
+
+Serves POST /v1/chat/completions (plain, json_schema constrained and streamed)
+and POST /v1/embeddings with simulated latency, token rate and failures, so
+the LLM backed endpoints can be load tested without paying for OpenAI or
+depending on the network:
+
+    python manage.py mock_llm_server --port 8100 --latency-ms 400 --tokens-per-second 60
+    OPENAI_BASE_URL=http://localhost:8100/v1 OPENAI_API_KEY=mock python manage.py runserver
+    python manage.py load_test --concurrency 20 --requests 500
+
+Replies to a json_schema response_format are generated from the schema, so
+they pass the gateway's validation. Embeddings are derived from a hash of the
+input, the same text always gets the same vector.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal")
+EMBEDDING_DIMENSIONS = 256
+REPLY_WORDS = 60
+CHARS_PER_TOKEN = 4
+SUMMARY_MARKER = "<<SUMMARY>>"  # characters.prompts.SUMMARY_MARKER, streamed chat replies end with it
+
+LOREM = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua ut enim ad minim veniam quis nostrud"
+).split()
+
+
+class MockLLMConfig:
+    """
+    latency_ms is the median time to the first token, spread by `jitter` (a
+    fraction of it) according to latency_dist. The reply is then generated at
+    tokens_per_second. error_rate, rate_limit_rate and hang_rate are the
+    fractions of requests answered with a 500, a 429, or no answer for
+    hang_seconds (to exercise client timeouts).
+    """
+
+    def __init__(self, latency_ms=300, latency_dist="lognormal", jitter=0.5, tokens_per_second=50,
+                 error_rate=0.0, rate_limit_rate=0.0, hang_rate=0.0, hang_seconds=120, seed=None):
+        if latency_dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"latency_dist must be one of {', '.join(LATENCY_DISTRIBUTIONS)}")
+        self.latency_ms = latency_ms
+        self.latency_dist = latency_dist
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()  # random.Random isn't safe to share across threads
+
+    def first_token_seconds(self):
+        latency, spread = self.latency_ms, self.latency_ms * self.jitter
+        with self.lock:
+            if self.latency_dist == "uniform":
+                ms = self.random.uniform(latency - spread, latency + spread)
+            elif self.latency_dist == "normal":
+                ms = self.random.gauss(latency, spread)
+            elif self.latency_dist == "lognormal":
+                ms = latency * self.random.lognormvariate(0, self.jitter)
+            else:
+                ms = latency
+        return max(ms, 0) / 1000
+
+    def token_seconds(self, tokens):
+        return tokens / self.tokens_per_second if self.tokens_per_second else 0
+
+    def pick_failure(self):
+        """None, or the failure injected into this request: "error", "rate_limit" or "hang"."""
+        with self.lock:
+            roll = self.random.random()
+        for failure, rate in (("error", self.error_rate), ("rate_limit", self.rate_limit_rate), ("hang", self.hang_rate)):
+            if roll < rate:
+                return failure
+            roll -= rate
+        return None
+
+    def choice(self, values):
+        with self.lock:
+            return self.random.choice(values)
+
+    def randint(self, low, high):
+        with self.lock:
+            return self.random.randint(low, high)
+
+
+# --- fake content ---
+
+def estimate_tokens(text):
+    return -(-len(text or "") // CHARS_PER_TOKEN)
+
+
+def lorem(config, words):
+    return " ".join(config.choice(LOREM) for _ in range(max(words, 1)))
+
+
+def fake_value(schema, config, words):
+    """A value matching a JSON schema (the subset utils.llm.validate checks)."""
+    if "enum" in schema:
+        return config.choice(schema["enum"])
+
+    expected = schema.get("type")
+    if expected == "object":
+        return {key: fake_value(value, config, words) for key, value in schema.get("properties", {}).items()}
+    if expected == "array":
+        return [fake_value(schema.get("items", {}), config, words) for _ in range(config.randint(1, 5))]
+    if expected == "integer":
+        return config.randint(0, 10)
+    if expected == "number":
+        return float(config.randint(0, 100)) / 10
+    if expected == "boolean":
+        return config.randint(0, 1) == 1
+    return lorem(config, words)
+
+
+def reply_content(body, config):
+    max_tokens = body.get("max_tokens") or 400
+    words = min(REPLY_WORDS, max(int(max_tokens * 0.75), 1))
+
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        return json.dumps(fake_value(response_format["json_schema"]["schema"], config, max(words // 4, 1)))
+    if response_format.get("type") == "json_object":
+        return json.dumps({"response": lorem(config, words)})
+
+    content = lorem(config, words)
+    system_prompt = " ".join(
+        str(message.get("content") or "") for message in body.get("messages", []) if message.get("role") == "system"
+    )
+    if SUMMARY_MARKER in system_prompt:
+        content += f"\n{SUMMARY_MARKER} {lorem(config, 8)}"
+    return content
+
+
+def fake_embedding(text):
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "big")
+    rng = random.Random(seed)
+    return [rng.gauss(0, 1) for _ in range(EMBEDDING_DIMENSIONS)]
+
+
+# --- server ---
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+    def log_message(self, format, *args):
+        pass  # one line per request would dominate a load test
+
+    @property
+    def config(self):
+        return self.server.config
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self.send_json(400, {"error": {"message": "invalid JSON body", "type": "invalid_request_error"}})
+
+        path = self.path.split("?")[0].rstrip("/")
+        if path.endswith("/chat/completions"):
+            handler = self.chat_completion
+        elif path.endswith("/embeddings"):
+            handler = self.embeddings
+        else:
+            return self.send_json(404, {"error": {"message": f"unknown path {self.path}", "type": "invalid_request_error"}})
+
+        failure = self.config.pick_failure()
+        self.server.count(failure or "ok")
+        if failure == "hang":
+            time.sleep(self.config.hang_seconds)
+            self.close_connection = True
+            return
+        time.sleep(self.config.first_token_seconds())
+        if failure == "error":
+            return self.send_json(500, {"error": {"message": "mock upstream error", "type": "server_error"}})
+        if failure == "rate_limit":
+            return self.send_json(429, {"error": {"message": "mock rate limit", "type": "rate_limit_exceeded"}}, {"Retry-After": "1"})
+        handler(body)
+
+    def chat_completion(self, body):
+        model = body.get("model", "mock")
+        content = reply_content(body, self.config)
+        prompt_tokens = sum(estimate_tokens(str(message.get("content") or "")) for message in body.get("messages", []))
+        completion_tokens = estimate_tokens(content)
+
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage")
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
+            return self.stream_completion(model, content, usage if include_usage else None)
+
+        time.sleep(self.config.token_seconds(completion_tokens))
+        self.send_json(200, {
+            "id": f"chatcmpl-mock-{self.server.next_id()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+    def stream_completion(self, model, content, usage=None):
+        completion_id = f"chatcmpl-mock-{self.server.next_id()}"
+
+        def chunk(delta, finish_reason=None):
+            return {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        self.write_chunk(chunk({"role": "assistant", "content": ""}))
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            text = word if i == 0 else " " + word
+            time.sleep(self.config.token_seconds(estimate_tokens(text)))
+            self.write_chunk(chunk({"content": text}))
+        self.write_chunk(chunk({}, "stop"))
+        if usage:
+            self.write_chunk(dict(chunk({}), choices=[], usage=usage))
+        self.write_chunk("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def write_chunk(self, data):
+        payload = data if isinstance(data, str) else json.dumps(data)
+        event = f"data: {payload}\n\n".encode()
+        self.wfile.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+        self.wfile.flush()
+
+    def embeddings(self, body):
+        inputs = body.get("input")
+        if not isinstance(inputs, list):
+            inputs = [inputs]
+        tokens = sum(estimate_tokens(str(text)) for text in inputs)
+        self.send_json(200, {
+            "object": "list",
+            "data": [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(str(text))}
+                for i, text in enumerate(inputs)
+            ],
+            "model": body.get("model", "mock"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    def send_json(self, status, data, headers=None):
+        payload = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, MockLLMHandler)
+        self.config = config
+        self.counts = {}
+        self.ids = 0
+        self.stats_lock = threading.Lock()
+
+    def count(self, outcome):
+        with self.stats_lock:
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+
+    def next_id(self):
+        with self.stats_lock:
+            self.ids += 1
+            return self.ids
@@ -1,18 +1,20 @@
 from django.core.cache import cache
-import random
+import secrets
 
 OTP_EXPIRE_MINUTES = 10  # OTP valid for 10 minutes
 
 def generate_otp(email: str) -> str:
     """Generate and store OTP in cache"""
-    otp = str(random.randint(1001, 9999))
+    otp = str(1001 + secrets.randbelow(8999))
     cache.set(f"otp_{email}", otp, timeout=OTP_EXPIRE_MINUTES * 60)
     return otp
 
 def verify_otp(email: str, otp_input: str) -> bool:
     """Check OTP validity"""
     otp = cache.get(f"otp_{email}")
-    if otp and otp == otp_input:
-        cache.delete(f"otp_{email}")  # invalidate after successful verification
-        return True
+    # compared as bytes, compare_digest() rejects str with non-ASCII characters
+    if otp and secrets.compare_digest(otp.encode(), str(otp_input).encode()):
+        # invalidate after successful verification, delete() is atomic so
+        # only one of two concurrent requests with the same OTP succeeds
+        return cache.delete(f"otp_{email}")
     return False
@@ -0,0 +1,73 @@
+import base64
+import json
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+MAX_PAGE_SIZE = 100
+
+
+def page_limit(value, default):
+    """The page size asked for by a `limit` query parameter, clamped to 1..MAX_PAGE_SIZE."""
+    try:
+        limit = int(value or default)
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def page_offset(value):
+    try:
+        return max(int(value or 0), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def encode_cursor(obj):
+    """Opaque cursor pointing at obj's (created_at, id) position."""
+    raw = json.dumps([obj.created_at.isoformat(), obj.pk])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return (created_at, id) from a cursor, raise ValueError when it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created_at = parse_datetime(created_at)
+        if created_at is None or not isinstance(pk, int):
+            raise ValueError
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return created_at, pk
+
+
+def keyset_page_queryset(queryset, position, limit):
+    """The query of a keyset page: the limit + 1 rows after `position`, newest first."""
+    queryset = queryset.order_by("-created_at", "-id")
+    if position:
+        created_at, pk = position
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+    return queryset[:limit + 1]
+
+
+def keyset_paginate(queryset, position, limit):
+    """
+    Newest-first keyset (seek) pagination on (created_at, id).
+
+    Each page is an index range scan starting right after `position`, the
+    decode_cursor() of the client's cursor (None for the first page), so its
+    cost doesn't grow with how deep the client has scrolled, unlike OFFSET.
+    limit is clamped to 1..MAX_PAGE_SIZE.
+    Returns (items, next_cursor); next_cursor is None on the last page.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    # one extra row tells whether there is a next page without a COUNT
+    items = list(keyset_page_queryset(queryset, position, limit))
+    has_more = len(items) > limit
+    items = items[:limit]
+
+    next_cursor = encode_cursor(items[-1]) if has_more else None
+    return items, next_cursor
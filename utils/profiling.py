@@ -0,0 +1,211 @@
+"""
+Request profiling: where a request's time goes.
+
+RequestProfilingMiddleware times every request and splits it into spans:
+- db: every SQL query, through an execute wrapper installed on each new
+  database connection. Queries are also fingerprinted (literals stripped) so
+  the same statement repeated in one request, the N+1 pattern, stands out.
+- llm: calls through the LLM gateway (utils.llm).
+- http: other outbound HTTP, wrapped with span("http") where it happens.
+- render: DRF response rendering (ProfiledJSONRenderer).
+
+Requests slower than PROFILING_SLOW_MS are kept in an in-process ring buffer
+of the last PROFILING_BUFFER_SIZE samples, readable by admins at
+/debug/profiling/slow-requests (utils.profiling_views, per worker process).
+With DEBUG on, every response carries the spans in a Server-Timing header,
+shown by browser dev tools.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger(__name__)
+
+SPANS = ("db", "llm", "http", "render")
+MAX_FINGERPRINTS = 500  # distinct statements tracked per request
+REPEATED_QUERIES_SHOWN = 5
+
+_profile = ContextVar("request_profile", default=None)
+
+_samples = None
+_samples_lock = threading.Lock()
+
+
+def profiling_enabled():
+    return getattr(settings, "PROFILING_ENABLED", True)
+
+
+def slow_ms():
+    return getattr(settings, "PROFILING_SLOW_MS", 500)
+
+
+def get_samples_buffer():
+    global _samples
+    with _samples_lock:
+        if _samples is None:
+            _samples = deque(maxlen=getattr(settings, "PROFILING_BUFFER_SIZE", 100))
+    return _samples
+
+
+def fingerprint(sql):
+    """The statement with its literals replaced, so repeats with other parameters match."""
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+    sql = re.sub(r"\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))*\s*\)", "(...)", sql)
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+class RequestProfile:
+    def __init__(self, request):
+        self.method = request.method
+        self.path = request.path
+        self.started = time.perf_counter()
+        self.spans = {name: [0, 0.0] for name in SPANS}  # name -> [count, ms]
+        self.queries = Counter()
+
+    def add(self, name, ms):
+        span = self.spans.setdefault(name, [0, 0.0])
+        span[0] += 1
+        span[1] += ms
+
+    def add_query(self, sql, ms):
+        self.add("db", ms)
+        key = fingerprint(sql)
+        if key in self.queries or len(self.queries) < MAX_FINGERPRINTS:
+            self.queries[key] += 1
+
+    def repeated_queries(self):
+        return [
+            {"count": count, "sql": sql}
+            for sql, count in self.queries.most_common(REPEATED_QUERIES_SHOWN) if count > 1
+        ]
+
+    def summary(self, status_code):
+        return {
+            "method": self.method,
+            "path": self.path,
+            "status": status_code,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "spans": {name: {"count": count, "ms": round(ms, 1)} for name, (count, ms) in self.spans.items()},
+            "repeated_queries": self.repeated_queries(),
+            "at": time.time(),
+        }
+
+
+def add_span(name, ms):
+    """Add time to a span of the current request, no-op outside of one."""
+    profile = _profile.get()
+    if profile is not None:
+        profile.add(name, ms)
+
+
+@contextmanager
+def span(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_span(name, (time.perf_counter() - started) * 1000)
+
+
+# --- hooks ---
+
+def profile_query(execute, sql, params, many, context):
+    profile = _profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add_query(sql, (time.perf_counter() - started) * 1000)
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    if profile_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(profile_query)
+
+
+connection_created.connect(install_query_wrapper)
+
+
+class ProfiledJSONRenderer(JSONRenderer):
+    """JSONRenderer that times rendering as the request's render span."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with span("render"):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+# --- middleware ---
+
+class RequestProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not profiling_enabled():
+            return self.get_response(request)
+
+        profile = RequestProfile(request)
+        token = _profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _profile.reset(token)
+        return self.finish(profile, response)
+
+    async def __acall__(self, request):
+        if not profiling_enabled():
+            return await self.get_response(request)
+
+        profile = RequestProfile(request)
+        token = _profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _profile.reset(token)
+        return self.finish(profile, response)
+
+    def finish(self, profile, response):
+        # streamed bodies are generated after this point, only their setup is measured
+        summary = profile.summary(response.status_code)
+        summary["streaming"] = response.streaming
+
+        if summary["total_ms"] >= slow_ms():
+            get_samples_buffer().append(summary)
+            logger.warning(
+                "slow request %s %s: %sms, %s queries in %sms, llm %sms",
+                profile.method, profile.path, summary["total_ms"],
+                summary["spans"]["db"]["count"], summary["spans"]["db"]["ms"], summary["spans"]["llm"]["ms"]
+            )
+
+        if settings.DEBUG:
+            response["Server-Timing"] = server_timing(summary)
+        return response
+
+
+def server_timing(summary):
+    metrics = [
+        f'{name};dur={values["ms"]};desc="{values["count"]} {name} calls"'
+        for name, values in summary["spans"].items() if values["count"]
+    ]
+    metrics.append(f"total;dur={summary['total_ms']}")
+    return ", ".join(metrics)
+
@@ -0,0 +1,19 @@
+from rest_framework.permissions import IsAdminUser
+from rest_framework.views import APIView
+from utils.pagination import page_limit
+from utils.profiling import get_samples_buffer, slow_ms
+from utils.response import response_data
+
+
+class SlowRequestsView(APIView):
+    """Slowest recent requests of this worker process, admins only. ?limit=<n> (default 20)."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        limit = page_limit(request.query_params.get("limit"), 20)
+        samples = sorted(list(get_samples_buffer()), key=lambda sample: sample["total_ms"], reverse=True)
+        return response_data(success=True, data={
+            "slow_ms": slow_ms(),
+            "count": len(samples),
+            "samples": samples[:limit],
+        })
@@ -1,3 +1,4 @@
+from django.http import JsonResponse
 from rest_framework.response import Response
 
 def response_data(success=True, message="", data=None, status_code=200, error=None):
@@ -18,3 +19,20 @@ def response_data(success=True, message="", data=None, status_code=200, error=No
         response["error"] = error
 
     return Response(response, status=status_code)
+
+
+def json_response_data(success=True, message="", data=None, status_code=200, error=None):
+    """
+    Same response format as response_data, for plain Django (async) views
+    that don't go through DRF rendering.
+    """
+    response = {
+        "success": success,
+        "message": message,
+        "data": data if data is not None else {},
+    }
+
+    if error:  # Only include when provided
+        response["error"] = error
+
+    return JsonResponse(response, status=status_code)
@@ -0,0 +1,22 @@
+import json
+from django.http import StreamingHttpResponse
+
+
+def sse_event(event, data):
+    """
+    Format a single Server-Sent Event.
+    event: event name (e.g. "token", "done", "error")
+    data: JSON serializable payload
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def sse_response(events):
+    """
+    Wrap an iterator (or async iterator) of sse_event() strings in a streaming response.
+    Disables proxy buffering so tokens reach the client as soon as they are yielded.
+    """
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    DiscoverRunner with the settings of a test run: LLM usage rows are written
+    as they are recorded, a buffered row would be flushed after the test
+    database is gone.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.LLM_USAGE_BUFFERED = False
@@ -0,0 +1,69 @@
+"""
+Rate throttles backed by atomic cache counters.
+
+DRF's throttles keep a list of request timestamps per client and rewrite it
+with get() + set(), so concurrent requests on different workers overwrite each
+other's entries and let more requests through than the rate allows. These count
+requests with cache.incr() instead, which is atomic on a shared cache (Redis),
+using a sliding window estimated from the current and previous fixed windows.
+Only allowed requests are counted: a rejected request takes its increment back,
+so a client retrying while throttled is let through once the rate allows it.
+"""
+from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
+
+
+class AtomicRateThrottleMixin:
+    def window_key(self, window):
+        return f"{self.key}:{window}"
+
+    def incr_window(self, window):
+        key = self.window_key(window)
+        # keep the counter for two windows, it's read as the previous one next
+        self.cache.add(key, 0, timeout=self.duration * 2)
+        try:
+            return self.cache.incr(key)
+        except ValueError:  # evicted between add and incr
+            self.cache.set(key, 1, timeout=self.duration * 2)
+            return 1
+
+    def decr_window(self, window):
+        try:
+            self.cache.decr(self.window_key(window))
+        except ValueError:  # evicted, nothing to take back
+            pass
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window, elapsed = divmod(self.now, self.duration)
+        window = int(window)
+
+        current = self.incr_window(window)
+        previous = self.cache.get(self.window_key(window - 1), 0)
+
+        # requests of the previous window still inside the sliding window
+        self.count = previous * (1 - elapsed / self.duration) + current
+        self.elapsed = elapsed
+        if self.count <= self.num_requests:
+            return True
+
+        self.decr_window(window)
+        return False
+
+    def wait(self):
+        # until the current window ends and the previous one stops counting
+        return self.duration - self.elapsed
+
+
+class AtomicAnonRateThrottle(AtomicRateThrottleMixin, AnonRateThrottle):
+    pass
+
+
+class AtomicUserRateThrottle(AtomicRateThrottleMixin, UserRateThrottle):
+    pass